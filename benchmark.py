@@ -0,0 +1,590 @@
+"""
+===========================================================================
+ЗАМЕРЫ СКОРОСТИ
+===========================================================================
+Отдельные проверки производительности игры.
+
+Запуск:
+    python benchmark.py collision --size 500
+    python benchmark.py enemies --count 1000
+    python benchmark.py suite --output bench.json
+    python benchmark.py suite --output new.json --baseline bench.json
+    python benchmark.py compare --baseline bench.json --current new.json
+
+Время в отчетах - в миллисекундах: среднее, минимум, максимум
+и процентили p50/p95/p99. Режим сравнения завершается с ошибкой,
+если p50 какого-то замера стал хуже базового больше, чем на порог.
+"""
+
+import argparse        # Для параметров командной строки
+import gc              # Для уборки мусора перед замером памяти
+import json            # Для вывода результатов
+import os              # Для временных файлов
+import random          # Для случайных карт
+import sys             # Для кода выхода
+import tempfile        # Для временной базы рекордов
+import time            # Для замеров времени
+import tracemalloc     # Для замера памяти при перезапусках
+
+import arcade
+import numpy as np     # Для процентилей
+import pyglet          # Для тихого звукового драйвера
+
+import main as game
+from main import TILE, Level2Simulation, LevelGeometry, make_stress_level
+
+# Порог по умолчанию: на 20% медленнее базового - уже плохо
+DEFAULT_THRESHOLD = 0.2
+
+
+def summarize(samples):
+    """
+    Сводка по замерам (замеры в секундах, сводка в миллисекундах).
+
+    Возвращает:
+        {"n", "mean", "min", "max", "p50", "p95", "p99"}
+    """
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": len(ms),
+        "mean": float(ms.mean()),
+        "min": float(ms.min()),
+        "max": float(ms.max()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+    }
+
+
+def generate_cave_map(width, height, seed=0):
+    """
+    Создает большую карту-пещеру для замеров.
+    Карта сначала вся из камня, потом в ней вырезаются комнаты.
+
+    Возвращает:
+        список строк, как LEVEL_1 и LEVEL_2
+    """
+    rng = random.Random(seed)
+    grid = [["1"] * width for _ in range(height)]
+    rooms = width * height // 60
+    for _ in range(rooms):
+        room_w = rng.randint(3, 12)
+        room_h = rng.randint(2, 6)
+        left = rng.randint(1, max(1, width - room_w - 1))
+        top = rng.randint(1, max(1, height - room_h - 1))
+        for row in range(top, min(top + room_h, height - 1)):
+            for col in range(left, min(left + room_w, width - 1)):
+                grid[row][col] = "0"
+    return ["".join(line) for line in grid]
+
+
+def make_tile_list(level_map, solid_chars):
+    """Старый способ: одна стена-спрайт на каждую плитку."""
+    texture = arcade.load_texture(":resources:/images/tiles/grassCenter.png")
+    walls = arcade.SpriteList(use_spatial_hash=True)
+    rows = len(level_map)
+    for row, line in enumerate(level_map):
+        for col, ch in enumerate(line):
+            if ch in solid_chars:
+                wall = arcade.Sprite(texture=texture, scale=0.5)
+                wall.center_x = col * TILE + TILE // 2
+                wall.center_y = (rows - row) * TILE
+                walls.append(wall)
+    return walls
+
+
+def measure_queries(walls, probes):
+    """
+    Проверяет столкновения игрока в случайных точках.
+
+    Возвращает:
+        (среднее число стен-кандидатов, микросекунд на проверку)
+    """
+    player = arcade.Sprite(":resources:/images/animated_characters/male_adventurer/"
+                           "maleAdventurer_idle.png", 0.45)
+    candidates = 0
+    start = time.perf_counter()
+    for x, y in probes:
+        player.center_x, player.center_y = x, y
+        candidates += len(walls.spatial_hash.get_objects_for_box(player))
+        arcade.check_for_collision_with_list(player, walls)
+    duration = time.perf_counter() - start
+    return candidates / len(probes), duration / len(probes) * 1_000_000
+
+
+def bench_collision(size=500, probes=2000, seed=0):
+    """
+    Сравнивает стены-плитки и склеенные прямоугольники
+    на сгенерированной карте size x size.
+    """
+    level_map = generate_cave_map(size, size, seed)
+
+    start = time.perf_counter()
+    geometry = LevelGeometry(level_map, "1")
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rect_walls = geometry.make_collision_list()
+    rect_build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tile_walls = make_tile_list(level_map, "1")
+    tile_build_time = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, size * TILE), rng.uniform(0, size * TILE))
+              for _ in range(probes)]
+    tile_candidates, tile_us = measure_queries(tile_walls, points)
+    rect_candidates, rect_us = measure_queries(rect_walls, points)
+
+    return {
+        "map": f"{size}x{size}",
+        "solid_tiles": geometry.tile_count,
+        "collision_rects": len(geometry.rects),
+        "reduction": geometry.tile_count / max(1, len(geometry.rects)),
+        "compile_ms": compile_time * 1000,
+        "build_rects_ms": rect_build_time * 1000,
+        "build_tiles_ms": tile_build_time * 1000,
+        "tiles_candidates_per_query": tile_candidates,
+        "rects_candidates_per_query": rect_candidates,
+        "tiles_query_us": tile_us,
+        "rects_query_us": rect_us,
+    }
+
+
+def bench_enemies(count=1000, ticks=600):
+    """
+    Толпа врагов: общий шаг EnemyManager против
+    старого способа - физики каждого врага по очереди.
+    """
+    sim = Level2Simulation("male", make_stress_level(count))
+    manager = sim.enemies
+    delta_time = 1 / 60
+
+    start = time.perf_counter()
+    for _ in range(ticks):
+        manager.step(delta_time)
+    batched = (time.perf_counter() - start) / ticks
+
+    # Старый способ: каждый враг сам считает таймер, физику и прыжки
+    rng = random.Random(0)
+    enemies = list(manager.sprites)
+    timers = [[0.0, rng.uniform(1.0, 3.0), 1] for _ in enemies]
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for enemy, timer in zip(enemies, timers):
+            timer[0] += delta_time
+            if timer[0] >= timer[1]:
+                timer[2] *= -1
+                timer[0] = 0
+                timer[1] = rng.uniform(1.0, 3.0)
+            enemy.velocity_x = enemy.move_speed * timer[2]
+            enemy.update_physics(sim.geometry)
+            if enemy.on_ground and rng.random() < 0.01:
+                enemy.velocity_y = rng.uniform(3, 6)
+    per_object = (time.perf_counter() - start) / ticks
+
+    return {
+        "enemies": len(manager),
+        "ticks": ticks,
+        "batched_step_ms": batched * 1000,
+        "per_object_step_ms": per_object * 1000,
+        "speedup": per_object / batched if batched else 0.0,
+    }
+
+
+def bench_setup(repeats=20):
+    """
+    Сколько строится уровень: холодный старт (склад картинок пуст)
+    и повторный запуск (все уже загружено).
+    """
+    result = {}
+    for level, simulation_class in game.SIMULATIONS.items():
+        scope = f"level_{level}"
+        cold, warm = [], []
+        for _ in range(repeats):
+            game.ASSETS.evict(scope)
+            start = time.perf_counter()
+            simulation_class("male", seed=0)
+            cold.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            simulation_class("male", seed=0)
+            warm.append(time.perf_counter() - start)
+        result[f"level{level}_cold"] = summarize(cold)
+        result[f"level{level}_warm"] = summarize(warm)
+    return result
+
+
+def bench_tick(ticks=3000, seed=0):
+    """
+    Цена одного тика уровня с записанным вводом (демо-сценарий).
+    Когда уровень кончается, он начинается заново.
+    """
+    script = game.make_demo_script(ticks, seed)
+    result = {}
+    for level, simulation_class in game.SIMULATIONS.items():
+        sim = simulation_class("male", seed=seed)
+        samples = []
+        position = 0
+        for tick in range(ticks):
+            while position < len(script) and script[position][0] <= tick:
+                _, action, pressed = script[position]
+                if pressed:
+                    sim.press(action)
+                else:
+                    sim.release(action)
+                position += 1
+            start = time.perf_counter()
+            sim.step(game.TICK_TIME)
+            samples.append(time.perf_counter() - start)
+            if sim.state != game.STATE_PLAYING:
+                sim = simulation_class("male", seed=seed)
+        result[f"level{level}"] = summarize(samples)
+    return result
+
+
+def bench_draw(frames=300):
+    """
+    Цена on_draw обоих уровней в скрытом окне.
+    ctx.finish() ждет видеокарту, поэтому в замер входит и ее работа.
+    Без видеокарты замер пропускается с пояснением.
+    """
+    try:
+        window = arcade.Window(game.SCREEN_WIDTH, game.SCREEN_HEIGHT,
+                               game.SCREEN_TITLE, visible=False)
+    except Exception as error:  # У pyglet нет общего класса ошибок окна
+        return {"skipped": f"нет окна OpenGL: {error}"}
+
+    result = {}
+    try:
+        for level, view_class in ((1, game.GameView), (2, game.GameView2)):
+            view = view_class("male")
+            window.show_view(view)
+            view.setup()
+            samples = []
+            for _ in range(frames):
+                view.on_update(game.TICK_TIME)
+                start = time.perf_counter()
+                view.on_draw()
+                window.ctx.finish()
+                samples.append(time.perf_counter() - start)
+            result[f"level{level}"] = summarize(samples)
+    finally:
+        window.close()
+    return result
+
+
+def bench_particles(sizes=(1000, 10000, 100000), steps=120):
+    """
+    Система частиц при постоянном числе частиц:
+    шаг симуляции и упаковка данных для видеокарты.
+    """
+    result = {}
+    for size in sizes:
+        particles = game.ParticleSystem(capacity=size, seed=0)
+        step_samples, pack_samples = [], []
+        for _ in range(steps):
+            # Доливаем погасшие частицы, чтобы их всегда было size
+            particles.emit(400, 300, arcade.color.GOLD, size - particles.count,
+                           size_range=(1, 3), lifetime_range=(0.5, 1.5))
+            start = time.perf_counter()
+            particles.step(game.TICK_TIME)
+            step_samples.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            particles._vertex_data()
+            pack_samples.append(time.perf_counter() - start)
+        step = summarize(step_samples)
+        result[f"step_{size}"] = step
+        result[f"pack_{size}"] = summarize(pack_samples)
+        result[f"particles_per_second_{size}"] = size / (step["mean"] / 1000)
+    return result
+
+
+def bench_records(saves=200):
+    """
+    Цена save_record для игры (в памяти + очередь)
+    и полной записи на диск в отдельной временной базе.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        store = game.RecordStore(os.path.join(folder, "records.db"),
+                                 os.path.join(folder, "records.json"))
+        previous, game._record_store = game._record_store, store
+        try:
+            rng = random.Random(0)
+            samples = []
+            start_all = time.perf_counter()
+            for _ in range(saves):
+                start = time.perf_counter()
+                game.save_record(rng.randint(1, 2), rng.randint(0, 20), rng.randint(0, 3),
+                                 rng.random() < 0.5, rng.random() < 0.5,
+                                 rng.randint(20, 300), rng.choice(["male", "female"]))
+                samples.append(time.perf_counter() - start)
+            store.flush()
+            to_disk = time.perf_counter() - start_all
+
+            top_samples = []
+            for _ in range(saves):
+                start = time.perf_counter()
+                store.top(2, 10)
+                top_samples.append(time.perf_counter() - start)
+        finally:
+            store.close()
+            game._record_store = previous
+
+    return {
+        "save_record": summarize(samples),
+        "top10": summarize(top_samples),
+        "all_on_disk_ms": to_disk * 1000,
+    }
+
+
+def bench_levels(count=200, repeats=5):
+    """
+    Открытие каталога из count файлов уровней: в первый раз
+    (разбор и сборка готовых файлов) и потом (mmap и сверка отпечатка),
+    а еще чтение карты одного уровня из готового файла.
+    """
+    count = min(count, len(game.LEVEL_NUMBERS))
+    builtin = dict(game.SIMULATIONS)
+    with tempfile.TemporaryDirectory() as folder:
+        for i in range(count):
+            number = game.LEVEL_NUMBERS[i]
+            with open(os.path.join(folder, f"level{number}.level"), "w", encoding="utf-8") as f:
+                f.write(f"name: Замер {number}\nnumber: {number}\npar: 60\n---\n")
+                f.write("\n".join(game.LEVEL_2))
+
+        try:
+            start = time.perf_counter()
+            levels = game.load_level_catalog(folder)
+            cold = time.perf_counter() - start
+
+            warm_samples = []
+            lines_samples = []
+            for _ in range(repeats):
+                for level in levels:
+                    level.close()
+                game.SIMULATIONS.clear()
+                game.SIMULATIONS.update(builtin)
+                start = time.perf_counter()
+                levels = game.load_level_catalog(folder)
+                warm_samples.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                levels[0].lines()
+                lines_samples.append(time.perf_counter() - start)
+            for level in levels:
+                level.close()
+        finally:
+            game.SIMULATIONS.clear()
+            game.SIMULATIONS.update(builtin)
+            for i in range(count):
+                game.LEVEL_WEIGHTS.pop(game.LEVEL_NUMBERS[i], None)
+
+    return {
+        "levels": count,
+        "cold_ms": cold * 1000,
+        "warm": summarize(warm_samples),
+        "lines": summarize(lines_samples),
+    }
+
+
+def bench_sfx(ticks=600, calls=200):
+    """
+    Звуки на тихом драйвере pyglet: игрок идет по ряду монет
+    (монета каждые 3 тика) и стоит на шипах "SSS"
+    (три удара за тик), а время идет ровными тиками.
+    Для сравнения - цена arcade.play_sound, который каждый раз
+    создает нового проигрывателя.
+    """
+    pyglet.options["audio"] = ("silent",)
+    now = [0.0]
+    mixer = game.SfxMixer(clock=lambda: now[0])
+    mixer.register("coin", ":resources:/sounds/coin1.wav")
+    mixer.register("spike", ":resources:/sounds/hit3.wav")
+
+    samples = []
+    for tick in range(ticks):
+        start = time.perf_counter()
+        if tick % 3 == 0:
+            mixer.play("coin")
+        if tick % 60 == 0:
+            for _ in range(3):
+                mixer.play("spike")
+        mixer.flush()
+        samples.append(time.perf_counter() - start)
+        now[0] += game.TICK_TIME
+
+    sound = mixer.sounds["coin"]
+    start = time.perf_counter()
+    for _ in range(calls):
+        arcade.play_sound(sound)
+    play_sound = (time.perf_counter() - start) / calls
+
+    return {
+        "flush": summarize(samples),
+        "play_sound_ms": play_sound * 1000,
+        "mixer": mixer.report(),
+    }
+
+
+def bench_restart(cycles=1000, frames=5):
+    """
+    Перезапуски забега в одном скрытом окне, как на экранах итогов:
+    забег на уровне 2 (несколько кадров) -> главное меню -> снова.
+    Память меряется после первых 10% циклов и в конце:
+    рост должен быть около нуля, сколько бы ни было циклов.
+    Без видеокарты замер пропускается с пояснением.
+    """
+    pyglet.options["audio"] = ("silent",)
+    try:
+        window = arcade.Window(game.SCREEN_WIDTH, game.SCREEN_HEIGHT,
+                               game.SCREEN_TITLE, visible=False)
+    except Exception as error:  # У pyglet нет общего класса ошибок окна
+        return {"skipped": f"нет окна OpenGL: {error}"}
+
+    views = game.VIEWS
+    views.attach(window)
+    warmup = max(1, cycles // 10)
+    tracemalloc.start()
+    try:
+        for cycle in range(cycles):
+            if cycle == warmup:
+                gc.collect()
+                memory_start = tracemalloc.get_traced_memory()[0]
+            view = views.start_run(game.GameView2, character="male",
+                                   simulation_class=Level2Simulation)
+            for _ in range(frames):
+                view.on_update(game.TICK_TIME)
+                view.on_draw()
+            views.finish_run()
+        gc.collect()
+        memory_end = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+        window.close()
+
+    return {
+        "cycles": cycles,
+        "memory_growth_kb": (memory_end - memory_start) / 1024,
+        "views": views.report(),
+    }
+
+
+def bench_sleep(sizes=(250, 1000, 4000, 16000), ticks=300):
+    """
+    Цена тика уровня с толпой врагов разного размера, пока игрок стоит
+    на нижнем этаже: враги вдали спят, поэтому тик почти не должен
+    дорожать с размером карты.
+    """
+    result = {}
+    for count in sizes:
+        sim = Level2Simulation("male", make_stress_level(count), seed=0)
+        for _ in range(game.ENEMY_SLEEP_CHECK):
+            sim.step(game.TICK_TIME)    # Первая проверка сна
+        samples = []
+        for _ in range(ticks):
+            start = time.perf_counter()
+            sim.step(game.TICK_TIME)
+            samples.append(time.perf_counter() - start)
+        result[f"enemies_{count}"] = summarize(samples)
+        result[f"enemies_{count}_awake"] = sim.enemies.awake
+    return result
+
+
+# Что входит в общий набор
+SUITE = {
+    "setup": bench_setup,
+    "tick": bench_tick,
+    "draw": bench_draw,
+    "particles": bench_particles,
+    "records": bench_records,
+    "levels": bench_levels,
+    "sfx": bench_sfx,
+    "restart": bench_restart,
+    "sleep": bench_sleep,
+}
+
+
+def run_suite():
+    """Прогоняет все замеры набора."""
+    return {name: bench() for name, bench in SUITE.items()}
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Сравнивает p50 всех замеров с базовыми.
+
+    Возвращает:
+        список строк о замерах, которые стали хуже порога
+    """
+    regressions = []
+    for bench, metrics in baseline.items():
+        for name, base in metrics.items():
+            if not isinstance(base, dict) or "p50" not in base:
+                continue
+            now = current.get(bench, {}).get(name)
+            if not isinstance(now, dict) or "p50" not in now:
+                continue
+            if now["p50"] > base["p50"] * (1 + threshold):
+                regressions.append(f"{bench}.{name}: p50 {base['p50']:.3f} -> "
+                                   f"{now['p50']:.3f} мс "
+                                   f"(+{(now['p50'] / base['p50'] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def load_json(path):
+    """Читает результаты замеров из файла."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры скорости")
+    parser.add_argument("bench", choices=["collision", "enemies", *SUITE, "suite", "compare"],
+                        help="что замерять")
+    parser.add_argument("--size", type=int, default=500, help="размер карты в плитках")
+    parser.add_argument("--probes", type=int, default=2000, help="сколько проверок сделать")
+    parser.add_argument("--seed", type=int, default=0, help="зерно случайной карты")
+    parser.add_argument("--count", type=int, default=1000, help="сколько врагов")
+    parser.add_argument("--ticks", type=int, default=600, help="сколько тиков прогнать")
+    parser.add_argument("--output", help="куда записать результаты (JSON)")
+    parser.add_argument("--baseline", help="базовые результаты для сравнения (JSON)")
+    parser.add_argument("--current", help="новые результаты для режима compare (JSON)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="насколько p50 может стать хуже (0.2 = на 20%%)")
+    args = parser.parse_args()
+
+    if args.bench == "compare":
+        if not args.baseline or not args.current:
+            parser.error("для compare нужны --baseline и --current")
+        result = load_json(args.current)
+    elif args.bench == "collision":
+        result = bench_collision(args.size, args.probes, args.seed)
+    elif args.bench == "enemies":
+        result = bench_enemies(args.count, args.ticks)
+    elif args.bench == "suite":
+        result = run_suite()
+    else:
+        result = {args.bench: SUITE[args.bench]()}
+
+    if args.bench != "compare":
+        print(json.dumps(result, ensure_ascii=False, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=4)
+
+    # Сравнение с базовыми результатами
+    if args.baseline:
+        regressions = compare(load_json(args.baseline), result, args.threshold)
+        for line in regressions:
+            print(f"ХУЖЕ: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("Все замеры в пределах порога", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
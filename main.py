@@ -5,12 +5,34 @@
 Создание компьютерной игры на языке Python (библиотека Arcade)
 """
 
-import arcade          # Библиотека для создания игр
 import time            # Для работы со временем
+STARTUP_BEGIN = time.perf_counter()  # Отсюда считается запуск (см. STARTUP)
+import arcade          # Библиотека для создания игр
 import json            # Для сохранения данных
 import os              # Для работы с файлами
 import random          # Для случайных чисел
 import math            # Для математики
+import argparse        # Для параметров командной строки
+import re              # Для поиска по строкам
+import numpy as np     # Для быстрых вычислений над массивами
+import sys             # Для сообщений об ошибках
+import sqlite3         # Для базы рекордов
+import threading       # Для записи рекордов в фоне
+import queue           # Для очереди записи
+import uuid            # Для номеров забегов
+import atexit          # Для дозаписи рекордов при выходе
+import contextlib      # Для временной подмены координат
+import struct          # Для двоичных файлов повторов
+import csv             # Для таблиц замеров
+import hashlib         # Для отпечатка файла уровня
+import mmap            # Для чтения готовых уровней без разбора
+import PIL.Image       # Для сборки атласа картинок
+from collections import deque  # Для скользящего окна замеров
+from concurrent.futures import ProcessPoolExecutor  # Для прогонов на всех ядрах
+import itertools       # Для перебора вариантов правил
+import pyglet          # Для надписей интерфейса
+from pyglet import gl  # Для тонкой настройки смешивания цветов
+from pyglet import media  # Для проигрывателей звуков
 
 # =====================================================
 # НАСТРОЙКИ ИГРЫ
@@ -18,14 +40,22 @@ import math            # Для математики
 # Размеры окна
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
+MAX_SCREEN_WIDTH = 1920    # Больше окно не растягивается (по нему
+MAX_SCREEN_HEIGHT = 1200   # считается, где враги засыпают)
 SCREEN_TITLE = "Подземелье авантюристов"
 
+# Время симуляции: игра всегда считается ровными тиками,
+# а скорости ниже заданы на один тик
+TICK_RATE = 60                 # Тиков в секунду
+TICK_TIME = 1 / TICK_RATE      # Длительность одного тика
+MAX_TICKS_PER_FRAME = 8        # Больше тиков за кадр не догоняем
+
 # Игровые константы
 TILE = 64              # Размер квадратной плитки
 PLAYER_SPEED = 5       # Скорость игрока
 JUMP_SPEED = 18        # Высота прыжка
 GRAVITY = 1            # Сила тяжести
-CAMERA_SPEED = 0.1     # Плавность движения камеры
+CAMERA_SPEED = 0.1     # Плавность движения камеры (за тик)
 MAX_HP = 100           # Максимальное здоровье
 
 # Урон и время
@@ -34,7 +64,10 @@ SPIKE_COOLDOWN = 1.0   # Время между уроном
 
 # Цвета и файлы
 BG_COLOR = arcade.color.DARK_BROWN   # Цвет фона
-RECORDS_FILE = "records.json"        # Файл для рекордов
+RECORDS_FILE = "records.json"        # Старый файл рекордов
+RECORDS_DB = "records.db"            # База всех забегов
+RECORDS_POLL_SECONDS = 5.0           # Как часто подтягивать забеги других игр
+RECORDS_LOCK_RETRIES = 3             # Сколько раз ждать базу, занятую другой игрой
 
 # =====================================================
 # КАРТЫ УРОВНЕЙ
@@ -81,6 +114,483 @@ LEVEL_2 = [
     "11111211111111",
 ]
 
+# =====================================================
+# ОБЩИЙ СКЛАД КАРТИНОК И ЗВУКОВ
+# =====================================================
+"""
+КАК РАБОТАЕТ СКЛАД:
+Каждая картинка и каждый звук загружаются один раз на весь процесс.
+Ключ - путь к файлу плюс параметры загрузки, поэтому сто монет
+получают одни и те же четыре кадра, а перезапуск уровня
+ничего не загружает заново.
+Каждый ресурс помечен областями (например "level_2").
+Когда уровень меняется, ресурсы старого уровня можно выгрузить.
+"""
+SCOPE_COMMON = "common"   # Ресурсы, нужные всегда
+
+
+class AssetCache:
+    """
+    Склад общих картинок (Texture) и звуков (Sound).
+    Считает попадания и промахи, умеет выгружать области.
+    """
+    def __init__(self):
+        self.items = {}         # Ключ -> загруженный ресурс
+        self.scopes = {}        # Ключ -> набор областей
+        self.level_scope = None  # Область текущего уровня
+        self.hits = 0           # Сколько раз ресурс уже был на складе
+        self.misses = 0         # Сколько раз пришлось загружать
+        self.evictions = 0      # Сколько ресурсов выгружено
+        self.atlas = None       # Готовые атласы (AtlasIndex), если есть
+
+    def _get(self, key, scope, loader):
+        """Достает ресурс со склада или загружает его."""
+        item = self.items.get(key)
+        if item is None:
+            self.misses += 1
+            item = loader()
+            self.items[key] = item
+            self.scopes[key] = set()
+        else:
+            self.hits += 1
+        self.scopes[key].add(scope)
+        return item
+
+    def texture(self, path, scope=SCOPE_COMMON, **params):
+        """
+        Общая картинка.
+
+        Аргументы:
+            path: путь к файлу
+            scope: область, к которой относится картинка
+            params: параметры arcade.load_texture
+        """
+        key = ("texture", path, tuple(sorted(params.items())))
+        return self._get(key, scope, lambda: self._load_texture(path, params))
+
+    def _load_texture(self, path, params):
+        """Вырезает картинку из готового атласа, а если ее там нет - грузит файл."""
+        if not params and self.atlas is not None:
+            texture = self.atlas.texture(path)
+            if texture is not None:
+                return texture
+        return arcade.load_texture(path, **params)
+
+    def sound(self, path, scope=SCOPE_COMMON, streaming=False):
+        """Общий звук."""
+        key = ("sound", path, streaming)
+        return self._get(key, scope, lambda: arcade.load_sound(path, streaming))
+
+    def evict(self, scope):
+        """
+        Выгружает область. Ресурс удаляется со склада,
+        когда он больше не нужен ни одной области.
+
+        Возвращает:
+            сколько ресурсов удалено
+        """
+        dropped = []
+        for key, scopes in self.scopes.items():
+            scopes.discard(scope)
+            if not scopes:
+                dropped.append(key)
+
+        textures = set()
+        for key in dropped:
+            item = self.items.pop(key)
+            del self.scopes[key]
+            if key[0] == "texture":
+                textures.add(id(item))
+
+        # У arcade есть свой кэш картинок - чистим и его
+        if textures:
+            cache = arcade.load_texture.texture_cache
+            for name in [name for name, texture in cache.items() if id(texture) in textures]:
+                del cache[name]
+
+        self.evictions += len(dropped)
+        return len(dropped)
+
+    def use_level(self, scope):
+        """
+        Переключает склад на другой уровень:
+        ресурсы прошлого уровня выгружаются.
+        """
+        if self.level_scope is not None and self.level_scope != scope:
+            self.evict(self.level_scope)
+        self.level_scope = scope
+
+    def stats(self):
+        """Статистика склада."""
+        return {
+            "textures": sum(1 for key in self.items if key[0] == "texture"),
+            "sounds": sum(1 for key in self.items if key[0] == "sound"),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "atlas": self.atlas.stats() if self.atlas is not None else None,
+        }
+
+
+# Один склад на весь процесс
+ASSETS = AssetCache()
+
+# =====================================================
+# АТЛАСЫ КАРТИНОК
+# =====================================================
+"""
+КАК УСТРОЕН АТЛАС:
+Плитки, предметы, враги и кадры персонажей лежат в arcade отдельными
+файлами, и каждый файл читается и разжимается сам по себе.
+Заранее (python main.py --pack-atlas) они собираются в атласы -
+по одному на набор из ATLAS_SETS:
+    atlas/<набор>.png   - все картинки набора полками, с зазором
+    atlas/<набор>.json  - путь картинки -> ее место в атласе
+                          и готовый hit box (считать его заново не надо)
+Склад (ASSETS) при первой картинке из набора читает его .png целиком
+один раз, а дальше только вырезает нужные куски. Вырезанная картинка
+пиксель в пиксель как исходный файл, поэтому hit box и физика
+не меняются. Если атласа нет или картинки в нем нет, склад грузит
+файл, как раньше. После обновления arcade атлас надо пересобрать.
+"""
+ATLAS_DIR = "atlas"          # Папка с атласами
+ATLAS_WIDTH = 1024           # Ширина атласа (высота - сколько понадобится)
+ATLAS_PADDING = 2            # Зазор между картинками в атласе
+ATLAS_VERSION = 1            # Версия формата .json
+
+_ATLAS_CHARACTER_FRAMES = (["idle", "jump"] + [f"walk{i}" for i in range(8)]
+                           + [f"climb{i}" for i in range(2)])
+
+# Наборы картинок: один атлас на набор
+ATLAS_SETS = {
+    "level": (
+        [f":resources:/images/tiles/{name}.png" for name in (
+            "grassCenter", "grassMid", "rock", "grass_sprout", "spikes", "mushroomRed",
+            "doorClosed_top", "doorClosed_mid", "bomb", "torchOff", "torch1", "torch2")]
+        + [f":resources:/images/items/{name}.png" for name in (
+            "ladderMid", "ladderTop", "gemBlue", "keyYellow",
+            "gold_1", "gold_2", "gold_3", "gold_4")]
+        + [f":resources:/images/enemies/{name}.png" for name in ("mouse", "frog")]
+    ),
+    "characters": [
+        f":resources:/images/animated_characters/{folder}/{name}_{frame}.png"
+        for folder, name in (("male_adventurer", "maleAdventurer"),
+                             ("female_adventurer", "femaleAdventurer"))
+        for frame in _ATLAS_CHARACTER_FRAMES
+    ],
+}
+
+
+def pack_atlas(name, paths, folder=ATLAS_DIR, width=ATLAS_WIDTH, padding=ATLAS_PADDING):
+    """
+    Собирает картинки в один атлас и пишет .png и .json.
+    Раскладка - полками: картинки по убыванию высоты слева направо,
+    не влезла - новая полка.
+
+    Возвращает:
+        {"name", "images", "size", "bytes"}
+    """
+    images = [(path, PIL.Image.open(arcade.resources.resolve_resource_path(path))
+               .convert("RGBA")) for path in paths]
+    order = sorted(images, key=lambda item: (-item[1].height, item[0]))
+
+    regions = {}
+    x = y = shelf = 0
+    for path, image in order:
+        if x + image.width > width:
+            x, y, shelf = 0, y + shelf + padding, 0
+        regions[path] = {"x": x, "y": y, "width": image.width, "height": image.height}
+        x += image.width + padding
+        shelf = max(shelf, image.height)
+
+    atlas = PIL.Image.new("RGBA", (width, y + shelf), (0, 0, 0, 0))
+    for path, image in images:
+        region = regions[path]
+        atlas.paste(image, (region["x"], region["y"]))
+        region["hit_box"] = [list(point) for point in
+                             arcade.calculate_hit_box_points_simple(image)]
+
+    # Сначала во временные файлы: игра не увидит атлас наполовину
+    os.makedirs(folder, exist_ok=True)
+    image_path = os.path.join(folder, f"{name}.png")
+    index_path = os.path.join(folder, f"{name}.json")
+    atlas.save(f"{image_path}.tmp", format="PNG", optimize=True)
+    with open(f"{index_path}.tmp", "w", encoding="utf-8") as file:
+        json.dump({"version": ATLAS_VERSION, "image": f"{name}.png",
+                   "size": list(atlas.size), "regions": regions}, file)
+    os.replace(f"{image_path}.tmp", image_path)
+    os.replace(f"{index_path}.tmp", index_path)
+    return {"name": name, "images": len(images), "size": list(atlas.size),
+            "bytes": os.path.getsize(image_path)}
+
+
+def pack_atlases(folder=ATLAS_DIR):
+    """Собирает атласы всех наборов."""
+    return [pack_atlas(name, paths, folder) for name, paths in ATLAS_SETS.items()]
+
+
+class AtlasIndex:
+    """
+    Готовые атласы на диске: откуда вырезать какую картинку.
+    Индексы читаются при первой картинке, сам атлас - при первой
+    картинке из него.
+    """
+    def __init__(self, folder=ATLAS_DIR, names=tuple(ATLAS_SETS)):
+        self.folder = folder
+        self.names = names
+        self.regions = None     # Путь картинки -> (набор, область)
+        self.images = {}        # Набор -> картинка атласа (PIL)
+        self.cut = 0            # Сколько картинок вырезано из атласов
+
+    def _load_indexes(self):
+        """Читает .json всех наборов, которые есть на диске."""
+        self.regions = {}
+        for name in self.names:
+            index_path = os.path.join(self.folder, f"{name}.json")
+            try:
+                with open(index_path, encoding="utf-8") as file:
+                    index = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if index.get("version") != ATLAS_VERSION:
+                continue
+            for path, region in index["regions"].items():
+                self.regions[path] = (name, region)
+
+    def _image(self, name):
+        """Картинка атласа целиком (читается один раз)."""
+        image = self.images.get(name)
+        if image is None:
+            image_path = os.path.join(self.folder, f"{name}.png")
+            image = self.images[name] = PIL.Image.open(image_path).convert("RGBA")
+        return image
+
+    def texture(self, path):
+        """Картинка из атласа или None, если ее там нет."""
+        if self.regions is None:
+            self._load_indexes()
+        found = self.regions.get(path)
+        if found is None:
+            return None
+        name, region = found
+        try:
+            atlas = self._image(name)
+        except OSError:
+            return None
+        x, y = region["x"], region["y"]
+        image = atlas.crop((x, y, x + region["width"], y + region["height"]))
+        texture = arcade.Texture(f"{ATLAS_DIR}/{name}:{path}", image)
+        texture._hit_box_points = tuple(tuple(point) for point in region["hit_box"])
+        self.cut += 1
+        return texture
+
+    def stats(self):
+        """Сколько картинок в атласах и сколько уже вырезано."""
+        if self.regions is None:
+            self._load_indexes()
+        return {"regions": len(self.regions), "loaded": sorted(self.images), "cut": self.cut}
+
+
+# Склад берет картинки из атласов, если они собраны
+ASSETS.atlas = AtlasIndex()
+
+# =====================================================
+# ЗВУКОВЫЕ ЭФФЕКТЫ
+# =====================================================
+"""
+КАК ИГРАЮТ ЗВУКИ:
+arcade.play_sound каждый раз создает нового проигрывателя.
+Вместо этого у каждого звука свой пул голосов (проигрывателей
+pyglet), которые создаются один раз и потом только перезапускаются:
+- звук берет свободный голос своего пула или создает новый,
+  пока пул не полон;
+- если все голоса звука заняты, перезапускается самый старый
+  из них (старый звук обрывается);
+- всего одновременно звучит не больше SFX_MAX_VOICES голосов,
+  лишние запуски пропускаются и считаются;
+- одинаковые звуки за один тик сливаются в один.
+Звуки загружаются целиком (не потоком) в общую область склада,
+поэтому при смене уровня они не выгружаются и не читаются заново.
+Голос занят, пока не прошла длина звука, - так считать можно
+и с тихим драйвером pyglet (python main.py --mute).
+"""
+SFX_VOICES_PER_SOUND = 3    # Голосов в пуле одного звука
+SFX_MAX_VOICES = 12         # Всего голосов одновременно
+
+
+class SfxVoice:
+    """Один голос: проигрыватель и время, когда он начал звучать."""
+    __slots__ = ("player", "started")
+
+    def __init__(self, player):
+        self.player = player
+        self.started = -math.inf
+
+
+class SfxMixer:
+    """
+    Пулы голосов для коротких звуков и счетчики их работы.
+    """
+    def __init__(self, voices_per_sound=SFX_VOICES_PER_SOUND,
+                 max_voices=SFX_MAX_VOICES, clock=time.perf_counter):
+        self.voices_per_sound = voices_per_sound
+        self.max_voices = max_voices
+        self.clock = clock          # Откуда брать время (для проверок - свои часы)
+        self.sounds = {}            # Имя -> звук (arcade.Sound)
+        self.pools = {}             # Имя -> список голосов
+        self.pending = {}           # Имя -> громкость (звуки этого тика)
+        self.plays = 0              # Сколько звуков запущено
+        self.coalesced = 0          # Сколько повторов слито в один тик
+        self.stolen = 0             # Сколько раз оборван старый голос
+        self.dropped = 0            # Сколько запусков пропущено из-за предела
+        self.peak = 0               # Больше всего голосов одновременно
+
+    def register(self, name, path):
+        """Загружает звук под именем (один раз на весь процесс)."""
+        if name not in self.sounds:
+            self.sounds[name] = ASSETS.sound(path)
+            self.pools[name] = []
+
+    def play(self, name, volume=1.0):
+        """Просит проиграть звук в этом тике (повторы сливаются)."""
+        if name in self.pending:
+            self.coalesced += 1
+            self.pending[name] = max(self.pending[name], volume)
+        else:
+            self.pending[name] = volume
+
+    def _duration(self, name):
+        """Длина звука в секундах."""
+        return self.sounds[name].source.duration or 0.0
+
+    def active_voices(self, now=None):
+        """Сколько голосов сейчас звучит."""
+        now = self.clock() if now is None else now
+        return sum(1 for name, pool in self.pools.items()
+                   for voice in pool if now - voice.started < self._duration(name))
+
+    def flush(self):
+        """Запускает звуки, накопленные за тик."""
+        if not self.pending:
+            return
+        now = self.clock()
+        active = self.active_voices(now)
+        for name, volume in self.pending.items():
+            active += self._start(name, volume, now, active)
+        self.pending.clear()
+        self.peak = max(self.peak, active)
+
+    def _start(self, name, volume, now, active):
+        """
+        Запускает один звук на голосе из его пула.
+
+        Возвращает:
+            на сколько выросло число звучащих голосов (0 или 1)
+        """
+        pool = self.pools[name]
+        duration = self._duration(name)
+        free = [voice for voice in pool if now - voice.started >= duration]
+        busy = [voice for voice in pool if now - voice.started < duration]
+
+        if active < self.max_voices and (free or len(pool) < self.voices_per_sound):
+            if free:
+                voice = free[0]
+            else:
+                voice = SfxVoice(media.Player())
+                pool.append(voice)
+            grown = 1
+        elif busy:
+            # Пул полон или предел голосов: обрываем самый старый голос этого звука
+            voice = min(busy, key=lambda voice: voice.started)
+            self.stolen += 1
+            grown = 0
+        else:
+            self.dropped += 1
+            return 0
+
+        player = voice.player
+        player.volume = volume
+        if player.source is None:   # Новый голос или звук доиграл и выпал из очереди
+            player.queue(self.sounds[name].source)
+        else:
+            player.seek(0.0)
+        player.play()
+        voice.started = now
+        self.plays += 1
+        return grown
+
+    def report(self):
+        """Занятость пулов и счетчики."""
+        now = self.clock()
+        pools = {}
+        for name, pool in self.pools.items():
+            duration = self._duration(name)
+            pools[name] = {
+                "voices": len(pool),
+                "busy": sum(1 for voice in pool if now - voice.started < duration),
+            }
+        return {
+            "voices": sum(len(pool) for pool in self.pools.values()),
+            "active": self.active_voices(now),
+            "peak": self.peak,
+            "plays": self.plays,
+            "coalesced": self.coalesced,
+            "stolen": self.stolen,
+            "dropped": self.dropped,
+            "pools": pools,
+        }
+
+
+# Один набор голосов на весь процесс
+SFX = SfxMixer()
+
+# =====================================================
+# ОБЩИЕ АНИМАЦИИ
+# =====================================================
+"""
+КАК РАБОТАЮТ АНИМАЦИИ:
+Анимация (например, "вращение монеты") - это группа:
+общие кадры, скорость и один общий счетчик кадра.
+За тик двигается только счетчик группы, а не каждый спрайт.
+У участника может быть свой сдвиг фазы, тогда его кадр -
+(счетчик + сдвиг) по кругу; для многих участников это
+считается сразу одним массивом.
+Картинка спрайта меняется, только если его кадр правда сменился.
+"""
+
+
+class AnimationGroup:
+    """
+    Общий счетчик кадров для всех спрайтов одной анимации.
+    """
+    def __init__(self, frames, speed):
+        self.frames = list(frames)  # Картинки по порядку
+        self.speed = speed          # Кадров за единицу времени (тик или секунду)
+        self.position = 0.0         # Общий дробный кадр
+
+    def advance(self, amount=1.0):
+        """Двигает анимацию на amount единиц времени (по умолчанию - на один тик)."""
+        self.position = (self.position + self.speed * amount) % len(self.frames)
+
+    def frame(self, phase=0.0):
+        """Номер кадра участника со сдвигом phase."""
+        return int((self.position + phase) % len(self.frames))
+
+    def frames_for(self, phases):
+        """Номера кадров сразу для массива сдвигов."""
+        return ((self.position + phases) % len(self.frames)).astype(np.int64)
+
+    def texture(self, phase=0.0):
+        """Картинка участника со сдвигом phase."""
+        return self.frames[self.frame(phase)]
+
+    def apply(self, sprite, phase=0.0):
+        """Ставит спрайту текущую картинку, если она сменилась."""
+        texture = self.texture(phase)
+        if sprite.texture is not texture:
+            sprite.texture = texture
+
+
 # =====================================================
 # ФАКЕЛ ДЛЯ СТАРТОВОГО ЭКРАНА
 # =====================================================
@@ -91,14 +601,13 @@ class Torch(arcade.Sprite):
     """
     def __init__(self):
         super().__init__(scale=1)
-        # Три картинки для анимации
-        self.frames = [
-            arcade.load_texture(":resources:/images/tiles/torchOff.png"),
-            arcade.load_texture(":resources:/images/tiles/torch1.png"),
-            arcade.load_texture(":resources:/images/tiles/torch2.png"),
-        ]
-        self.index = 0          # Номер текущей картинки
-        self.texture = self.frames[0]  # Текущая картинка
+        # Три картинки, 6 кадров в секунду
+        self.flicker = AnimationGroup([
+            ASSETS.texture(":resources:/images/tiles/torchOff.png"),
+            ASSETS.texture(":resources:/images/tiles/torch1.png"),
+            ASSETS.texture(":resources:/images/tiles/torch2.png"),
+        ], 6)
+        self.texture = self.flicker.texture()  # Текущая картинка
 
     def update_animation(self, delta_time: float = 1 / 60):
         """
@@ -107,95 +616,150 @@ class Torch(arcade.Sprite):
         Аргумент:
             delta_time: время с прошлого кадра
         """
-        # Меняем картинку плавно
-        self.index = (self.index + 0.1) % len(self.frames)
-        self.texture = self.frames[int(self.index)]
+        # Меняем картинку плавно (время здесь - в секундах)
+        self.flicker.advance(delta_time)
+        self.flicker.apply(self)
 
 # =====================================================
 # СИСТЕМА ЧАСТИЦ (ДЛЯ ЭФФЕКТОВ)
 # =====================================================
-class Particle(arcade.SpriteCircle):
-    """
-    Одна маленькая частица для спецэффектов.
-    Используется для взрывов, искр и других красот.
-    """
-    def __init__(self, x, y, color, size=3, velocity=None, lifetime=1.0):
-        super().__init__(size, color)
-        # Координаты частицы
-        self.center_x = x
-        self.center_y = y
-        # Сколько живет частица
-        self.lifetime = lifetime
-        self.age = 0
-        # Скорость движения
-        self.velocity_x = 0
-        self.velocity_y = 0
-        
-        # Если скорость задана - берем ее
-        if velocity:
-            self.velocity_x, self.velocity_y = velocity
-        else:
-            # Иначе делаем случайное направление
-            angle = random.uniform(0, 2 * math.pi)  # Угол
-            speed = random.uniform(10, 30)          # Скорость
-            self.velocity_x = math.cos(angle) * speed
-            self.velocity_y = math.sin(angle) * speed
-    
-    def update_particle(self, delta_time):
-        """
-        Обновляет состояние частицы.
-        """
-        # Увеличиваем возраст
-        self.age += delta_time
-        
-        # Если прожила достаточно - удаляем
-        if self.age >= self.lifetime:
-            self.remove_from_sprite_lists()
-            return
-        
-        # Замедляем частицу (как в воздухе)
-        self.velocity_x *= 0.95
-        self.velocity_y *= 0.95
-        
-        # Гравитация тянет вниз
-        self.velocity_y -= 0.5
-        
-        # Двигаем частицу
-        self.center_x += self.velocity_x * delta_time * 60
-        self.center_y += self.velocity_y * delta_time * 60
-        
-        # Частица постепенно исчезает
-        alpha = int(255 * (1 - self.age / self.lifetime))
-        self.alpha = alpha
+"""
+КАК УСТРОЕНЫ ЧАСТИЦЫ:
+Частицы не являются отдельными спрайтами. Все их свойства
+(позиция, скорость, возраст, время жизни, размер, цвет)
+хранятся в массивах NumPy, по одной строке на частицу.
+Обновление - это несколько операций над целыми массивами,
+а рисование - один вызов видеокарты для всех частиц сразу.
+"""
+# Шейдер: каждая частица рисуется одной точкой нужного размера
+PARTICLE_VERTEX_SHADER = """
+#version 330
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+in vec2 in_pos;
+in float in_size;
+in vec4 in_color;
+out vec4 v_color;
+
+void main() {
+    gl_Position = proj.matrix * vec4(in_pos, 0.0, 1.0);
+    gl_PointSize = in_size * 2.0;
+    v_color = in_color;
+}
+"""
+
+# Шейдер: делаем из квадратной точки круг
+PARTICLE_FRAGMENT_SHADER = """
+#version 330
+
+in vec4 v_color;
+out vec4 out_color;
+
+void main() {
+    vec2 offset = gl_PointCoord - vec2(0.5);
+    if (dot(offset, offset) > 0.25) {
+        discard;
+    }
+    out_color = v_color;
+}
+"""
+
+# Как одна частица лежит в памяти видеокарты
+PARTICLE_VERTEX_DTYPE = np.dtype([
+    ("pos", np.float32, 2),
+    ("size", np.float32),
+    ("color", np.uint8, 4),
+])
+
 
 class ParticleSystem:
     """
     Управляет всеми частицами вместе.
+    Данные хранятся в массивах, а не в объектах.
     """
-    def __init__(self):
-        self.particles = arcade.SpriteList()  # Все частицы
+    def __init__(self, capacity=1024, seed=None):
+        self.count = 0                        # Сколько частиц живо
+        self.rng = np.random.default_rng(seed)  # Случайные числа
+        self._allocate(capacity)
         self.time_since_last_update = 0       # Таймер
         self.update_interval = 1/60           # Обновлять 60 раз в секунду
-    
+
+        # Ресурсы видеокарты создаются при первом рисовании
+        self._program = None
+        self._buffer = None
+        self._geometry = None
+
+    def __len__(self):
+        return self.count
+
+    def _allocate(self, capacity):
+        """Создает (или увеличивает) массивы под capacity частиц."""
+        old = self.count
+        positions = np.zeros((capacity, 2), dtype=np.float32)
+        velocities = np.zeros((capacity, 2), dtype=np.float32)
+        ages = np.zeros(capacity, dtype=np.float32)
+        lifetimes = np.ones(capacity, dtype=np.float32)
+        sizes = np.zeros(capacity, dtype=np.float32)
+        colors = np.zeros((capacity, 4), dtype=np.uint8)
+        if old:
+            # Переносим живые частицы в новые массивы
+            positions[:old] = self.positions[:old]
+            velocities[:old] = self.velocities[:old]
+            ages[:old] = self.ages[:old]
+            lifetimes[:old] = self.lifetimes[:old]
+            sizes[:old] = self.sizes[:old]
+            colors[:old] = self.colors[:old]
+        self.positions = positions      # Координаты (x, y)
+        self.velocities = velocities    # Скорость (vx, vy)
+        self.ages = ages                # Сколько прожила
+        self.lifetimes = lifetimes      # Сколько должна прожить
+        self.sizes = sizes              # Радиус
+        self.colors = colors            # Цвет (r, g, b, прозрачность)
+        self.capacity = capacity
+
+    def emit(self, x, y, color, count, size_range, lifetime_range):
+        """
+        Добавляет count частиц в точке (x, y),
+        летящих в случайные стороны.
+        """
+        if count <= 0:
+            return
+        needed = self.count + count
+        if needed > self.capacity:
+            # Растим массивы в 2 раза, чтобы не делать это часто
+            capacity = self.capacity
+            while capacity < needed:
+                capacity *= 2
+            self._allocate(capacity)
+
+        new = slice(self.count, needed)
+        # Случайное направление и скорость
+        angle = self.rng.uniform(0, 2 * math.pi, count)
+        speed = self.rng.uniform(10, 30, count)
+        self.positions[new] = (x, y)
+        self.velocities[new, 0] = np.cos(angle) * speed
+        self.velocities[new, 1] = np.sin(angle) * speed
+        self.ages[new] = 0
+        self.lifetimes[new] = self.rng.uniform(*lifetime_range, count)
+        self.sizes[new] = self.rng.integers(size_range[0], size_range[1] + 1, count)
+        self.colors[new, :3] = color[:3]
+        self.colors[new, 3] = 255
+        self.count = needed
+
     def create_explosion(self, x, y, color=arcade.color.ORANGE, count=20):
         """
         Создает эффект взрыва.
         """
-        for _ in range(count):
-            particle = Particle(x, y, color, 
-                               size=random.randint(2, 5),
-                               lifetime=random.uniform(0.5, 1.5))
-            self.particles.append(particle)
+        self.emit(x, y, color, count, size_range=(2, 5), lifetime_range=(0.5, 1.5))
     
     def create_sparkle(self, x, y, color=arcade.color.GOLD, count=10):
         """
         Создает эффект искр.
         """
-        for _ in range(count):
-            particle = Particle(x, y, color,
-                               size=random.randint(1, 3),
-                               lifetime=random.uniform(0.3, 0.8))
-            self.particles.append(particle)
+        self.emit(x, y, color, count, size_range=(1, 3), lifetime_range=(0.3, 0.8))
     
     def update(self, delta_time):
         """
@@ -203,16 +767,302 @@ class ParticleSystem:
         """
         self.time_since_last_update += delta_time
         if self.time_since_last_update >= self.update_interval:
-            for particle in self.particles:
-                if hasattr(particle, 'update_particle'):
-                    particle.update_particle(self.time_since_last_update)
+            self.step(self.time_since_last_update)
             self.time_since_last_update = 0
-    
+
+    def step(self, delta_time):
+        """
+        Один шаг для всех частиц сразу.
+        """
+        n = self.count
+        if n == 0:
+            return
+
+        # Увеличиваем возраст
+        ages = self.ages[:n]
+        ages += delta_time
+
+        # Убираем тех, кто прожил достаточно: живые сдвигаются в начало
+        alive = ages < self.lifetimes[:n]
+        if not alive.all():
+            keep = np.flatnonzero(alive)
+            n = len(keep)
+            self.positions[:n] = self.positions[keep]
+            self.velocities[:n] = self.velocities[keep]
+            self.ages[:n] = self.ages[keep]
+            self.lifetimes[:n] = self.lifetimes[keep]
+            self.sizes[:n] = self.sizes[keep]
+            self.colors[:n] = self.colors[keep]
+            self.count = n
+            if n == 0:
+                return
+
+        velocities = self.velocities[:n]
+        # Замедляем частицы (как в воздухе)
+        velocities *= 0.95
+        # Гравитация тянет вниз
+        velocities[:, 1] -= 0.5
+        # Двигаем частицы
+        self.positions[:n] += velocities * (delta_time * 60)
+        # Частицы постепенно исчезают
+        self.colors[:n, 3] = (255 * (1 - self.ages[:n] / self.lifetimes[:n])).astype(np.uint8)
+
+    def _vertex_data(self):
+        """Собирает данные частиц в один массив для видеокарты."""
+        n = self.count
+        data = np.empty(n, dtype=PARTICLE_VERTEX_DTYPE)
+        data["pos"] = self.positions[:n]
+        data["size"] = self.sizes[:n]
+        data["color"] = self.colors[:n]
+        return data
+
     def draw(self):
         """
-        Рисует все частицы.
+        Рисует все частицы одним вызовом.
+        """
+        if self.count == 0:
+            return
+        ctx = arcade.get_window().ctx
+        if self._program is None:
+            self._program = ctx.program(
+                vertex_shader=PARTICLE_VERTEX_SHADER,
+                fragment_shader=PARTICLE_FRAGMENT_SHADER,
+            )
+
+        data = self._vertex_data()
+        # Буфер пересоздаем только когда частиц стало больше, чем в нем места
+        if self._buffer is None or self._buffer.size < data.nbytes:
+            self._buffer = ctx.buffer(reserve=self.capacity * PARTICLE_VERTEX_DTYPE.itemsize,
+                                      usage="stream")
+            self._geometry = ctx.geometry(
+                [arcade.gl.BufferDescription(
+                    self._buffer, "2f 1f 4f1",
+                    ["in_pos", "in_size", "in_color"],
+                    normalized=["in_color"],
+                )],
+                mode=ctx.POINTS,
+            )
+        self._buffer.orphan()
+        self._buffer.write(data.tobytes())
+
+        with ctx.enabled(ctx.BLEND, ctx.PROGRAM_POINT_SIZE):
+            self._geometry.render(self._program, vertices=self.count)
+
+# =====================================================
+# СТАТИЧНЫЙ СЛОЙ (ЗАРАНЕЕ НАРИСОВАННЫЕ КУСКИ КАРТЫ)
+# =====================================================
+"""
+КАК РАБОТАЕТ СТАТИЧНЫЙ СЛОЙ:
+Стены, лестницы, шипы и грибы никогда не двигаются.
+Поэтому карта делится на квадратные куски, и каждый кусок
+один раз рисуется в свою картинку в памяти видеокарты.
+Каждый кадр рисуются только куски, которые видит камера -
+по одному прямоугольнику на кусок. Время кадра зависит
+от размера экрана, а не от размера карты.
+Если плитка внутри куска меняется, перерисовывается только этот кусок.
+Далекие куски выгружаются, когда готовых картинок слишком много.
+"""
+STATIC_CHUNK_SIZE = TILE * 8   # Сторона куска в пикселях
+STATIC_MAX_CHUNKS = 64         # Сколько готовых кусков держать в памяти
+
+# Шейдер: растягиваем квадрат на место куска в мире
+STATIC_VERTEX_SHADER = """
+#version 330
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+uniform vec4 rect;
+
+in vec2 in_vert;
+out vec2 v_uv;
+
+void main() {
+    gl_Position = proj.matrix * vec4(rect.xy + in_vert * rect.zw, 0.0, 1.0);
+    v_uv = in_vert;
+}
+"""
+
+# Шейдер: просто берем цвет из картинки куска
+STATIC_FRAGMENT_SHADER = """
+#version 330
+
+uniform sampler2D layer;
+
+in vec2 v_uv;
+out vec4 out_color;
+
+void main() {
+    out_color = texture(layer, v_uv);
+}
+"""
+
+
+class StaticLayer:
+    """
+    Неподвижные спрайты, собранные в заранее нарисованные куски.
+    """
+    def __init__(self, sprite_lists, chunk_size=STATIC_CHUNK_SIZE,
+                 max_chunks=STATIC_MAX_CHUNKS):
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.chunks = {}          # (cx, cy) -> список спрайтов куска
+        self.sprite_chunks = {}   # спрайт -> куски, которые он задевает
+        self.baked = {}           # (cx, cy) -> кадровый буфер куска
+        self.dirty = set()        # Куски, которые надо перерисовать
+        self.bakes = 0            # Сколько раз рисовали куски
+        self._program = None
+        self._quad = None
+
+        for sprite_list in sprite_lists:
+            for sprite in sprite_list:
+                self.add(sprite)
+
+    def _chunk_keys(self, sprite):
+        """Все куски, которые задевает спрайт."""
+        size = self.chunk_size
+        left = int(sprite.left // size)
+        right = int((sprite.right - 1) // size)
+        bottom = int(sprite.bottom // size)
+        top = int((sprite.top - 1) // size)
+        return [(cx, cy)
+                for cx in range(left, right + 1)
+                for cy in range(bottom, top + 1)]
+
+    def add(self, sprite):
+        """Добавляет спрайт в слой."""
+        keys = self._chunk_keys(sprite)
+        self.sprite_chunks[sprite] = keys
+        for key in keys:
+            if key not in self.chunks:
+                self.chunks[key] = arcade.SpriteList()
+            self.chunks[key].append(sprite)
+            self.dirty.add(key)
+
+    def remove(self, sprite):
+        """Убирает спрайт из слоя. Пустые куски удаляются совсем."""
+        for key in self.sprite_chunks.pop(sprite, ()):
+            self.chunks[key].remove(sprite)
+            self.dirty.add(key)
+            if not self.chunks[key]:
+                del self.chunks[key]
+                self.dirty.discard(key)
+                framebuffer = self.baked.pop(key, None)
+                if framebuffer is not None:
+                    framebuffer.color_attachments[0].release()
+
+    def reset(self, sprite_lists):
+        """
+        Собирает слой заново из других спрайтов (новый забег).
+        Картинки старых кусков отпускаются, шейдер и квадрат остаются.
+        """
+        for framebuffer in self.baked.values():
+            framebuffer.color_attachments[0].release()
+        self.baked.clear()
+        self.chunks.clear()
+        self.sprite_chunks.clear()
+        self.dirty.clear()
+        for sprite_list in sprite_lists:
+            for sprite in sprite_list:
+                self.add(sprite)
+
+    def update_sprite(self, sprite):
+        """
+        Сообщает, что спрайт изменился (картинка или место).
+        Перерисуются только куски, которые он задевал и задевает.
+        """
+        self.remove(sprite)
+        self.add(sprite)
+
+    def visible_keys(self, left, bottom, width, height):
+        """Куски, которые попадают в прямоугольник экрана."""
+        size = self.chunk_size
+        first_x, last_x = int(left // size), int((left + width) // size)
+        first_y, last_y = int(bottom // size), int((bottom + height) // size)
+        return [(cx, cy)
+                for cy in range(first_y, last_y + 1)
+                for cx in range(first_x, last_x + 1)
+                if (cx, cy) in self.chunks]
+
+    def _bake(self, ctx, key):
+        """Рисует один кусок в его картинку."""
+        framebuffer = self.baked.pop(key, None)
+        if framebuffer is None:
+            texture = ctx.texture((self.chunk_size, self.chunk_size), components=4,
+                                  filter=(ctx.NEAREST, ctx.NEAREST))
+            framebuffer = ctx.framebuffer(color_attachments=[texture])
+        # Самый свежий кусок - в конце словаря
+        self.baked[key] = framebuffer
+        self.dirty.discard(key)
+        self.bakes += 1
+
+        x, y = key[0] * self.chunk_size, key[1] * self.chunk_size
+        with framebuffer.activate():
+            framebuffer.clear()
+            ctx.projection_2d = (x, x + self.chunk_size, y, y + self.chunk_size)
+            # SpriteList.draw сам ставит смешивание, раздельное туда не передать.
+            # Поэтому два прохода: цвет обычным смешиванием (выходит цвет,
+            # уже умноженный на прозрачность), потом одна прозрачность -
+            # "один плюс", чтобы она копилась честно и края не темнели
+            gl.glColorMask(True, True, True, False)
+            self.chunks[key].draw(blend_function=ctx.BLEND_DEFAULT)
+            gl.glColorMask(False, False, False, True)
+            self.chunks[key].draw(blend_function=(ctx.ONE, ctx.ONE_MINUS_SRC_ALPHA))
+            gl.glColorMask(True, True, True, True)
+            ctx.blend_func = ctx.BLEND_DEFAULT
+
+    def _evict(self, keep):
+        """Выгружает самые старые куски, если их слишком много."""
+        for key in list(self.baked):
+            if len(self.baked) <= self.max_chunks:
+                break
+            if key not in keep:
+                self.baked.pop(key).color_attachments[0].release()
+                self.dirty.add(key)
+
+    def draw(self, camera):
+        """
+        Рисует куски, которые видит камера.
+        Неготовые и измененные куски сначала перерисовываются.
         """
-        self.particles.draw()
+        ctx = arcade.get_window().ctx
+        if self._program is None:
+            self._program = ctx.program(
+                vertex_shader=STATIC_VERTEX_SHADER,
+                fragment_shader=STATIC_FRAGMENT_SHADER,
+            )
+            self._quad = ctx.geometry(
+                [arcade.gl.BufferDescription(
+                    ctx.buffer(data=np.array([0, 0, 1, 0, 0, 1, 1, 1],
+                                             dtype=np.float32).tobytes()),
+                    "2f", ["in_vert"],
+                )],
+                mode=ctx.TRIANGLE_STRIP,
+            )
+
+        left, bottom = camera.position
+        keys = self.visible_keys(left, bottom, camera.viewport_width, camera.viewport_height)
+
+        stale = [key for key in keys if key in self.dirty or key not in self.baked]
+        if stale:
+            projection = ctx.projection_2d_matrix
+            viewport = ctx.viewport
+            for key in stale:
+                self._bake(ctx, key)
+            ctx.projection_2d_matrix = projection
+            ctx.viewport = viewport
+            self._evict(set(keys))
+
+        # Куски уже с умноженным цветом, поэтому смешиваем "один плюс"
+        ctx.blend_func = ctx.ONE, ctx.ONE_MINUS_SRC_ALPHA
+        self._program["layer"] = 0
+        for key in keys:
+            self.baked[key].color_attachments[0].use(0)
+            self._program["rect"] = (key[0] * self.chunk_size, key[1] * self.chunk_size,
+                                     self.chunk_size, self.chunk_size)
+            self._quad.render(self._program)
+        ctx.blend_func = ctx.BLEND_DEFAULT
 
 # =====================================================
 # ФИЗИЧЕСКИЙ ДВИЖОК
@@ -223,7 +1073,10 @@ class PhysicsObject(arcade.Sprite):
     Добавляет гравитацию, трение и столкновения.
     """
     def __init__(self, texture, scale=1.0):
-        super().__init__(texture, scale)
+        # Картинку можно передать путем - тогда она берется со склада
+        if isinstance(texture, str):
+            texture = ASSETS.texture(texture)
+        super().__init__(texture=texture, scale=scale)
         # Скорость по осям
         self.velocity_x = 0
         self.velocity_y = 0
@@ -233,54 +1086,58 @@ class PhysicsObject(arcade.Sprite):
         self.gravity = 0.5      # Сила тяжести
         self.friction = 0.8     # Трение (замедление)
         self.bounce_factor = 0.5  # Отскок от стен
+        self._body_offsets = None  # Границы тела (считаются один раз)
     
-    def update_physics(self, walls):
+    def body_offsets(self):
+        """
+        Границы тела относительно центра (по рамке столкновений).
+
+        Возвращает:
+            (лево, право, низ, верх)
+        """
+        if self._body_offsets is None:
+            xs = [x * self.scale for x, _ in self.hit_box]
+            ys = [y * self.scale for _, y in self.hit_box]
+            self._body_offsets = (min(xs), max(xs), min(ys), max(ys))
+        return self._body_offsets
+
+    def update_physics(self, grid):
         """
         Применяет физику к объекту.
+        Стены берутся прямо из сетки уровня (LevelGeometry):
+        сначала движемся по x, потом по y, и на каждой оси
+        останавливаемся у первой сплошной клетки на пути.
         """
         # Падаем вниз из-за гравитации
         self.velocity_y -= self.gravity
         
         # Замедляемся из-за трения
         self.velocity_x *= self.friction
-        
-        # Запоминаем старую позицию
-        old_x = self.center_x
-        old_y = self.center_y
-        
-        # Двигаемся
-        self.center_x += self.velocity_x
-        self.center_y += self.velocity_y
-        
+
         # Считаем, что мы не на земле
         self.on_ground = False
-        
-        # Проверяем столкновения со стенами
-        hit_list = arcade.check_for_collision_with_list(self, walls)
-        
-        for wall in hit_list:
-            # С какой стороны столкнулись
-            dx = self.center_x - wall.center_x
-            dy = self.center_y - wall.center_y
-            
-            # Если больше по горизонтали - стукнулись сбоку
-            if abs(dx) > abs(dy):
-                if dx > 0:  # Справа от стены
-                    self.left = wall.right
-                else:       # Слева от стены
-                    self.right = wall.left
-                # Отскакиваем от стены
-                self.velocity_x = -self.velocity_x * self.bounce_factor
-            
-            # Если больше по вертикали - сверху или снизу
-            else:
-                if dy > 0:  # Ударились головой
-                    self.bottom = wall.top
-                    self.velocity_y = 0
-                else:       # Встали на землю
-                    self.top = wall.bottom
-                    self.velocity_y = -self.velocity_y * self.bounce_factor
-                    self.on_ground = True  # Теперь на земле
+
+        left, right, bottom, top = self.body_offsets()
+        x, y = self.center_x, self.center_y
+
+        # Двигаемся по горизонтали
+        dx, hit = grid.sweep_x(x + left, x + right, y + bottom, y + top, self.velocity_x)
+        x += dx
+        if hit:
+            # Отскакиваем от стены
+            self.velocity_x = -self.velocity_x * self.bounce_factor
+
+        # Двигаемся по вертикали
+        dy, hit = grid.sweep_y(x + left, x + right, y + bottom, y + top, self.velocity_y)
+        y += dy
+        if hit:
+            if self.velocity_y > 0:  # Ударились головой
+                self.velocity_y = 0
+            else:                    # Встали на землю
+                self.velocity_y = -self.velocity_y * self.bounce_factor
+                self.on_ground = True  # Теперь на земле
+
+        self.position = (x, y)
         
         # Ограничиваем скорость, чтобы не летали слишком быстро
         max_speed = 10
@@ -292,160 +1149,3886 @@ class PhysicsObject(arcade.Sprite):
 # =====================================================
 class Enemy(PhysicsObject):
     """
-    Враги, которые ходят сами по себе.
-    Простой ИИ для патрулирования территории.
+    Враг, который ходит сам по себе.
+    Сам спрайт только рисуется: патрулирование и физику
+    всех врагов сразу считает EnemyManager.
     """
     def __init__(self, texture, scale=0.5, move_speed=1.0):
         super().__init__(texture, scale)
         self.move_speed = move_speed      # Скорость врага
-        self.move_direction = 1           # 1 = вправо, -1 = влево
-        self.move_timer = 0               # Таймер
-        self.move_interval = random.uniform(1.0, 3.0)  # Когда менять направление
-    
-    def update_ai(self, delta_time, walls):
-        """
-        Обновляет поведение врага.
-        """
-        # Увеличиваем таймер
-        self.move_timer += delta_time
-        
-        # Если время пришло - меняем направление
-        if self.move_timer >= self.move_interval:
-            self.move_direction *= -1  # Меняем на противоположное
-            self.move_timer = 0
-            self.move_interval = random.uniform(1.0, 3.0)
-        
-        # Двигаем врага
-        self.velocity_x = self.move_speed * self.move_direction
-        
-        # Обновляем физику
-        self.update_physics(walls)
-        
-        # Иногда подпрыгивает
-        if self.on_ground and random.random() < 0.01:
-            self.velocity_y = random.uniform(3, 6)
+        self.kind = ""                    # Вид врага ("mouse", "frog")
+        self.manager_index = -1           # Номер в EnemyManager
 
-# =====================================================
-# АНИМИРОВАННАЯ МОНЕТА
-# =====================================================
-class AnimatedCoin(PhysicsObject):
+
+"""
+КАК РАБОТАЕТ ТОЛПА ВРАГОВ:
+Таймеры, направления, скорости и координаты всех врагов
+лежат в массивах NumPy. За один шаг для всех врагов сразу:
+- выбирается, куда идти: если у уровня есть граф дорог (NavGraph),
+  следующий шаг берется из его таблицы - к точке обхода, а рядом
+  с игроком - как велит вид (ENEMY_NEAR_PLAYER): за игроком, мимо него
+  или прочь от него; если графа нет, направление меняется по таймеру;
+- считается гравитация и трение (на лестнице тяжести нет);
+- тело двигается по x, потом по y до первой стены в сетке уровня;
+- враг прыгает: по графу - когда уперся в ступеньку, без графа -
+  иногда, по кубику.
+Спрайты получают новые координаты только перед рисованием.
+
+КАК ВРАГИ ЗАСЫПАЮТ:
+Враги далеко от игрока спят: их шаг не считается совсем.
+Область, где враги не спят, - прямоугольник вокруг игрока: от игрока
+в каждую сторону на самое большое окно (MAX_SCREEN_WIDTH x MAX_SCREEN_HEIGHT,
+больше окно не растягивается) плюс запас. Дальше этого кадр не видно,
+даже когда камера уперлась в край карты и игрок стоит у края экрана.
+Область зависит только от игрока, а не от текущего окна,
+поэтому повторы от размера окна не зависят.
+Неспящие враги лежат в начале массивов подряд (первые awake),
+и шаг, столкновения и спрайты берут только их - цена тика
+зависит от того, что рядом с игроком, а не от размера уровня.
+Кто уснул и кто проснулся, проверяется раз в ENEMY_SLEEP_CHECK шагов;
+засыпают чуть дальше, чем просыпаются, чтобы враг на краю
+не засыпал и не просыпался каждую проверку.
+Как спит враг, зависит от вида (ENEMY_SLEEP):
+- freeze - замирает и просыпается там же, каким был;
+- fast_forward - при пробуждении догоняет проспанное время разом:
+  по графу перескакивает по узлам своей дороги, но не ближе
+  ENEMY_VIEW_WIDTH x ENEMY_VIEW_HEIGHT к игроку (туда, где его может быть видно),
+  без графа - только прокручивает таймер направления.
+"""
+# Поля врага и их типы
+ENEMY_FIELDS = {
+    "x": np.float64, "y": np.float64,              # Центр
+    "prev_x": np.float64, "prev_y": np.float64,    # Центр на прошлом тике
+    "vx": np.float64, "vy": np.float64,            # Скорость
+    "speed": np.float64,                           # Скорость ходьбы
+    "direction": np.float64,                       # 1 = вправо, -1 = влево
+    "timer": np.float64, "interval": np.float64,   # Когда менять направление
+    "gravity": np.float64, "friction": np.float64, "bounce": np.float64,
+    "body_left": np.float64, "body_right": np.float64,    # Границы тела
+    "body_bottom": np.float64, "body_top": np.float64,    # относительно центра
+    "on_ground": np.bool_,                         # На земле ли
+    "node": np.int64,                              # Последний узел графа под врагом
+    "goal": np.int64,                              # Точка обхода (узел графа)
+    "fast_forward": np.bool_,                      # Проспанное время догоняет (иначе замирает)
+    "chases": np.bool_,                            # Рядом с игроком бежит к нему
+    "flees": np.bool_,                             # Рядом с игроком убегает
+    "asleep_at": np.float64,                       # Когда заснул (время менеджера)
+}
+ENEMY_MAX_SPEED = 10    # Быстрее врагов не разгоняем (меньше клетки)
+
+# Сон врагов вдали от игрока
+ENEMY_VIEW_WIDTH = MAX_SCREEN_WIDTH             # Дальше всего кадр видно от игрока по x
+ENEMY_VIEW_HEIGHT = MAX_SCREEN_HEIGHT           # и по y (камера у края карты)
+ENEMY_ACTIVE_WIDTH = ENEMY_VIEW_WIDTH + 2 * TILE    # Полуширина области, где враги не спят
+ENEMY_ACTIVE_HEIGHT = ENEMY_VIEW_HEIGHT + 2 * TILE  # Ее полувысота
+ENEMY_SLEEP_MARGIN = TILE                       # Засыпают на столько дальше, чем просыпаются
+ENEMY_SLEEP_CHECK = 10                          # Раз в столько шагов проверяем сон
+SLEEP_FREEZE = "freeze"                         # Спит на месте
+SLEEP_FAST_FORWARD = "fast_forward"             # Просыпаясь, догоняет проспанное
+ENEMY_SLEEP = {                                 # Вид врага -> как он спит
+    "mouse": SLEEP_FAST_FORWARD,
+    "frog": SLEEP_FREEZE,
+}
+
+# Что враг делает рядом с игроком (ближе NAV_CHASE_STEPS шагов по графу).
+# Мышь и лягушку игрок спасает, поэтому они от него убегают -
+# иначе стоящий на месте игрок получал бы спасения даром
+# (даже наугад гуляющая лягушка рано или поздно на него натыкается)
+NEAR_CHASE = "chase"                            # Бежит к игроку
+NEAR_PATROL = "patrol"                          # Не замечает игрока
+NEAR_FLEE = "flee"                              # Убегает от игрока
+ENEMY_NEAR_PLAYER = {                           # Вид врага -> что делает рядом с игроком
+    "mouse": NEAR_FLEE,
+    "frog": NEAR_FLEE,
+}
+
+
+class EnemyManager:
     """
-    Монета, которая красиво вращается и плавает.
+    Все враги уровня в массивах и один общий шаг для них.
     """
-    def __init__(self, x, y):
-        super().__init__(":resources:/images/items/gold_1.png", 0.4)
-        # Кадры для анимации вращения
-        self.frames = [
-            arcade.load_texture(":resources:/images/items/gold_1.png"),
-            arcade.load_texture(":resources:/images/items/gold_2.png"),
-            arcade.load_texture(":resources:/images/items/gold_3.png"),
-            arcade.load_texture(":resources:/images/items/gold_4.png"),
-        ]
-        self.index = 0                  # Текущий кадр
-        self.texture = self.frames[0]   # Текущая картинка
-        self.center_x = x
-        self.center_y = y
-        self.float_timer = 0            # Для плавания
-        self.float_height = 2           # Высота плавания
-        self.original_y = y             # Начальная высота
-        self.collected = False          # Собрана ли монета
-    
-    def update_animation(self, delta_time: float = 1 / 60):
+    def __init__(self, grid, capacity=64, seed=None):
+        self.grid = grid                        # Сетка стен уровня
+        self.rng = np.random.default_rng(seed)  # Случайные числа
+        self.count = 0                          # Сколько врагов
+        self.sprites = []                       # Спрайты по номерам
+        self.arrays = {name: np.zeros(capacity, dtype=dtype)
+                       for name, dtype in ENEMY_FIELDS.items()}
+        self.solid = grid.solid_cells()         # Сетка стен массивом
+        self.nav = None                         # Граф дорог (NavGraph), если есть
+        self.player_node = -1                   # Последний узел графа под игроком
+        self.awake = 0                          # Первые awake врагов не спят
+        self.time = 0.0                         # Время шагов (для проспанного)
+        self.steps = 0                          # Сколько было шагов
+
+    def __len__(self):
+        return self.count
+
+    def __getattr__(self, name):
+        # Доступ к массивам по имени поля: manager.x, manager.vy ...
+        arrays = self.__dict__.get("arrays")
+        if arrays is not None and name in arrays:
+            return arrays[name][:self.count]
+        raise AttributeError(name)
+
+    def add(self, sprite):
         """
-        Обновляет анимацию монеты.
+        Добавляет врага. Начальные значения берутся из спрайта.
+
+        Возвращает:
+            номер врага
         """
-        # Меняем кадр для вращения
-        self.index = (self.index + 0.15) % len(self.frames)
-        self.texture = self.frames[int(self.index)]
-        
-        # Плавающее движение вверх-вниз
-        self.float_timer += delta_time
-        # Синус дает плавное движение
-        self.center_y = self.original_y + math.sin(self.float_timer * 2) * self.float_height
+        if self.count == len(self.arrays["x"]):
+            # Растим массивы в 2 раза
+            for name, array in self.arrays.items():
+                grown = np.zeros(len(array) * 2, dtype=array.dtype)
+                grown[:self.count] = array[:self.count]
+                self.arrays[name] = grown
+
+        i = self.count
+        left, right, bottom, top = sprite.body_offsets()
+        values = {
+            "x": sprite.center_x, "y": sprite.center_y,
+            "prev_x": sprite.center_x, "prev_y": sprite.center_y,
+            "vx": sprite.velocity_x, "vy": sprite.velocity_y,
+            "speed": sprite.move_speed, "direction": 1,
+            "timer": 0, "interval": self.rng.uniform(1.0, 3.0),
+            "gravity": sprite.gravity, "friction": sprite.friction,
+            "bounce": sprite.bounce_factor,
+            "body_left": left, "body_right": right,
+            "body_bottom": bottom, "body_top": top,
+            "on_ground": False,
+            "node": -1, "goal": -1,
+            "fast_forward": ENEMY_SLEEP.get(sprite.kind) == SLEEP_FAST_FORWARD,
+            "chases": ENEMY_NEAR_PLAYER.get(sprite.kind, NEAR_CHASE) == NEAR_CHASE,
+            "flees": ENEMY_NEAR_PLAYER.get(sprite.kind) == NEAR_FLEE,
+            "asleep_at": 0.0,
+        }
+        for name, value in values.items():
+            self.arrays[name][i] = value
+        sprite.manager_index = i
+        self.sprites.append(sprite)
+        self.count += 1
+
+        # Новый враг не спит, пока проверка не решит иначе
+        self._swap(i, self.awake)
+        self.awake += 1
+        return sprite.manager_index
+
+    def _swap(self, i, j):
+        """Меняет местами врагов i и j в массивах."""
+        if i == j:
+            return
+        for array in self.arrays.values():
+            array[[i, j]] = array[[j, i]]
+        sprites = self.sprites
+        sprites[i], sprites[j] = sprites[j], sprites[i]
+        sprites[i].manager_index = i
+        sprites[j].manager_index = j
+
+    def remove(self, sprite):
+        """Убирает врага: на его место встает последний."""
+        i = sprite.manager_index
+        if i < self.awake:
+            # Сначала уводим его в конец неспящих, чтобы они остались подряд
+            self.awake -= 1
+            self._swap(i, self.awake)
+            i = self.awake
+        last = self.count - 1
+        if i != last:
+            for array in self.arrays.values():
+                array[i] = array[last]
+            moved = self.sprites[last]
+            self.sprites[i] = moved
+            moved.manager_index = i
+        self.sprites.pop()
+        sprite.manager_index = -1
+        self.count -= 1
+
+    def update_sleep(self, target):
+        """
+        Усыпляет врагов далеко от игрока и будит тех, к кому он подошел.
+        target - (x, y) игрока.
+        """
+        px, py = target
+        dx = np.abs(self.x - px)
+        dy = np.abs(self.y - py)
+        near = (dx <= ENEMY_ACTIVE_WIDTH) & (dy <= ENEMY_ACTIVE_HEIGHT)
+        far = ((dx > ENEMY_ACTIVE_WIDTH + ENEMY_SLEEP_MARGIN)
+               | (dy > ENEMY_ACTIVE_HEIGHT + ENEMY_SLEEP_MARGIN))
+        awake = np.arange(self.count) < self.awake
+        # Номера меняются при перестановках, поэтому запоминаем спрайты
+        sleepers = [self.sprites[i] for i in np.flatnonzero(awake & far).tolist()]
+        wakers = [self.sprites[i] for i in np.flatnonzero(~awake & near).tolist()]
+
+        asleep_at = self.arrays["asleep_at"]
+        for sprite in sleepers:
+            self.awake -= 1
+            self._swap(sprite.manager_index, self.awake)
+            asleep_at[self.awake] = self.time
+        for sprite in wakers:
+            self._swap(sprite.manager_index, self.awake)
+            self._catch_up(self.awake, target)
+            self.awake += 1
+
+    def _catch_up(self, i, target):
+        """Проснувшийся враг i догоняет проспанное время, если его вид так спит."""
+        arrays = self.arrays
+        if arrays["fast_forward"][i]:
+            slept = self.time - arrays["asleep_at"][i]
+            if self.nav is not None:
+                self._skip_route(i, slept, target)
+            else:
+                # Без графа враг ходит туда-сюда: прокручиваем только таймер
+                timer = arrays["timer"][i] + slept
+                flips = int(timer // arrays["interval"][i])
+                arrays["timer"][i] = timer % arrays["interval"][i]
+                if flips % 2:
+                    arrays["direction"][i] *= -1
+        # Плавное рисование начинается с того места, где он проснулся
+        arrays["prev_x"][i] = arrays["x"][i]
+        arrays["prev_y"][i] = arrays["y"][i]
+
+    def _skip_route(self, i, slept, target):
+        """
+        Переносит врага i по узлам его дороги на столько клеток,
+        сколько он прошел бы за slept секунд. В кадр не переносим:
+        туда враг дойдет сам.
+        """
+        nav = self.nav
+        arrays = self.arrays
+        node = int(arrays["node"][i])
+        if node < 0:
+            # Уснул, не успев сделать ни шага по графу
+            node = nav.node_at_point(arrays["x"][i], arrays["y"][i])
+            if node < 0:
+                return
+        goal = int(arrays["goal"][i])
+        px, py = target
+        cells = int(slept / TICK_TIME * arrays["speed"][i] * arrays["friction"][i] // TILE)
+        start = node
+        for _ in range(min(cells, nav.count)):
+            if goal < 0 or goal == node or nav.dist[node, goal] == NAV_UNREACHABLE:
+                goal = int(self.rng.integers(nav.count))   # Новая точка обхода
+                continue
+            hop = int(nav.next_hop[node, goal])
+            if (abs(nav.center_x[hop] - px) <= ENEMY_VIEW_WIDTH
+                    and abs(nav.center_y[hop] - py) <= ENEMY_VIEW_HEIGHT):
+                break
+            node = hop
+        arrays["goal"][i] = goal
+        arrays["timer"][i] = 0
+        if node != start:
+            # Стоит на полу клетки узла
+            arrays["node"][i] = node
+            arrays["x"][i] = nav.center_x[node]
+            arrays["y"][i] = nav.center_y[node] - TILE // 2 - arrays["body_bottom"][i]
+            arrays["vx"][i] = 0.0
+            arrays["vy"][i] = 0.0
+
+    def _solid_at(self, gx, gy):
+        """Сплошные ли клетки (массивы gx, gy). За картой - пусто."""
+        rows, cols = self.solid.shape
+        return self.solid[np.clip(gy + 1, 0, rows - 1), np.clip(gx + 1, 0, cols - 1)]
+
+    def _span_blocked(self, fixed, low, high, vertical):
+        """
+        Есть ли стена в клетках от low до high (включительно)
+        в столбце fixed (vertical=True) или строке fixed.
+        """
+        blocked = np.zeros(len(fixed), dtype=bool)
+        span = int((high - low).max()) + 1 if len(fixed) else 0
+        for k in range(span):
+            cell = low + k
+            inside = cell <= high
+            if vertical:
+                blocked |= inside & self._solid_at(fixed, cell)
+            else:
+                blocked |= inside & self._solid_at(cell, fixed)
+        return blocked
+
+    def _route(self, a, target, delta_time):
+        """
+        Следующий узел графа для каждого врага (-1 - стоять).
+        Обычно идем к точке обхода. Игрок ближе NAV_CHASE_STEPS шагов -
+        кто гонится (chases), идет к нему, а кто убегает (flees), идет
+        к самому дальнему от игрока узлу, куда может дойти и игрок
+        (загнать в угол и спасти можно).
+        """
+        nav = self.nav
+        x, y = a["x"], a["y"]
+        here = nav.node_at(np.floor(x / TILE).astype(np.int64),
+                           np.floor((y + TILE // 2) / TILE).astype(np.int64))
+        # В прыжке и в падении враг помнит узел, с которого ушел
+        known = here >= 0
+        a["node"][known] = here[known]
+        node = a["node"]
+        placed = node >= 0
+        if target is not None:
+            player = nav.node_at_point(*target)
+            if player >= 0:
+                self.player_node = player
+
+        # Новая точка обхода: старая достигнута, недостижима или не дается слишком долго
+        from_node = np.maximum(node, 0)
+        goal = a["goal"]
+        a["timer"] += delta_time
+        lost = ((goal < 0) | (goal == node) | (a["timer"] >= NAV_PATROL_TIMEOUT)
+                | (nav.dist[from_node, np.maximum(goal, 0)] == NAV_UNREACHABLE))
+        repick = placed & lost
+        picks = int(np.count_nonzero(repick))
+        if picks:
+            goal[repick] = self.rng.integers(nav.count, size=picks)
+            a["timer"][repick] = 0
+
+        towards = goal
+        if self.player_node >= 0:
+            near = placed & (nav.dist[from_node, self.player_node] <= NAV_CHASE_STEPS)
+            flee = near & a["flees"]
+            if flee.any():
+                away = nav.dist[self.player_node].astype(np.int64)
+                away[away == NAV_UNREACHABLE] = -1
+                reach = nav.dist[from_node[flee]] != NAV_UNREACHABLE
+                goal[flee] = np.where(reach, away, -1).argmax(axis=1)
+            towards = np.where(near & a["chases"], self.player_node, goal)
+        hop = nav.next_hop[from_node, np.maximum(towards, 0)].astype(np.int64)
+        return np.where(placed & (towards >= 0), hop, -1)
+
+    def _steer(self, a, hop, vy):
+        """
+        Скорости к следующему узлу графа.
+
+        Возвращает:
+            (vx, vy, нужен ли прыжок)
+        """
+        nav = self.nav
+        x, y = a["x"], a["y"]
+        gx = np.floor(x / TILE).astype(np.int64)
+        gy = np.floor((y + TILE // 2) / TILE).astype(np.int64)
+        here = nav.node_at(gx, gy)
+        on_ladder = (here >= 0) & nav.ladder[np.maximum(here, 0)]
+
+        has_hop = hop >= 0
+        to = np.maximum(hop, 0)
+
+        # Идем к середине клетки следующего узла (не проскакивая ее)
+        dx = np.where(has_hop, nav.center_x[to] - x, 0.0)
+        a["direction"][:] = np.sign(dx)
+        step = a["speed"] * a["friction"]
+        vx = np.clip(dx, -step, step)
+
+        # На лестнице тяжести нет: лезем до высоты следующего узла
+        target_y = np.where(has_hop, nav.center_y[to], y)
+        vertical = on_ladder & has_hop & (nav.gx[to] == gx)
+        up = on_ladder & (target_y > y + EDGE_EPSILON)
+        down = vertical & (target_y < y - EDGE_EPSILON)
+        vy = np.where(up, NAV_CLIMB_SPEED,
+                      np.where(down, -NAV_CLIMB_SPEED, np.where(on_ladder, 0.0, vy)))
+
+        # Следующий узел выше и в соседнем столбце - это ступенька, на нее прыгаем
+        wants_jump = has_hop & ~on_ladder & (nav.gx[to] != gx) & (nav.gy[to] > gy)
+        return vx, vy, wants_jump
+
+    def step(self, delta_time, target=None):
+        """
+        Один шаг для всех неспящих врагов сразу.
+        target - (x, y) игрока: по графу враги бегут к нему,
+        а далеко от него засыпают. Без target не спит никто.
+        """
+        self.time += delta_time
+        self.steps += 1
+        if self.count and target is not None and self.steps % ENEMY_SLEEP_CHECK == 1:
+            self.update_sleep(target)
+        n = self.awake
+        if n == 0:
+            return
+        a = {name: array[:n] for name, array in self.arrays.items()}
+        rng = self.rng
+
+        # Запоминаем, где были, чтобы рисовать плавно между тиками
+        a["prev_x"][:] = a["x"]
+        a["prev_y"][:] = a["y"]
+
+        if self.nav is not None:
+            # Куда идти, смотрим в таблицу графа
+            hop = self._route(a, target, delta_time)
+        else:
+            # Тикают таймеры, у кого время пришло - меняют направление
+            a["timer"] += delta_time
+            flip = a["timer"] >= a["interval"]
+            flips = int(np.count_nonzero(flip))
+            if flips:
+                a["direction"][flip] *= -1
+                a["timer"][flip] = 0
+                a["interval"][flip] = rng.uniform(1.0, 3.0, flips)
+
+        # Скорость ходьбы, гравитация и трение
+        vx = a["speed"] * a["direction"] * a["friction"]
+        vy = a["vy"] - a["gravity"]
+        if self.nav is not None:
+            vx, vy, wants_jump = self._steer(a, hop, vy)
+        x, y = a["x"], a["y"]
+
+        half = TILE // 2
+        eps = EDGE_EPSILON
+
+        # Двигаемся по горизонтали
+        left = x + a["body_left"]
+        right = x + a["body_right"]
+        bottom = y + a["body_bottom"]
+        top = y + a["body_top"]
+        gy_low = np.floor((bottom + half) / TILE).astype(np.int64)
+        gy_high = np.floor((top + half - eps) / TILE).astype(np.int64)
+        moving_right = vx > 0
+        # Скорость меньше клетки, поэтому за шаг заходим максимум в один новый столбец
+        column = np.where(moving_right,
+                          np.floor((right - eps) / TILE) + 1,
+                          np.floor(left / TILE) - 1).astype(np.int64)
+        entering = np.where(moving_right,
+                            np.floor((right + vx - eps) / TILE) >= column,
+                            (vx < 0) & (np.floor((left + vx) / TILE) <= column))
+        hit_x = entering & self._span_blocked(column, gy_low, gy_high, vertical=True)
+        dx = np.where(hit_x,
+                      np.where(moving_right, column * TILE - right, (column + 1) * TILE - left),
+                      vx)
+        x += dx
+        vx = np.where(hit_x, -vx * a["bounce"], vx)
+
+        # Двигаемся по вертикали
+        left = x + a["body_left"]
+        right = x + a["body_right"]
+        gx_low = np.floor(left / TILE).astype(np.int64)
+        gx_high = np.floor((right - eps) / TILE).astype(np.int64)
+        moving_up = vy > 0
+        row = np.where(moving_up,
+                       np.floor((top + half - eps) / TILE) + 1,
+                       np.floor((bottom + half) / TILE) - 1).astype(np.int64)
+        entering = np.where(moving_up,
+                            np.floor((top + vy + half - eps) / TILE) >= row,
+                            (vy < 0) & (np.floor((bottom + vy + half) / TILE) <= row))
+        hit_y = entering & self._span_blocked(row, gx_low, gx_high, vertical=False)
+        dy = np.where(hit_y,
+                      np.where(moving_up, row * TILE - half - top, row * TILE + half - bottom),
+                      vy)
+        y += dy
+        landed = hit_y & ~moving_up
+        vy = np.where(hit_y, np.where(moving_up, 0.0, -vy * a["bounce"]), vy)
+        a["on_ground"][:] = landed
+
+        # Ограничиваем скорость
+        np.clip(vx, -ENEMY_MAX_SPEED, ENEMY_MAX_SPEED, out=a["vx"])
+        np.clip(vy, -ENEMY_MAX_SPEED, ENEMY_MAX_SPEED, out=a["vy"])
+
+        if self.nav is not None:
+            # Прыгают, когда стоят и уперлись в ступеньку, на которую ведет граф
+            a["vy"][landed & hit_x & wants_jump] = NAV_JUMP_SPEED
+        else:
+            # Иногда подпрыгивают
+            jump = landed & (rng.random(n) < 0.01)
+            jumps = int(np.count_nonzero(jump))
+            if jumps:
+                a["vy"][jump] = rng.uniform(3, 6, jumps)
+
+    def overlapping(self, left, right, bottom, top):
+        """
+        Враги, чье тело пересекает прямоугольник.
+        Спящие враги далеко от игрока, поэтому смотрим только неспящих.
+
+        Возвращает:
+            список спрайтов
+        """
+        n = self.awake
+        if n == 0:
+            return []
+        a = {name: self.arrays[name][:n]
+             for name in ("x", "y", "body_left", "body_right", "body_bottom", "body_top")}
+        x, y = a["x"], a["y"]
+        hits = np.flatnonzero(
+            (x + a["body_left"] < right) & (x + a["body_right"] > left) &
+            (y + a["body_bottom"] < top) & (y + a["body_top"] > bottom)
+        )
+        return [self.sprites[i] for i in hits]
+
+    def sync_sprites(self, alpha=1.0):
+        """
+        Переносит координаты из массивов в спрайты (для рисования).
+        alpha - доля пути от прошлого тика к текущему.
+        Спящие враги не двигаются, их спрайты уже на месте.
+        """
+        n = self.awake
+        arrays = self.arrays
+        x, y = arrays["x"][:n], arrays["y"][:n]
+        prev_x, prev_y = arrays["prev_x"][:n], arrays["prev_y"][:n]
+        xs = prev_x + (x - prev_x) * alpha
+        ys = prev_y + (y - prev_y) * alpha
+        for sprite, x, y in zip(self.sprites, xs.tolist(), ys.tolist()):
+            sprite.position = (x, y)
+
+
+# =====================================================
+# ХРАНИЛИЩЕ ПРЕДМЕТОВ
+# =====================================================
+"""
+КАК ХРАНЯТСЯ ПРЕДМЕТЫ:
+Как и у врагов, игровое состояние предметов одного вида
+(координаты, таймеры, кадры) лежит в массивах NumPy,
+а спрайт - только картинка этого состояния.
+У каждого предмета есть номер (id), который не меняется,
+и место в массивах, которое меняется при удалении:
+на место удаленного встает последний, и массивы
+остаются сплошными. Ручка Entity - это только хранилище
+и номер (__slots__, без своего словаря).
+Собранный или взорванный предмет просто удаляется
+из хранилища: "живой" значит "лежит в хранилище".
+Спрайты получают новое состояние не каждый тик, а только
+когда нужны: рядом с игроком (для столкновений)
+и на экране (для рисования).
+"""
+
+
+class Entity:
+    """
+    Ручка предмета: хранилище и номер.
+    Поля читаются и пишутся как entity["timer"].
+    """
+    __slots__ = ("store", "id")
+
+    def __init__(self, store, entity_id):
+        self.store = store
+        self.id = entity_id
+
+    @property
+    def alive(self):
+        """Лежит ли предмет еще в хранилище."""
+        return self.id in self.store.slots
+
+    def remove(self):
+        """Удаляет предмет из хранилища."""
+        return self.store.remove(self.id)
+
+    def __getitem__(self, name):
+        return self.store.get(self.id, name)
+
+    def __setitem__(self, name, value):
+        self.store.set(self.id, name, value)
+
+    def __repr__(self):
+        return f"Entity({self.id}, alive={self.alive})"
+
+
+class EntityStore:
+    """
+    Предметы одного вида в сплошных массивах.
+    """
+    def __init__(self, fields, capacity=64):
+        self.fields = fields                    # Имя поля -> тип
+        self.count = 0                          # Сколько предметов
+        self.next_id = 0                        # Номер следующего предмета
+        self.arrays = {name: np.zeros(capacity, dtype=dtype)
+                       for name, dtype in fields.items()}
+        self.ids = np.zeros(capacity, dtype=np.int64)  # Место -> номер
+        self.slots = {}                         # Номер -> место
+        self.sprites = []                       # Место -> спрайт (для рисования)
+
+    def __len__(self):
+        return self.count
+
+    def __getattr__(self, name):
+        # Доступ к массивам по имени поля: store.x, store.timer ...
+        arrays = self.__dict__.get("arrays")
+        if arrays is not None and name in arrays:
+            return arrays[name][:self.count]
+        raise AttributeError(name)
+
+    def view(self):
+        """Все поля живых предметов: имя -> срез массива."""
+        return {name: array[:self.count] for name, array in self.arrays.items()}
+
+    def add(self, sprite=None, **values):
+        """
+        Добавляет предмет. Незаданные поля равны нулю.
+        Спрайт получает ручку в sprite.entity.
+
+        Возвращает:
+            ручку Entity
+        """
+        if self.count == len(self.ids):
+            # Растим массивы в 2 раза
+            for name, array in self.arrays.items():
+                grown = np.zeros(len(array) * 2, dtype=array.dtype)
+                grown[:self.count] = array[:self.count]
+                self.arrays[name] = grown
+            grown = np.zeros(len(self.ids) * 2, dtype=self.ids.dtype)
+            grown[:self.count] = self.ids[:self.count]
+            self.ids = grown
+
+        slot = self.count
+        entity_id = self.next_id
+        self.next_id += 1
+        for array in self.arrays.values():
+            array[slot] = 0
+        for name, value in values.items():
+            self.arrays[name][slot] = value
+        self.ids[slot] = entity_id
+        self.slots[entity_id] = slot
+        self.sprites.append(sprite)
+        self.count += 1
+
+        entity = Entity(self, entity_id)
+        if sprite is not None:
+            sprite.entity = entity
+        return entity
+
+    def remove(self, entity_id):
+        """
+        Удаляет предмет: на его место встает последний.
+
+        Возвращает:
+            True, если предмет был в хранилище
+        """
+        slot = self.slots.pop(entity_id, None)
+        if slot is None:
+            return False
+        last = self.count - 1
+        if slot != last:
+            for array in self.arrays.values():
+                array[slot] = array[last]
+            moved = int(self.ids[last])
+            self.ids[slot] = moved
+            self.slots[moved] = slot
+            self.sprites[slot] = self.sprites[last]
+        self.sprites.pop()
+        self.count -= 1
+        return True
+
+    def get(self, entity_id, name):
+        """Значение поля предмета."""
+        return self.arrays[name][self.slots[entity_id]].item()
+
+    def set(self, entity_id, name, value):
+        """Меняет поле предмета."""
+        self.arrays[name][self.slots[entity_id]] = value
+
+
+# =====================================================
+# АНИМИРОВАННАЯ МОНЕТА
+# =====================================================
+# Поля монеты и их типы. Вращение и плавание общие для всех монет
+# (AnimationGroup и общее время), у монеты - только сдвиги фазы
+COIN_FIELDS = {
+    "x": np.float64, "base_y": np.float64,     # Где лежит
+    "phase": np.float64,                       # Сдвиг кадра вращения
+    "wave_phase": np.float64,                  # Сдвиг плавания (в радианах)
+    "shown_frame": np.int64,                   # Какой кадр сейчас у спрайта
+    "shown_y": np.float64,                     # Какая высота сейчас у спрайта
+}
+COIN_FRAMES = [f":resources:/images/items/gold_{i}.png" for i in range(1, 5)]
+COIN_SPIN_SPEED = 0.15  # Кадров вращения за тик
+COIN_FLOAT_HEIGHT = 2   # Высота плавания
+
+
+class AnimatedCoin(arcade.Sprite):
+    """
+    Картинка монеты. Вращение и плавание всех монет
+    считает CoinStore, а спрайт только рисуется.
+    """
+    def __init__(self, x, y):
+        super().__init__(texture=ASSETS.texture(COIN_FRAMES[0]), scale=0.4)
+        self.center_x = x
+        self.center_y = y
+        self.entity = None      # Ручка в хранилище монет
+
+
+class CoinStore(EntityStore):
+    """
+    Все монеты уровня: общее вращение и общее плавание.
+    """
+    def __init__(self, capacity=64):
+        super().__init__(COIN_FIELDS, capacity)
+        self.spin = AnimationGroup([ASSETS.texture(path) for path in COIN_FRAMES],
+                                   COIN_SPIN_SPEED)
+        self.time = 0.0         # Общее время плавания
+        self.prev_time = 0.0    # Оно же на прошлом тике
+
+    def add(self, sprite, phase=0.0, wave_phase=0.0):
+        """Добавляет монету там, где стоит ее спрайт (со своими сдвигами фазы)."""
+        return super().add(sprite, x=sprite.center_x, base_y=sprite.center_y,
+                           phase=phase, wave_phase=wave_phase,
+                           shown_frame=0, shown_y=sprite.center_y)
+
+    def step(self, delta_time):
+        """Один тик для всех монет: двигаются только общие счетчики."""
+        self.spin.advance()
+        self.prev_time = self.time
+        self.time += delta_time
+
+    def sync_sprites(self, alpha=1.0, box=None, snap=False):
+        """
+        Переносит кадр и высоту монет в спрайты.
+        Спрайт трогается, только если у него правда что-то сменилось.
+
+        Аргументы:
+            alpha: доля пути от прошлого тика к текущему (1 - ровно текущий)
+            box: (лево, право, низ, верх) - только монеты в нем; None - все
+            snap: высота до целого пикселя (для рисования монета
+                  тогда двигается всего несколько раз за взмах)
+        """
+        if self.count == 0:
+            return
+        a = self.view()
+        if box is None:
+            slots = np.arange(self.count)
+        else:
+            left, right, bottom, top = box
+            slots = np.flatnonzero((a["x"] >= left) & (a["x"] <= right) &
+                                   (a["base_y"] >= bottom) & (a["base_y"] <= top))
+        sprites = self.sprites
+
+        # Кадр вращения
+        frames = self.spin.frames_for(a["phase"][slots])
+        changed = frames != a["shown_frame"][slots]
+        textures = self.spin.frames
+        for slot, frame in zip(slots[changed].tolist(), frames[changed].tolist()):
+            sprites[slot].texture = textures[frame]
+        a["shown_frame"][slots] = frames
+
+        # Плавающее движение вверх-вниз: синус дает плавное движение
+        if alpha < 1:
+            t = self.prev_time + (self.time - self.prev_time) * alpha
+        else:
+            t = self.time
+        ys = a["base_y"][slots] + np.sin(t * 2 + a["wave_phase"][slots]) * COIN_FLOAT_HEIGHT
+        if snap:
+            ys = np.round(ys)
+        changed = ys != a["shown_y"][slots]
+        for slot, y in zip(slots[changed].tolist(), ys[changed].tolist()):
+            sprites[slot].center_y = y
+        a["shown_y"][slots] = ys
+
 
 # =====================================================
 # БОМБА
 # =====================================================
+# Поля бомбы: пока лежит в хранилище - не взорвалась
+BOMB_FIELDS = {"x": np.float64, "y": np.float64}
+
+
 class Bomb(arcade.Sprite):
     """
     Бомба, которая взрывается при касании.
     """
     def __init__(self, x, y):
-        super().__init__(":resources:/images/tiles/bomb.png", 0.5)
+        super().__init__(texture=ASSETS.texture(":resources:/images/tiles/bomb.png"), scale=0.5)
         self.center_x = x
         self.center_y = y
-        self.active = True       # Еще не взорвалась
-        
+        self.entity = None      # Ручка в хранилище бомб
+
     def explode(self, particle_system):
         """
         Взрыв бомбы.
         """
-        self.active = False
+        if self.entity is not None:
+            self.entity.remove()
         # Создаем эффект взрыва
-        particle_system.create_explosion(self.center_x, self.center_y, 
-                                        arcade.color.ORANGE_RED, 30)
+        particle_system.create_explosion(self.center_x, self.center_y,
+                                         arcade.color.ORANGE_RED, 30)
         self.remove_from_sprite_lists()  # Удаляем бомбу
 
 # =====================================================
 # СИСТЕМА РЕКОРДОВ
 # =====================================================
-def load_records():
+"""
+КАК ХРАНЯТСЯ РЕКОРДЫ:
+Каждое прохождение уровня записывается в базу SQLite (records.db)
+отдельной строкой, поэтому хранится вся история, а не только лучший результат.
+- Запись идет в отдельном потоке, игра не ждет диск. Этот же поток
+  открывает базу, переносит старый файл и загружает историю,
+  поэтому создание хранилища при запуске игры ничего не ждет.
+- SQLite пишет транзакциями: если игра упадет посреди записи,
+  база останется целой. Несколько игр могут работать с одной базой.
+- Читаем из памяти: при запуске вся история загружается один раз,
+  потом подтягиваются только новые строки: после каждой записи
+  и раз в RECORDS_POLL_SECONDS (забеги других игр с той же базой).
+Старый файл records.json один раз переносится в базу.
+"""
+RECORDS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL UNIQUE,
+    level INTEGER NOT NULL,
+    character TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    coins INTEGER NOT NULL,
+    diamonds INTEGER NOT NULL,
+    saved_mouse INTEGER NOT NULL,
+    saved_frog INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_level ON runs (level, score DESC, time);
+CREATE INDEX IF NOT EXISTS runs_by_character ON runs (level, character, score DESC, time);
+"""
+
+# Колонки забега в том порядке, в каком они лежат в базе
+RUN_COLUMNS = ("run_id", "level", "character", "score", "coins", "diamonds",
+               "saved_mouse", "saved_frog", "time", "created")
+
+
+# Очки за предметы (уровень из файла может задать свои)
+SCORE_WEIGHTS = {"coin": 10, "diamond": 50, "rescue": 100}
+LEVEL_WEIGHTS = {}      # Номер уровня -> свои очки из файла уровня
+
+
+def calculate_score(coins, diamonds, saved_mouse, saved_frog, weights=None):
     """
-    Загружает рекорды из файла.
-    Если файла нет - возвращает пустой словарь.
+    Считает очки:
+    монета = 10 очков, алмаз = 50 очков,
+    спасение врага = 100 очков (или как задано в weights).
     """
-    if not os.path.exists(RECORDS_FILE):
-        return {}
-    try:
-        with open(RECORDS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return {}
+    weights = weights or SCORE_WEIGHTS
+    score = coins * weights["coin"] + diamonds * weights["diamond"]
+    if saved_mouse:
+        score += weights["rescue"]
+    if saved_frog:
+        score += weights["rescue"]
+    return score
+
+
+def _run_order(run):
+    """Порядок забегов: больше очков, потом меньше время."""
+    return -run["score"], run["time"]
+
+
+class RecordStore:
+    """
+    История забегов: база SQLite на диске и копия в памяти.
+    """
+    def __init__(self, path=RECORDS_DB, legacy_file=RECORDS_FILE):
+        self.path = path
+        self.legacy_file = legacy_file
+        self.lock = threading.Lock()   # Защищает копию в памяти
+        self.runs = {}                 # run_id -> забег
+        self.last_id = 0               # Последняя прочитанная строка базы
+        self.queue = queue.Queue()     # Забеги, ждущие записи
+
+        # Поток, который открывает базу и пишет на диск
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def _open_database(self):
+        """Соединение с базой в режиме WAL и с нужными таблицами."""
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(RECORDS_SCHEMA)
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+    def _connect(self):
+        """
+        Открывает базу. Испорченный файл откладывается в сторону.
+        Занятая другой игрой база не испорчена: ее ждем несколько раз,
+        а если так и не дождались - ошибка уходит наверх
+        (поток записи тогда держит рекорды только в памяти).
+        """
+        for attempt in range(RECORDS_LOCK_RETRIES):
+            try:
+                return self._open_database()
+            except sqlite3.OperationalError as error:
+                # Занято, нет доступа и т. п. - файл не трогаем
+                if attempt == RECORDS_LOCK_RETRIES - 1:
+                    raise
+                print(f"База рекордов {self.path} занята ({error}), ждем",
+                      file=sys.stderr)
+            except sqlite3.DatabaseError as error:
+                broken = f"{self.path}.broken-{int(time.time())}"
+                print(f"Файл рекордов {self.path} испорчен ({error}), "
+                      f"он сохранен как {broken}", file=sys.stderr)
+                os.replace(self.path, broken)
+                return self._open_database()
+
+    def _migrate_legacy(self, connection):
+        """
+        Переносит рекорды из старого records.json в пустую базу.
+        У перенесенных забегов постоянные run_id ("legacy-level_1"),
+        поэтому две игры, запущенные разом, не задвоят строки.
+        Неполные записи пропускаются.
+        """
+        if not os.path.exists(self.legacy_file):
+            return
+        if connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]:
+            return
+        try:
+            with open(self.legacy_file, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as error:
+            print(f"Не удалось прочитать {self.legacy_file}: {error}", file=sys.stderr)
+            return
+        if not isinstance(legacy, dict):
+            print(f"Не удалось прочитать {self.legacy_file}: это не словарь рекордов",
+                  file=sys.stderr)
+            return
+        with connection:
+            for name, record in legacy.items():
+                try:
+                    level = int(name.split("_")[-1])
+                    score = record.get("score")
+                    run = self._make_run(level, "", int(record["coins"]),
+                                         int(record["diamonds"]),
+                                         bool(record["saved_mouse"]),
+                                         bool(record["saved_frog"]), float(record["time"]),
+                                         None if score is None else int(score),
+                                         run_id=f"legacy-{name}")
+                except (KeyError, ValueError, TypeError, AttributeError) as error:
+                    print(f"Рекорд {name!r} из {self.legacy_file} пропущен: {error!r}",
+                          file=sys.stderr)
+                    continue
+                self._insert(connection, run)
+
+    @staticmethod
+    def _make_run(level, character, coins, diamonds, saved_mouse, saved_frog,
+                  time_sec, score=None, run_id=None):
+        """Собирает забег в словарь."""
+        if score is None:
+            score = calculate_score(coins, diamonds, saved_mouse, saved_frog,
+                                    LEVEL_WEIGHTS.get(level))
+        return {
+            "run_id": run_id or uuid.uuid4().hex,
+            "level": level,
+            "character": character,
+            "score": score,
+            "coins": coins,
+            "diamonds": diamonds,
+            "saved_mouse": bool(saved_mouse),
+            "saved_frog": bool(saved_frog),
+            "time": time_sec,
+            "created": time.time(),
+        }
+
+    @staticmethod
+    def _insert(connection, run):
+        """Вставляет забег (повтор того же run_id пропускается)."""
+        connection.execute(
+            f"INSERT OR IGNORE INTO runs ({', '.join(RUN_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(RUN_COLUMNS))})",
+            [run[column] for column in RUN_COLUMNS],
+        )
+
+    def _pull(self, connection):
+        """Подтягивает в память строки, которых там еще нет."""
+        rows = connection.execute(
+            f"SELECT id, {', '.join(RUN_COLUMNS)} FROM runs WHERE id > ? ORDER BY id",
+            (self.last_id,),
+        ).fetchall()
+        with self.lock:
+            for row in rows:
+                run = dict(zip(RUN_COLUMNS, row[1:]))
+                run["saved_mouse"] = bool(run["saved_mouse"])
+                run["saved_frog"] = bool(run["saved_frog"])
+                self.runs[run["run_id"]] = run
+                self.last_id = max(self.last_id, row[0])
+
+    def _write_loop(self):
+        """
+        Поток записи: открывает базу и загружает историю,
+        потом пишет забеги из очереди в базу, а пока очередь пуста,
+        раз в RECORDS_POLL_SECONDS подтягивает чужие забеги.
+        """
+        try:
+            connection = self._connect()
+            self._migrate_legacy(connection)
+            self._pull(connection)
+        except (sqlite3.Error, OSError) as error:
+            # Без базы игра идет дальше, рекорды живут только в памяти
+            print(f"База рекордов недоступна: {error}", file=sys.stderr)
+            connection = None
+
+        waiting = []   # Забеги, которые ждут, пока другая игра отпустит базу
+        while True:
+            try:
+                run = self.queue.get(timeout=RECORDS_POLL_SECONDS)
+            except queue.Empty:
+                if connection is not None:
+                    waiting = self._store(connection, waiting)
+                continue
+            if run is None:
+                self.queue.task_done()
+                break
+            if connection is not None:
+                waiting = self._store(connection, waiting + [run])
+            self.queue.task_done()
+        if connection is not None:
+            self._store(connection, waiting)
+            connection.close()
+
+    def _store(self, connection, runs):
+        """
+        Пишет забеги одной транзакцией и подтягивает новые строки.
+
+        Возвращает:
+            забеги, которые надо записать позже (база была занята)
+        """
+        try:
+            with connection:
+                for run in runs:
+                    self._insert(connection, run)
+            self._pull(connection)
+        except sqlite3.OperationalError as error:
+            print(f"База рекордов занята ({error}), запись позже", file=sys.stderr)
+            return runs
+        except sqlite3.Error as error:
+            print(f"Не удалось записать рекорд: {error}", file=sys.stderr)
+        return []
+
+    def add_run(self, level, character, coins, diamonds, saved_mouse, saved_frog, time_sec):
+        """
+        Добавляет забег. В памяти он появляется сразу,
+        а на диск попадает в фоне.
+
+        Возвращает:
+            словарь забега
+        """
+        run = self._make_run(level, character, coins, diamonds,
+                             saved_mouse, saved_frog, time_sec)
+        with self.lock:
+            self.runs[run["run_id"]] = run
+        self.queue.put(run)
+        return run
+
+    def top(self, level, count=10, character=None):
+        """
+        Лучшие забеги уровня (можно только для одного персонажа).
+
+        Возвращает:
+            список забегов, лучший первым
+        """
+        with self.lock:
+            runs = [run for run in self.runs.values()
+                    if run["level"] == level
+                    and (character is None or run["character"] == character)]
+        runs.sort(key=_run_order)
+        return runs[:count]
+
+    def best(self, level, character=None):
+        """Лучший забег уровня или None."""
+        runs = self.top(level, 1, character)
+        return runs[0] if runs else None
+
+    def flush(self):
+        """Ждет, пока все забеги будут записаны на диск."""
+        self.queue.join()
+
+    def close(self):
+        """Дописывает очередь и останавливает поток записи."""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+
+
+_record_store = None
+
+
+def get_record_store():
+    """
+    Общее хранилище рекордов (создается при первом обращении,
+    в игре - при запуске, и сразу, без ожидания диска).
+    """
+    global _record_store
+    if _record_store is None:
+        _record_store = RecordStore()
+        atexit.register(_record_store.close)
+    return _record_store
+
+
+def save_record(level, coins, diamonds, saved_mouse, saved_frog, time_sec, character=""):
+    """
+    Записывает забег в историю и проверяет, стал ли он новым рекордом.
+    
+    Возвращает:
+        (рекорд, новый_ли_рекорд)
+    """
+    store = get_record_store()
+
+    # Берем старый рекорд для этого уровня
+    current_best = store.best(level)
+    run = store.add_run(level, character, coins, diamonds,
+                        saved_mouse, saved_frog, time_sec)
+    score = run["score"]
+    
+    # Проверяем, новый ли это рекорд
+    is_new = False
+    if not current_best:                     # Если рекорда еще нет
+        is_new = True
+    elif score > current_best["score"]:      # Если очков больше
+        is_new = True
+    elif score == current_best["score"] and time_sec < current_best["time"]:
+        is_new = True  # Очков столько же, но время меньше
+    
+    return (run if is_new else current_best), is_new
+
+# =====================================================
+# ГЕОМЕТРИЯ СТОЛКНОВЕНИЙ
+# =====================================================
+"""
+КАК УСТРОЕНА ГЕОМЕТРИЯ:
+Для рисования каждая стена остается отдельной плиткой 64x64.
+Для столкновений соседние сплошные плитки склеиваются
+в большие прямоугольники: сначала в каждой строке ищутся
+отрезки подряд идущих стен, потом одинаковые отрезки из
+соседних строк объединяются по вертикали.
+Физике приходится проверять намного меньше объектов.
+"""
+# Сплошные квадратные стены, которые можно склеивать
+SOLID_TILES_1 = "1d"    # Уровень 1 (верх двери - тоже стена)
+SOLID_TILES_2 = "12sg"  # Уровень 2
+SQUARE_TILES_2 = "12"   # Уровень 2 без камня и ростка (они не квадратные)
+ODD_TILES_2 = "sg"      # Камень и росток - стены со своей формой
+STATIC_TILES_2 = "12sgLTSm"  # Что никогда не двигается (рисуется статичным слоем)
+
+
+def merge_solid_tiles(mask):
+    """
+    Склеивает сплошные клетки в прямоугольники.
+
+    Аргумент:
+        mask: список строк, где "#" - стена, а любой другой символ - пусто
+
+    Возвращает:
+        список (столбец, строка, ширина, высота) в клетках,
+        строки считаются сверху, как в картах уровней
+    """
+    rects = []
+    open_rects = {}  # (начало, конец) отрезка -> прямоугольник, растущий вниз
+    for row, line in enumerate(mask):
+        runs = {}
+        for match in re.finditer(r"#+", line):
+            span = match.span()
+            rect = open_rects.pop(span, None)
+            if rect:
+                rect[3] += 1  # Такой же отрезок строкой выше - растим вниз
+            else:
+                rect = [span[0], row, span[1] - span[0], 1]
+            runs[span] = rect
+        # То, что не продолжилось в этой строке, уже готово
+        rects.extend(open_rects.values())
+        open_rects = runs
+    rects.extend(open_rects.values())
+    return [tuple(rect) for rect in rects]
+
+
+# Маленький запас, чтобы касание стены не считалось пересечением
+EDGE_EPSILON = 1e-6
+
+
+def _mask_lines(level_map, chars):
+    """Превращает карту в маску: "#" - символ из chars, "." - все остальное."""
+    table = {ord(ch): "." for line in level_map for ch in set(line)}
+    table.update({ord(ch): "#" for ch in chars})
+    return [line.translate(table) for line in level_map]
+
+
+class LevelGeometry:
+    """
+    Скомпилированная геометрия уровня:
+    сетка сплошных клеток и склеенные прямоугольники.
+
+    Клетки сетки считаются снизу вверх: клетка (gx, gy)
+    занимает по x отрезок [gx * TILE, (gx + 1) * TILE),
+    а по y - отрезок [gy * TILE - TILE / 2, gy * TILE + TILE / 2),
+    как и плитки, которые строит уровень.
+    """
+    def __init__(self, level_map, solid_chars, merge_chars=None):
+        self.rows = len(level_map)
+        self.cols = max((len(line) for line in level_map), default=0)
+        self.solid_chars = solid_chars
+        self.mask = _mask_lines(level_map, solid_chars)
+        # Сетка для быстрых проверок: строка gy - байты, 35 это "#"
+        self.grid = [b""] + [line.encode() for line in reversed(self.mask)]
+        # Склеиваем только квадратные плитки
+        if merge_chars is None or merge_chars == solid_chars:
+            self.rects = merge_solid_tiles(self.mask)
+        else:
+            self.rects = merge_solid_tiles(_mask_lines(level_map, merge_chars))
+
+    def solid_cells(self):
+        """
+        Сетка стен массивом NumPy с пустой рамкой вокруг карты:
+        клетка (gx, gy) лежит в [gy + 1, gx + 1].
+        """
+        cells = np.zeros((self.rows + 3, self.cols + 2), dtype=bool)
+        for gy in range(1, self.rows + 1):
+            line = np.frombuffer(self.grid[gy], dtype=np.uint8)
+            cells[gy + 1, 1:len(line) + 1] = line == 35
+        return cells
+
+    def is_solid(self, gx, gy):
+        """Сплошная ли клетка (gx, gy). За картой - пусто."""
+        if 0 < gy <= self.rows and gx >= 0:
+            line = self.grid[gy]
+            return gx < len(line) and line[gx] == 35
+        return False
+
+    def _column_blocked(self, gx, gy_low, gy_high):
+        """Есть ли стена в столбце gx между строками gy_low и gy_high."""
+        for gy in range(gy_low, gy_high + 1):
+            if self.is_solid(gx, gy):
+                return True
+        return False
+
+    def _row_blocked(self, gy, gx_low, gx_high):
+        """Есть ли стена в строке gy между столбцами gx_low и gx_high."""
+        if not 0 < gy <= self.rows:
+            return False
+        line = self.grid[gy]
+        return b"#" in line[max(0, gx_low):gx_high + 1]
+
+    def sweep_x(self, left, right, bottom, top, dx):
+        """
+        Двигает прямоугольник по x на dx, но не дальше первой стены.
+
+        Возвращает:
+            (настоящий сдвиг, уперлись ли в стену)
+        """
+        if dx == 0:
+            return 0, False
+        half = TILE // 2
+        gy_low = math.floor((bottom + half) / TILE)
+        gy_high = math.floor((top + half - EDGE_EPSILON) / TILE)
+        if dx > 0:
+            # Проверяем только новые столбцы, в которые заходим
+            first = math.floor((right - EDGE_EPSILON) / TILE) + 1
+            last = math.floor((right + dx - EDGE_EPSILON) / TILE)
+            for gx in range(first, last + 1):
+                if self._column_blocked(gx, gy_low, gy_high):
+                    return gx * TILE - right, True
+        else:
+            first = math.floor(left / TILE) - 1
+            last = math.floor((left + dx) / TILE)
+            for gx in range(first, last - 1, -1):
+                if self._column_blocked(gx, gy_low, gy_high):
+                    return (gx + 1) * TILE - left, True
+        return dx, False
+
+    def sweep_y(self, left, right, bottom, top, dy):
+        """
+        Двигает прямоугольник по y на dy, но не дальше первой стены.
+
+        Возвращает:
+            (настоящий сдвиг, уперлись ли в стену)
+        """
+        if dy == 0:
+            return 0, False
+        half = TILE // 2
+        gx_low = math.floor(left / TILE)
+        gx_high = math.floor((right - EDGE_EPSILON) / TILE)
+        if dy > 0:
+            first = math.floor((top + half - EDGE_EPSILON) / TILE) + 1
+            last = math.floor((top + dy + half - EDGE_EPSILON) / TILE)
+            for gy in range(first, last + 1):
+                if self._row_blocked(gy, gx_low, gx_high):
+                    return gy * TILE - half - top, True
+        else:
+            first = math.floor((bottom + half) / TILE) - 1
+            last = math.floor((bottom + dy + half) / TILE)
+            for gy in range(first, last - 1, -1):
+                if self._row_blocked(gy, gx_low, gx_high):
+                    return gy * TILE + half - bottom, True
+        return dy, False
+
+    @property
+    def tile_count(self):
+        """Сколько сплошных плиток на карте."""
+        return sum(line.count("#") for line in self.mask)
+
+    def rect_bounds(self, rect):
+        """
+        Переводит прямоугольник из клеток в координаты мира.
+
+        Возвращает:
+            (лево, низ, право, верх)
+        """
+        col, row, width, height = rect
+        left = col * TILE
+        right = (col + width) * TILE
+        top = (self.rows - row) * TILE + TILE // 2
+        bottom = (self.rows - row - height + 1) * TILE - TILE // 2
+        return left, bottom, right, top
+
+    def make_collision_list(self, offset_x=0, offset_y=0):
+        """
+        Создает невидимые спрайты-прямоугольники для физики.
+        Все они используют одну и ту же картинку, а их
+        размер задается только границами столкновений.
+        offset_x, offset_y сдвигают их (для кусков большого мира).
+        """
+        texture = ASSETS.texture(":resources:/images/tiles/grassCenter.png")
+        walls = arcade.SpriteList(use_spatial_hash=True)
+        for rect in self.rects:
+            left, bottom, right, top = self.rect_bounds(rect)
+            half_w = (right - left) / 2
+            half_h = (top - bottom) / 2
+            wall = arcade.Sprite(texture=texture)
+            wall.set_hit_box([(-half_w, -half_h), (half_w, -half_h),
+                              (half_w, half_h), (-half_w, half_h)])
+            # Быстрая предпроверка arcade идет по радиусу - он должен накрывать весь прямоугольник
+            wall.collision_radius = math.hypot(half_w, half_h)
+            wall.center_x = left + half_w + offset_x
+            wall.center_y = bottom + half_h + offset_y
+            walls.append(wall)
+        return walls
+
+# =====================================================
+# ВЗАИМОДЕЙСТВИЯ С ПРЕДМЕТАМИ
+# =====================================================
+"""
+КАК ИГРОК НАХОДИТ ПРЕДМЕТЫ:
+Все, что можно взять или обо что пораниться (монеты, алмазы,
+ключи, шипы, бомбы, двери), лежит в одной сетке: мир разбит
+на клетки, и каждый предмет записан в клетку своего центра
+вместе с видом ("coin", "spike", ...).
+За тик проверяются только клетки вокруг игрока, поэтому время
+не зависит от того, сколько всего предметов на уровне.
+Для каждого вида уровень регистрирует обработчик, и все
+найденные касания разбираются одним проходом в порядке
+INTERACTION_ORDER.
+"""
+# Какой предмет карты к какому виду относится
+INTERACTION_KINDS = {
+    "C": "coin",
+    "D": "diamond",
+    "K": "key",
+    "S": "spike",
+    "B": "bomb",
+    "d": "door",
+    "E": "door",
+}
+
+# В каком порядке разбираются касания за один тик
+# (сначала сбор, потом урон, дверь - последней)
+INTERACTION_ORDER = ("coin", "diamond", "key", "spike", "rescue", "bomb", "door")
+
+
+class InteractionIndex:
+    """
+    Сетка предметов, с которыми игрок может столкнуться.
+    Предметы не больше клетки, поэтому хватает соседних клеток.
+    """
+    def __init__(self, cell_size=TILE):
+        self.cell_size = cell_size
+        self.cells = {}         # (cx, cy) -> {спрайт: вид}
+        self.cell_of = {}       # спрайт -> его клетка
+        self.handlers = {}      # вид -> обработчик касания
+        self.rank = {kind: i for i, kind in enumerate(INTERACTION_ORDER)}
+
+    def __len__(self):
+        return len(self.cell_of)
+
+    def __contains__(self, sprite):
+        return sprite in self.cell_of
+
+    def _cell(self, x, y):
+        """Клетка сетки, в которой лежит точка."""
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def on(self, kind, handler):
+        """Регистрирует обработчик для вида предметов."""
+        self.handlers[kind] = handler
+
+    def add(self, sprite, kind):
+        """Кладет предмет в клетку его центра."""
+        cell = self._cell(sprite.center_x, sprite.center_y)
+        self.cells.setdefault(cell, {})[sprite] = kind
+        self.cell_of[sprite] = cell
+
+    def remove(self, sprite):
+        """Убирает предмет из сетки (если его там нет - ничего не делает)."""
+        cell = self.cell_of.pop(sprite, None)
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[sprite]
+        if not bucket:
+            del self.cells[cell]
+
+    def query(self, sprite):
+        """
+        Ищет предметы, которых касается спрайт.
+
+        Возвращает:
+            список (вид, предмет)
+        """
+        # Центр предмета не дальше клетки от края спрайта
+        left, bottom = self._cell(sprite.left - self.cell_size,
+                                  sprite.bottom - self.cell_size)
+        right, top = self._cell(sprite.right + self.cell_size,
+                                sprite.top + self.cell_size)
+        hits = []
+        cells = self.cells
+        for cx in range(left, right + 1):
+            for cy in range(bottom, top + 1):
+                bucket = cells.get((cx, cy))
+                if not bucket:
+                    continue
+                for other, kind in bucket.items():
+                    if arcade.check_for_collision(sprite, other):
+                        hits.append((kind, other))
+        return hits
+
+    def dispatch(self, sprite, extra=()):
+        """
+        Находит касания спрайта и передает их обработчикам.
+
+        Аргументы:
+            sprite: кто касается (игрок)
+            extra: готовые касания (вид, объект), найденные не через сетку
+        """
+        hits = self.query(sprite)
+        hits.extend(extra)
+        hits.sort(key=lambda hit: self.rank[hit[0]])
+        for kind, other in hits:
+            # Обработчик мог уже убрать предмет (например, все ключи сразу)
+            if kind in self.handlers and (other in self.cell_of or kind == "rescue"):
+                self.handlers[kind](other)
+
+
+# =====================================================
+# СИМУЛЯЦИЯ УРОВНЕЙ (БЕЗ ОКНА)
+# =====================================================
+"""
+КАК УСТРОЕНА СИМУЛЯЦИЯ:
+Все правила игры (физика, сбор предметов, шипы, бомбы,
+враги, дверь и ключ) живут в классах симуляции.
+Им не нужно окно, камера и звук, поэтому уровень можно
+прогонять тысячи тиков в секунду, например на сервере без экрана.
+Вместо звуков симуляция складывает названия событий в список events,
+а экран игры сам решает, какой звук проиграть.
+"""
+# Действия игрока (не зависят от клавиатуры)
+ACTION_LEFT = "left"
+ACTION_RIGHT = "right"
+ACTION_UP = "up"
+
+# Какие клавиши какому действию соответствуют
+KEY_ACTIONS = {
+    arcade.key.LEFT: ACTION_LEFT,
+    arcade.key.RIGHT: ACTION_RIGHT,
+    arcade.key.UP: ACTION_UP,
+}
+
+# Состояния уровня
+STATE_PLAYING = "playing"
+STATE_WON = "won"
+STATE_LOST = "lost"
+
+
+def load_character_textures(character):
+    """
+    Загружает картинки персонажа.
+
+    Возвращает:
+        (стоит, прыжок, [ходьба], [лестница])
+    """
+    name = "maleAdventurer" if character == "male" else "femaleAdventurer"
+    folder = "male_adventurer" if character == "male" else "female_adventurer"
+    base = f":resources:/images/animated_characters/{folder}/{name}"
+    idle = ASSETS.texture(base + "_idle.png")
+    jump = ASSETS.texture(base + "_jump.png")
+    walk = [ASSETS.texture(base + f"_walk{i}.png") for i in range(8)]
+    climb = [ASSETS.texture(base + f"_climb{i}.png") for i in range(2)]
+    return idle, jump, walk, climb
+
+
+class FixedStepClock:
+    """
+    Превращает кадры любой длины в ровные тики симуляции.
+    Остаток времени копится до следующего кадра,
+    а alpha говорит, насколько мы уже прошли к следующему тику.
+    """
+    def __init__(self, tick_time=TICK_TIME, max_ticks=MAX_TICKS_PER_FRAME):
+        self.tick_time = tick_time
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0    # Время, которое еще не стало тиками
+        self.dropped = 0.0        # Время, выброшенное при сильных тормозах
+
+    def advance(self, delta_time):
+        """
+        Добавляет время кадра.
+
+        Возвращает:
+            сколько тиков надо сделать
+        """
+        self.accumulator += delta_time
+        ticks = int(self.accumulator / self.tick_time)
+        if ticks > self.max_ticks:
+            # Долгая заминка: не пытаемся догнать все сразу
+            self.dropped += (ticks - self.max_ticks) * self.tick_time
+            ticks = self.max_ticks
+            self.accumulator %= self.tick_time
+        else:
+            self.accumulator -= ticks * self.tick_time
+        return ticks
+
+    @property
+    def alpha(self):
+        """Доля пути от прошлого тика к следующему (от 0 до 1)."""
+        return min(1.0, self.accumulator / self.tick_time)
+
+
+class LevelSimulation:
+    """
+    Общая часть симуляции уровня.
+    Хранит объекты мира, таймер и события за тик.
+    """
+    level_number = 0        # Номер уровня (для рекордов)
+    level_map = []          # Карта уровня
+    coin_store = None       # Монеты уровня (CoinStore), если есть
+
+    def __init__(self, character="male", level_map=None, seed=None):
+        self.character = character
+        if level_map is not None:
+            self.level_map = level_map
+        # Все случайности уровня идут от этого зерна (для повторов)
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.replay = Replay(self.level_number, character, self.seed)
+        self.events = []            # События для звуков
+        self.ticks = 0              # Сколько тиков прошло
+        self.elapsed_time = 0.0     # Игровое время в секундах
+        self.state = STATE_PLAYING  # Идет ли игра
+        # Ресурсы прошлого уровня больше не нужны
+        self.asset_scope = f"level_{self.level_number}"
+        ASSETS.use_level(self.asset_scope)
+        self.setup()
+        self.remember_positions()
+
+    @property
+    def elapsed(self):
+        """Прошедшее время в целых секундах."""
+        return int(self.elapsed_time)
+
+    def tile_position(self, row, col):
+        """Переводит клетку карты в координаты центра плитки."""
+        x = col * TILE + TILE // 2
+        y = (len(self.level_map) - row) * TILE
+        return x, y
+
+    def world_size(self):
+        """Размер уровня в пикселях."""
+        return len(self.level_map[0]) * TILE, len(self.level_map) * TILE
+
+    def setup(self):
+        """Строит мир по карте. Переопределяется в уровнях."""
+        raise NotImplementedError
+
+    def make_sprite(self, path, x, y, scale=0.5):
+        """Создает спрайт уровня с картинкой со склада."""
+        sprite = arcade.Sprite(texture=ASSETS.texture(path, self.asset_scope), scale=scale)
+        sprite.center_x, sprite.center_y = x, y
+        return sprite
+
+    def take_events(self):
+        """Отдает накопленные события и очищает список."""
+        events = self.events
+        self.events = []
+        return events
+
+    def press(self, action):
+        """Нажатие кнопки действия."""
+        self.replay.record(self.ticks, action, True)
+        if action == ACTION_RIGHT:
+            self.player.change_x = PLAYER_SPEED
+        elif action == ACTION_LEFT:
+            self.player.change_x = -PLAYER_SPEED
+        elif action == ACTION_UP:
+            self.jump()
+
+    def release(self, action):
+        """Отпускание кнопки действия."""
+        self.replay.record(self.ticks, action, False)
+        if action in (ACTION_LEFT, ACTION_RIGHT):
+            self.player.change_x = 0
+
+    def jump(self):
+        """Прыжок. Переопределяется в уровнях."""
+
+    def moving_sprites(self):
+        """Спрайты, которые двигаются от тика к тику. Дополняется в уровнях."""
+        return [self.player]
+
+    def remember_positions(self):
+        """Запоминает координаты перед тиком (для плавного рисования)."""
+        self.previous_positions = [(sprite, sprite.center_x, sprite.center_y)
+                                   for sprite in self.moving_sprites()]
+
+    def sync_sprites(self, alpha=1.0, box=None, snap=False):
+        """Переносит состояние предметов из хранилищ в спрайты (в прямоугольнике box)."""
+        if self.coin_store is not None:
+            self.coin_store.sync_sprites(alpha, box, snap)
+
+    @contextlib.contextmanager
+    def interpolated(self, alpha, box=None):
+        """
+        На время рисования ставит спрайты между прошлым и текущим тиком.
+        alpha = 0 - прошлый тик, alpha = 1 - текущий.
+        box - что видно на экране (монеты вне его не трогаются).
+        """
+        # Предметы из хранилищ рисуются прямо по массивам, возвращать их не нужно:
+        # перед столкновениями спрайты снова ставятся на текущий тик
+        self.sync_sprites(alpha, box, snap=True)
+        current = []
+        for sprite, x, y in self.previous_positions:
+            current.append((sprite, sprite.center_x, sprite.center_y))
+            sprite.position = (x + (sprite.center_x - x) * alpha,
+                               y + (sprite.center_y - y) * alpha)
+        try:
+            yield
+        finally:
+            for sprite, x, y in current:
+                sprite.position = (x, y)
+
+    def step(self, delta_time=TICK_TIME):
+        """
+        Один тик симуляции.
+
+        Возвращает:
+            список событий за этот тик
+        """
+        if self.state == STATE_PLAYING:
+            self.remember_positions()
+            self.ticks += 1
+            self.elapsed_time += delta_time
+            self.update(delta_time)
+        return self.take_events()
+
+    def update(self, delta_time):
+        """Правила уровня. Переопределяется в уровнях."""
+        raise NotImplementedError
+
+    def animate_player(self, on_ladder=False):
+        """Выбирает картинку игрока."""
+        if on_ladder:  # На лестнице
+            self.climb_anim.advance()
+            self.climb_anim.apply(self.player)
+        elif not self.physics.can_jump():  # В прыжке
+            self.player.texture = self.tex_jump
+        elif abs(self.player.change_x) > 0:  # Идет
+            self.walk_anim.advance()
+            self.walk_anim.apply(self.player)
+        else:  # Стоит
+            self.player.texture = self.tex_idle
+
+
+class Level1Simulation(LevelSimulation):
+    """
+    Правила уровня 1: монеты, ключ и дверь.
+    """
+    level_number = 1
+    level_map = LEVEL_1
+
+    def setup(self):
+        """Создает мир по карте уровня 1."""
+        self.score = 0                  # Начинаем с нуля очков
+        self.has_key = False            # Ключ еще не найден
+
+        # Создаем списки для разных типов объектов
+        self.walls = arcade.SpriteList()                       # Стены (для рисования)
+        self.coins = arcade.SpriteList()                       # Монеты
+        self.keys = arcade.SpriteList()                        # Ключи
+        self.doors = arcade.SpriteList()                       # Двери
+        self.player_list = arcade.SpriteList()                 # Игрок
+        self.coin_store = CoinStore()                          # Состояние монет
+
+        # Загружаем картинки персонажа
+        (self.tex_idle, self.tex_jump,
+         self.tex_walk, self.tex_climb) = load_character_textures(self.character)
+
+        for row, line in enumerate(self.level_map):
+            for col, ch in enumerate(line):
+                x, y = self.tile_position(row, col)
+
+                if ch == "1":  # Стена
+                    self.walls.append(
+                        self.make_sprite(":resources:/images/tiles/grassCenter.png", x, y))
+
+                elif ch == "d":  # Верх двери
+                    self.walls.append(
+                        self.make_sprite(":resources:/images/tiles/grassCenter.png", x, y))
+                    self.doors.append(
+                        self.make_sprite(":resources:/images/tiles/doorClosed_top.png",
+                                         x, y - TILE // 6))
+
+                elif ch == "E":  # Середина двери
+                    self.doors.append(
+                        self.make_sprite(":resources:/images/tiles/doorClosed_mid.png", x, y))
+
+                elif ch == "P":  # Игрок
+                    self.player = arcade.Sprite(scale=0.45)
+                    self.player.texture = self.tex_idle
+                    self.player.center_x, self.player.center_y = x, y + 20
+                    self.player_list.append(self.player)
+
+                elif ch == "C":  # Монета
+                    coin = AnimatedCoin(x, y)
+                    self.coin_store.add(coin)
+                    self.coins.append(coin)
+
+                elif ch == "K":  # Ключ
+                    self.keys.append(
+                        self.make_sprite(":resources:/images/items/keyYellow.png", x, y))
+
+        # Стены для физики: склеенные прямоугольники
+        self.geometry = LevelGeometry(self.level_map, SOLID_TILES_1)
+        self.collision_walls = self.geometry.make_collision_list()
+
+        # Создаем физический движок для игрока
+        self.physics = arcade.PhysicsEnginePlatformer(self.player, self.collision_walls, GRAVITY)
+        self.walk_anim = AnimationGroup(self.tex_walk, 0.2)   # Ходьба (кадров за тик)
+        self.climb_anim = AnimationGroup(self.tex_climb, 0.1)  # Лазание
+
+    def jump(self):
+        """Прыжок, если стоим на земле."""
+        if self.physics.can_jump():
+            self.events.append("jump")
+            self.player.change_y = JUMP_SPEED
+
+    def moving_sprites(self):
+        """Игрок (монеты плавно рисует их хранилище)."""
+        return [self.player]
+
+    def update(self, delta_time):
+        """Обновляет уровень 1 на один тик."""
+        self.physics.update()
+
+        # Обновляем анимацию монет
+        self.coin_store.step(delta_time)
+
+        # Анимация игрока
+        self.animate_player()
+
+        # Проверяем сбор монет (уровень маленький - ставим на место все монеты)
+        self.sync_sprites()
+        for coin in arcade.check_for_collision_with_list(self.player, self.coins):
+            if coin.entity.alive:
+                self.events.append("coin")
+                coin.entity.remove()
+                coin.remove_from_sprite_lists()
+                self.score += 1
+
+        # Проверяем сбор ключа
+        if arcade.check_for_collision_with_list(self.player, self.keys):
+            self.events.append("key")
+            self.keys[0].remove_from_sprite_lists()
+            self.has_key = True
+
+        # Проверяем выход через дверь
+        if self.has_key and arcade.check_for_collision_with_list(self.player, self.doors):
+            self.events.append("win")
+            self.state = STATE_WON
+
+
+class Level2Simulation(LevelSimulation):
+    """
+    Правила уровня 2: лестницы, шипы, бомбы, алмазы и враги.
+    """
+    level_number = 2
+    level_map = LEVEL_2
+    static_layer = None     # Статичный слой экрана (если уровень рисуется)
+
+    # Правила урона (прогоны для баланса меняют их у отдельных забегов)
+    spike_damage = SPIKE_DAMAGE       # Урон от шипов
+    spike_cooldown = SPIKE_COOLDOWN   # Время между уроном от шипов
+    bomb_divisor = 2                  # Во сколько раз бомба уменьшает здоровье
+
+    def setup(self):
+        """Создает мир по карте уровня 2."""
+        self.create_lists()
+        odd_walls = []  # Стены неквадратной формы
+
+        for row, line in enumerate(self.level_map):
+            for col, ch in enumerate(line):
+                x, y = self.tile_position(row, col)
+                sprite = self.build_tile(ch, x, y)
+                if ch in ODD_TILES_2:
+                    odd_walls.append(sprite)
+
+        # Стены для физики: склеенные прямоугольники из квадратных плиток,
+        # а камень и росток остаются со своей формой
+        self.geometry = LevelGeometry(self.level_map, SOLID_TILES_2, SQUARE_TILES_2)
+        self.collision_walls = self.geometry.make_collision_list()
+        self.collision_walls.extend(odd_walls)
+
+        # Все враги считаются вместе и ходят по графу дорог уровня
+        self.enemies = EnemyManager(self.geometry, seed=self.seed)
+        self.enemies.nav = get_nav_graph(self.level_map)
+        for enemy in list(self.mice) + list(self.frogs):
+            self.enemies.add(enemy)
+
+        # Физический движок с лестницами
+        self.physics = arcade.PhysicsEnginePlatformer(
+            self.player,
+            self.collision_walls,
+            gravity_constant=GRAVITY,
+            ladders=self.ladders
+        )
+
+    def create_lists(self):
+        """Начальные счетчики, пустые списки объектов и игрок."""
+        self.hp = MAX_HP                # Здоровье
+        self.coins = 0                  # Монеты
+        self.diamonds = 0               # Алмазы
+        self.has_key = False            # Ключ
+        self.saved_mouse = False        # Мышь спасена
+        self.saved_frog = False         # Лягушка спасена
+        self.spike_hit_timer = 0        # Таймер для шипов
+
+        # Списки объектов
+        self.walls = arcade.SpriteList()  # Стены (для рисования)
+        self.ladders = arcade.SpriteList(use_spatial_hash=True)  # Лестницы
+        self.spikes = arcade.SpriteList()  # Шипы
+        self.bombs = arcade.SpriteList()   # Бомбы
+        self.coins_list = arcade.SpriteList()  # Монеты
+        self.diamonds_list = arcade.SpriteList()  # Алмазы
+        self.keys = arcade.SpriteList()  # Ключи
+        self.doors = arcade.SpriteList()  # Двери
+        self.mushrooms = arcade.SpriteList()  # Грибы
+        self.mice = arcade.SpriteList()  # Мыши
+        self.frogs = arcade.SpriteList()  # Лягушки
+
+        # Состояние монет и бомб (спрайты только рисуют его)
+        self.coin_store = CoinStore()
+        self.bomb_store = EntityStore(BOMB_FIELDS)
+
+        # Все, с чем игрок взаимодействует, и что при этом происходит
+        self.interactions = InteractionIndex()
+        self.interactions.on("coin", self.take_coin)
+        self.interactions.on("diamond", self.take_diamond)
+        self.interactions.on("key", self.take_key)
+        self.interactions.on("spike", self.hit_spike)
+        self.interactions.on("rescue", self.rescue)
+        self.interactions.on("bomb", self.hit_bomb)
+        self.interactions.on("door", self.enter_door)
+
+        # Загружаем картинки персонажа
+        (self.tex_idle, self.tex_jump,
+         self.tex_walk, self.tex_climb) = load_character_textures(self.character)
+
+        self.player = arcade.Sprite(scale=0.45)
+        self.player.texture = self.tex_idle
+        self.walk_anim = AnimationGroup(self.tex_walk, 0.2)   # Ходьба (кадров за тик)
+        self.climb_anim = AnimationGroup(self.tex_climb, 0.1)  # Лазание
+
+    def build_tile(self, ch, x, y):
+        """
+        Создает объект для одной клетки карты и кладет его в нужный список.
+        Предметы для сбора и опасности еще и попадают в сетку взаимодействий.
+
+        Возвращает:
+            созданный спрайт или None
+        """
+        sprite = self._make_tile(ch, x, y)
+        if ch in INTERACTION_KINDS:
+            self.interactions.add(sprite, INTERACTION_KINDS[ch])
+        return sprite
+
+    def _make_tile(self, ch, x, y):
+        """Создает спрайт для символа карты."""
+        if ch == "1":
+            return self._simple(":resources:/images/tiles/grassCenter.png", x, y, self.walls)
+        elif ch == "2":
+            return self._simple(":resources:/images/tiles/grassMid.png", x, y, self.walls)
+        elif ch == "s":
+            return self._simple(":resources:/images/tiles/rock.png", x, y, self.walls)
+        elif ch == "g":
+            return self._simple(":resources:/images/tiles/grass_sprout.png", x, y, self.walls)
+        elif ch == "L":
+            return self._simple(":resources:/images/items/ladderMid.png", x, y, self.ladders)
+        elif ch == "T":
+            return self._simple(":resources:/images/items/ladderTop.png", x, y, self.ladders)
+        elif ch == "S":
+            return self._simple(":resources:/images/tiles/spikes.png", x, y, self.spikes)
+        elif ch == "B":
+            bomb = Bomb(x, y)
+            self.bomb_store.add(bomb, x=x, y=y)
+            self.bombs.append(bomb)
+            return bomb
+        elif ch == "C":
+            coin = AnimatedCoin(x, y)
+            self.coin_store.add(coin)
+            self.coins_list.append(coin)
+            return coin
+        elif ch == "D":
+            return self._simple(":resources:/images/items/gemBlue.png", x, y, self.diamonds_list)
+        elif ch == "K":
+            return self._simple(":resources:/images/items/keyYellow.png", x, y, self.keys)
+        elif ch == "M":  # Мышь
+            mouse = Enemy(":resources:/images/enemies/mouse.png", 0.5, move_speed=0.8)
+            mouse.center_x, mouse.center_y = x, y
+            mouse.kind = "mouse"
+            self.mice.append(mouse)
+            return mouse
+        elif ch == "F":  # Лягушка
+            frog = Enemy(":resources:/images/enemies/frog.png", 0.5, move_speed=1.2)
+            frog.center_x, frog.center_y = x, y
+            frog.kind = "frog"
+            self.frogs.append(frog)
+            return frog
+        elif ch == "m":  # Гриб
+            return self._simple(":resources:/images/tiles/mushroomRed.png", x, y, self.mushrooms)
+        elif ch == "d":  # Верх двери
+            return self._simple(":resources:/images/tiles/doorClosed_top.png", x, y, self.doors)
+        elif ch == "E":  # Середина двери
+            return self._simple(":resources:/images/tiles/doorClosed_mid.png", x, y, self.doors)
+        elif ch == "P":  # Игрок
+            self.player.center_x = x
+            self.player.center_y = y + 20
+        return None
+
+    def _simple(self, tex, x, y, lst):
+        """Создает простой объект."""
+        sprite = self.make_sprite(tex, x, y)
+        lst.append(sprite)
+        return sprite
+
+    def jump(self):
+        """Подъем по лестнице или прыжок."""
+        if self.physics.is_on_ladder():  # На лестнице
+            self.events.append("ladder")
+            self.player.change_y = PLAYER_SPEED
+        elif self.physics.can_jump():  # Прыжок
+            self.player.change_y = JUMP_SPEED
+
+    def moving_sprites(self):
+        """Игрок (враги и монеты плавно рисуются из своих массивов)."""
+        return [self.player]
+
+    def update(self, delta_time):
+        """Обновляет уровень 2 на один тик."""
+        # Уменьшаем таймер шипов
+        if self.spike_hit_timer > 0:
+            self.spike_hit_timer -= delta_time
+
+        # Обновляем физику
+        with PROFILER.phase("physics"):
+            self.physics.update()
+
+        # Обновляем анимацию монет
+        with PROFILER.phase("animation"):
+            self.coin_store.step(delta_time)
+
+        # Обновляем всех врагов одним шагом
+        with PROFILER.phase("enemies"):
+            self.enemies.step(delta_time, self.player.position)
+
+        # Анимация персонажа
+        with PROFILER.phase("animation"):
+            self.animate_player(self.physics.is_on_ladder())
+
+        # Столкновения игрока со всем, что можно взять или что ранит
+        with PROFILER.phase("collisions"):
+            self.check_collisions()
+
+        # Проверяем смерть
+        if self.hp <= 0:
+            self.events.append("gameover")
+            self.state = STATE_LOST
+
+    def check_collisions(self):
+        """Сбор предметов, шипы, спасение, бомбы и дверь - одним проходом."""
+        # Враги двигаются каждый тик, поэтому их ищет менеджер врагов,
+        # а разбираются они вместе с остальными касаниями
+        player = self.player
+        rescued = [("rescue", enemy) for enemy in self.enemies.overlapping(
+            player.left, player.right, player.bottom, player.top)]
+        # Монеты рядом с игроком ставим туда, где они на этом тике
+        margin = 2 * TILE
+        self.sync_sprites(box=(player.left - margin, player.right + margin,
+                               player.bottom - margin, player.top + margin))
+        self.interactions.dispatch(player, rescued)
+
+    def take_coin(self, coin):
+        """Сбор монеты."""
+        if coin.entity.alive:
+            self.events.append("coin")
+            coin.entity.remove()
+            self.interactions.remove(coin)
+            coin.remove_from_sprite_lists()
+            self.coins += 1
+
+    def take_diamond(self, diamond):
+        """Сбор алмаза."""
+        self.events.append("diamond")
+        self.interactions.remove(diamond)
+        diamond.remove_from_sprite_lists()
+        self.diamonds += 1
+
+    def take_key(self, key):
+        """Сбор ключа: исчезают все ключи уровня."""
+        self.events.append("key")
+        for other in self.keys:
+            self.interactions.remove(other)
+        self.keys.clear()
+        self.has_key = True
+
+    def hit_spike(self, spike):
+        """Шипы наносят урон не чаще раза в spike_cooldown."""
+        if self.spike_hit_timer <= 0:  # Если можно получить урон
+            self.events.append("spike")
+            self.hp -= self.spike_damage
+            self.spike_hit_timer = self.spike_cooldown
+
+            if self.hp < 0:
+                self.hp = 0
+
+    def rescue(self, enemy):
+        """Спасение мыши или лягушки."""
+        if enemy.kind == "mouse" and not self.saved_mouse:
+            self.events.append("save")
+            self.saved_mouse = True
+        elif enemy.kind == "frog" and not self.saved_frog:
+            self.events.append("save")
+            self.saved_frog = True
+        self.enemies.remove(enemy)
+        enemy.remove_from_sprite_lists()
+
+    def hit_bomb(self, bomb):
+        """Взрыв бомбы."""
+        if bomb.entity.alive:
+            self.events.append("bomb")
+            self.hp //= self.bomb_divisor  # Здоровье уменьшается вдвое
+            bomb.entity.remove()
+            self.interactions.remove(bomb)
+            bomb.remove_from_sprite_lists()
+
+    def enter_door(self, door):
+        """Выход через дверь, если есть ключ и игрок жив."""
+        if self.has_key and self.hp > 0 and self.state == STATE_PLAYING:
+            self.events.append("win")
+            self.state = STATE_WON
+
+    def stats(self):
+        """Итоги прохождения для экрана победы."""
+        return {
+            "coins": self.coins,
+            "diamonds": self.diamonds,
+            "saved_mouse": self.saved_mouse,
+            "saved_frog": self.saved_frog,
+            "time": self.elapsed
+        }
+
+
+# =====================================================
+# ОГРОМНЫЙ МИР (СЛУЧАЙНАЯ КАРТА ПО КУСКАМ)
+# =====================================================
+"""
+КАК УСТРОЕН ОГРОМНЫЙ МИР:
+Карта создается по зерну теми же буквами, что и LEVEL_2:
+этажи с дырами, лестницы между ними, а на полу - монеты,
+алмазы, шипы, бомбы, грибы, камни и враги M/F.
+Вся карта - это один массив байт (2000 x 2000 = 4 МБ),
+но спрайты и стены для физики создаются только для кусков
+рядом с игроком (а значит и с камерой, которая за ним следует).
+Куски, которые остались далеко позади, удаляются.
+Собранные предметы запоминаются, чтобы не появиться снова.
+"""
+WORLD_SIZE = 2000          # Сторона мира в клетках
+WORLD_CHUNK = 16           # Сторона куска в клетках
+WORLD_LOAD_RADIUS = 1      # Загружаем куски на таком расстоянии от игрока
+WORLD_KEEP_RADIUS = 2      # Дальше этого куски выгружаем
+WORLD_FLOOR_STEP = 5       # Расстояние между этажами
+WORLD_HOLE_CHANCE = 0.04   # Начало дыры в этаже (на клетку)
+WORLD_LADDER_CHANCE = 0.03 # Лестница с этажа вверх (на клетку)
+
+# Что лежит на полу и как часто (на клетку пола)
+WORLD_ITEMS = (
+    ("C", 0.06), ("S", 0.03), ("m", 0.02), ("D", 0.01), ("B", 0.01),
+    ("s", 0.01), ("g", 0.01), ("M", 0.004), ("F", 0.004),
+)
+
+
+def generate_world(width, height, seed):
+    """
+    Создает случайную карту по зерну.
+
+    Возвращает:
+        массив байт [строка, столбец] с буквами карты
+    """
+    rng = np.random.default_rng(seed)
+    tiles = np.full((height, width), ord("0"), dtype=np.uint8)
+
+    # Этажи (снизу вверх) с дырами шириной 2-3 клетки
+    floors = np.arange(height - 1, 0, -WORLD_FLOOR_STEP)
+    holes = rng.random((len(floors), width)) < WORLD_HOLE_CHANCE
+    holes |= np.roll(holes, 1, axis=1) | np.roll(holes, 2, axis=1) & (rng.random(holes.shape) < 0.5)
+    tiles[floors] = np.where(holes, ord("0"), ord("2"))
+
+    # Рамка вокруг мира
+    tiles[0, :] = tiles[-1, :] = tiles[:, 0] = tiles[:, -1] = ord("1")
+
+    # Лестницы: от пола до этажа выше (сквозь него) и верхушка над ним
+    for floor in floors:
+        top = floor - WORLD_FLOOR_STEP
+        if top <= 1:
+            continue
+        columns = np.flatnonzero(rng.random(width) < WORLD_LADDER_CHANCE)
+        columns = columns[(columns > 1) & (columns < width - 2)]
+        tiles[top:floor, columns] = ord("L")
+        tiles[top - 1, columns] = ord("T")
+
+    # Предметы и враги на полу
+    surface = floors[floors > 1] - 1
+    empty = (tiles[surface] == ord("0")) & np.isin(tiles[surface + 1], [ord("1"), ord("2")])
+    roll = rng.random(empty.shape)
+    items = np.full(empty.shape, ord("0"), dtype=np.uint8)
+    threshold = 0.0
+    for ch, chance in WORLD_ITEMS:
+        items[(roll >= threshold) & (roll < threshold + chance)] = ord(ch)
+        threshold += chance
+    tiles[surface] = np.where(empty, items, tiles[surface])
+
+    # Игрок внизу слева, ключ в середине, дверь наверху справа
+    tiles[height - 2, 1:6] = ord("0")
+    tiles[height - 2, 2] = ord("P")
+    middle = surface[len(surface) // 2]
+    tiles[middle, width // 2] = ord("K")
+    door = surface[-1]
+    tiles[door - 1:door + 1, width - 6:width - 2] = ord("0")
+    tiles[door + 1, width - 6:width - 2] = ord("2")
+    tiles[door - 1, width - 4] = ord("d")
+    tiles[door, width - 4] = ord("E")
+    return tiles
+
+
+class WorldMap:
+    """
+    Карта огромного мира: массив букв и сетка стен для врагов.
+    """
+    def __init__(self, width, height, seed):
+        self.cols = width
+        self.rows = height
+        self.tiles = generate_world(width, height, seed)
+        rows, cols = np.nonzero(self.tiles == ord("P"))
+        self.spawn = int(rows[0]), int(cols[0])    # Клетка игрока
+
+    def chunk_lines(self, cx, cy, size=WORLD_CHUNK):
+        """
+        Кусок карты строками, как LEVEL_2.
+
+        Возвращает:
+            (первая строка, первый столбец, строки куска)
+        """
+        row0, col0 = cy * size, cx * size
+        block = self.tiles[row0:row0 + size, col0:col0 + size]
+        return row0, col0, [line.tobytes().decode("ascii") for line in block]
+
+    def solid_cells(self):
+        """Сетка стен в том же виде, что у LevelGeometry.solid_cells."""
+        cells = np.zeros((self.rows + 3, self.cols + 2), dtype=bool)
+        solid = np.isin(self.tiles, np.frombuffer(SOLID_TILES_2.encode(), dtype=np.uint8))
+        cells[2:self.rows + 2, 1:self.cols + 1] = solid[::-1]
+        return cells
+
+
+class WorldStreamer:
+    """
+    Создает и удаляет куски мира вокруг игрока.
+    """
+    def __init__(self, sim, world, chunk=WORLD_CHUNK,
+                 load_radius=WORLD_LOAD_RADIUS, keep_radius=WORLD_KEEP_RADIUS):
+        self.sim = sim
+        self.world = world
+        self.chunk = chunk
+        self.load_radius = load_radius
+        self.keep_radius = keep_radius
+        self.loaded = {}        # (cx, cy) -> (спрайты, склеенные стены)
+        self.removed = set()    # Клетки, где предмет уже собран
+        self.center = None      # Кусок, в котором стоит игрок
+        self.loads = 0
+        self.unloads = 0
+
+    def update(self, x, y):
+        """Подгружает куски вокруг точки и выгружает далекие."""
+        col = int(x // TILE)
+        row = self.world.rows - math.floor((y + TILE / 2) / TILE)
+        center = (col // self.chunk, row // self.chunk)
+        if center == self.center:
+            return
+        self.center = center
+
+        for key in list(self.loaded):
+            if max(abs(key[0] - center[0]), abs(key[1] - center[1])) > self.keep_radius:
+                self.unload(key)
+
+        last_x = (self.world.cols - 1) // self.chunk
+        last_y = (self.world.rows - 1) // self.chunk
+        radius = self.load_radius
+        for cy in range(max(0, center[1] - radius), min(last_y, center[1] + radius) + 1):
+            for cx in range(max(0, center[0] - radius), min(last_x, center[0] + radius) + 1):
+                if (cx, cy) not in self.loaded:
+                    self.load((cx, cy))
+
+    def load(self, key):
+        """Создает спрайты и стены одного куска."""
+        sim = self.sim
+        row0, col0, lines = self.world.chunk_lines(*key, self.chunk)
+        sprites = []
+        for r, line in enumerate(lines):
+            for c, ch in enumerate(line):
+                tile = (row0 + r, col0 + c)
+                if ch in "0P" or tile in self.removed:
+                    continue
+                x, y = sim.tile_position(*tile)
+                sprite = sim.build_tile(ch, x, y)
+                sprite.tile = tile
+                sprites.append(sprite)
+                if ch in ODD_TILES_2:
+                    sim.collision_walls.append(sprite)
+                elif ch in "MF":
+                    sim.enemies.add(sprite)
+                if ch in STATIC_TILES_2 and sim.static_layer is not None:
+                    sim.static_layer.add(sprite)
+
+        # Квадратные стены куска склеиваем и сдвигаем на место в мире
+        geometry = LevelGeometry(lines, SOLID_TILES_2, SQUARE_TILES_2)
+        walls = list(geometry.make_collision_list(
+            col0 * TILE, (self.world.rows - row0 - len(lines)) * TILE))
+        for wall in walls:
+            sim.collision_walls.append(wall)
+
+        self.loaded[key] = (sprites, walls)
+        self.loads += 1
+
+    def unload(self, key):
+        """Удаляет спрайты и стены одного куска."""
+        sim = self.sim
+        sprites, walls = self.loaded.pop(key)
+        for wall in walls:
+            wall.remove_from_sprite_lists()
+        for sprite in sprites:
+            if sim.static_layer is not None:
+                sim.static_layer.remove(sprite)
+            sim.interactions.remove(sprite)
+            if not sprite.sprite_lists:
+                # Предмет собран или враг спасен - больше не появится
+                self.removed.add(sprite.tile)
+                continue
+            if getattr(sprite, "manager_index", -1) >= 0:
+                sim.enemies.remove(sprite)
+            if getattr(sprite, "entity", None) is not None:
+                sprite.entity.remove()
+            sprite.remove_from_sprite_lists()
+        self.unloads += 1
+
+
+class WorldSimulation(Level2Simulation):
+    """
+    Правила уровня 2 в огромном случайном мире.
+    Карта строится по зерну симуляции, поэтому повторы тоже работают.
+    """
+    level_number = 3
+    world_width = WORLD_SIZE
+    world_height = WORLD_SIZE
+
+    def setup(self):
+        """Создает мир: карту целиком, а спрайты - только рядом с игроком."""
+        self.create_lists()
+        self.world = WorldMap(self.world_width, self.world_height, self.seed)
+        self.level_map = []
+        self.geometry = self.world
+
+        self.collision_walls = arcade.SpriteList(use_spatial_hash=True)
+        self.enemies = EnemyManager(self.world, seed=self.seed)
+
+        x, y = self.tile_position(*self.world.spawn)
+        self.player.center_x = x
+        self.player.center_y = y + 20
+
+        self.physics = arcade.PhysicsEnginePlatformer(
+            self.player,
+            self.collision_walls,
+            gravity_constant=GRAVITY,
+            ladders=self.ladders
+        )
+        # Пустые списки движок не запоминает, а стены и лестницы появятся позже
+        self.physics.platforms = [self.collision_walls]
+        self.physics.ladders = [self.ladders]
+
+        self.streamer = WorldStreamer(self, self.world)
+        self.streamer.update(self.player.center_x, self.player.center_y)
+
+    def tile_position(self, row, col):
+        """Переводит клетку мира в координаты центра плитки."""
+        return col * TILE + TILE // 2, (self.world.rows - row) * TILE
+
+    def world_size(self):
+        """Размер мира в пикселях."""
+        return self.world.cols * TILE, self.world.rows * TILE
+
+    def update(self, delta_time):
+        """Подгружает куски вокруг игрока и делает обычный тик уровня 2."""
+        self.streamer.update(self.player.center_x, self.player.center_y)
+        super().update(delta_time)
+
+
+# Симуляции по номеру уровня
+SIMULATIONS = {
+    1: Level1Simulation,
+    2: Level2Simulation,
+    3: WorldSimulation,
+}
+
+
+# =====================================================
+# УРОВНИ ИЗ ФАЙЛОВ
+# =====================================================
+"""
+КАК УСТРОЕН ФАЙЛ УРОВНЯ:
+Свой уровень - это текстовый файл *.level в папке levels.
+Сверху настройки "ключ: значение", потом строка "---"
+и карта теми же буквами, что и LEVEL_2:
+
+    # Комментарий
+    name: Пещеры
+    number: 10          (10..255, по нему хранятся рекорды и повторы)
+    par: 90             (норма времени в секундах, 0 - без нормы)
+    score.coin: 10      (очки за монету, алмаз и спасение -
+    score.diamond: 50    если не заданы, как в SCORE_WEIGHTS)
+    score.rescue: 100
+    ---
+    1111111
+    1P000d1
+    ...
+
+При первой загрузке файл разбирается и сохраняется в готовом
+двоичном виде в levels/__cache__: заголовок, настройки (JSON),
+сетка клеток байтами и таблица объектов (буква, строка, столбец).
+В заголовке лежат размер и время изменения исходного файла
+и его отпечаток SHA-256. Если размер или время другие, файл
+собирается заново; если те же, сверяется еще и отпечаток
+(копия с сохраненным временем или правка той же длины
+на файловой системе с грубым временем). Пока исходник не менялся,
+готовый файл просто отображается в память (mmap) и ничего не разбирается:
+для списка уровней хватает заголовка, а сетка читается,
+только когда уровень запускают.
+"""
+LEVELS_DIR = "levels"                  # Папка со своими уровнями
+LEVEL_FILE_EXT = ".level"              # Расширение файла уровня
+LEVEL_CACHE_DIR = "__cache__"          # Папка готовых уровней (внутри LEVELS_DIR)
+LEVEL_CACHE_MAGIC = b"DLVL"            # Метка готового уровня
+LEVEL_CACHE_VERSION = 1                # Версия формата
+# Метка, версия, номер, строк, столбцов, длина настроек, объектов,
+# размер исходника, время изменения исходника, отпечаток
+LEVEL_CACHE_HEADER = struct.Struct("<4sBHHHIIQQ32s")
+LEVEL_NUMBERS = range(10, 256)         # Номера для уровней из файлов
+LEVEL_FILE_LEGEND = "012sgLTSBCDKMFmdEP"  # Буквы, которые можно ставить на карту
+LEVEL_WALL_CHARS = "0" + SOLID_TILES_2    # Не объекты (пусто и стены)
+
+# Строка таблицы объектов: буква, строка и столбец
+LEVEL_SPAWN_DTYPE = np.dtype([("ch", "u1"), ("row", "<u2"), ("col", "<u2")])
+
+
+def parse_level_text(text, name="уровень"):
+    """
+    Разбирает текст файла уровня.
+
+    Возвращает:
+        (настройки, строки карты)
+    Если файл неправильный, бросает ValueError с номером строки.
+    """
+    settings = {}
+    lines = None   # Карта начинается после "---"
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if lines is not None:
+            if line:
+                lines.append(line)
+            continue
+        if not line or line.startswith("#"):
+            continue
+        if line == "---":
+            lines = []
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            raise ValueError(f"{name}:{number}: ожидалось \"ключ: значение\" или \"---\"")
+        settings[key.strip()] = value.strip()
+
+    if not lines:
+        raise ValueError(f"{name}: нет карты после строки \"---\"")
+    if len({len(line) for line in lines}) != 1:
+        raise ValueError(f"{name}: строки карты разной длины")
+    unknown = set("".join(lines)) - set(LEVEL_FILE_LEGEND)
+    if unknown:
+        raise ValueError(f"{name}: неизвестные буквы на карте: {''.join(sorted(unknown))}")
+    if sum(line.count("P") for line in lines) != 1:
+        raise ValueError(f"{name}: на карте должен быть ровно один игрок P")
+
+    try:
+        meta = {
+            "name": settings.get("name") or os.path.splitext(os.path.basename(name))[0],
+            "number": int(settings["number"]),
+            "par_time": int(settings.get("par", 0)),
+            "weights": {kind: int(settings.get(f"score.{kind}", default))
+                        for kind, default in SCORE_WEIGHTS.items()},
+        }
+    except KeyError:
+        raise ValueError(f"{name}: не задан номер уровня (number: "
+                         f"{LEVEL_NUMBERS.start}..{LEVEL_NUMBERS.stop - 1})") from None
+    except ValueError as error:
+        raise ValueError(f"{name}: настройка должна быть целым числом ({error})") from None
+    if meta["number"] not in LEVEL_NUMBERS:
+        raise ValueError(f"{name}: номер уровня должен быть от {LEVEL_NUMBERS.start} "
+                         f"до {LEVEL_NUMBERS.stop - 1}")
+    return meta, lines
+
+
+def compile_level(source, cache_path):
+    """
+    Разбирает файл уровня и сохраняет готовый двоичный вид.
+    Пишется во временный файл и подменяется целиком,
+    чтобы никто не прочитал половину.
+    """
+    with open(source, "rb") as f:
+        data = f.read()
+    stat = os.stat(source)
+    meta, lines = parse_level_text(data.decode("utf-8"), source)
+
+    grid = np.frombuffer("".join(lines).encode("ascii"), dtype=np.uint8)
+    rows, cols = len(lines), len(lines[0])
+    spawns = [(ord(ch), row, col)
+              for row, line in enumerate(lines)
+              for col, ch in enumerate(line) if ch not in LEVEL_WALL_CHARS]
+    spawns = np.array(spawns, dtype=LEVEL_SPAWN_DTYPE)
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+    header = LEVEL_CACHE_HEADER.pack(
+        LEVEL_CACHE_MAGIC, LEVEL_CACHE_VERSION, meta["number"], rows, cols,
+        len(meta_bytes), len(spawns), stat.st_size, stat.st_mtime_ns,
+        hashlib.sha256(data).digest())
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        f.write(meta_bytes)
+        f.write(grid.tobytes())
+        f.write(spawns.tobytes())
+    os.replace(temp_path, cache_path)
+
+
+class LevelFile:
+    """
+    Уровень из файла, открытый через готовый двоичный вид.
+    """
+    def __init__(self, source, cache_dir=None):
+        self.source = source
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(source), LEVEL_CACHE_DIR)
+        name = os.path.splitext(os.path.basename(source))[0]
+        self.cache_path = os.path.join(cache_dir, name + ".bin")
+        self.compiled = False   # Пришлось ли разбирать исходник
+        self.data = self._open()
+
+        (_, _, self.number, self.rows, self.cols, meta_size, self.spawn_count,
+         _, _, digest) = LEVEL_CACHE_HEADER.unpack_from(self.data)
+        self.content_hash = digest.hex()
+        meta_start = LEVEL_CACHE_HEADER.size
+        self.grid_offset = meta_start + meta_size
+        self.spawn_offset = self.grid_offset + self.rows * self.cols
+
+        meta = json.loads(self.data[meta_start:self.grid_offset].decode("utf-8"))
+        self.name = meta["name"]
+        self.par_time = meta["par_time"]
+        self.weights = meta["weights"]
+
+        # Строка для списка уровней: считается один раз, а не каждый кадр
+        text = f"{self.number}. {self.name}"
+        if self.par_time:
+            text += f"  —  норма {self.par_time // 60}:{self.par_time % 60:02d}"
+        self.description = text + f"  —  монет {self.count('C')}, алмазов {self.count('D')}"
+
+    def _open(self):
+        """Отображает готовый файл в память, пересобирая его, если он устарел."""
+        stat = os.stat(self.source)
+        data = self._map()
+        if data is not None:
+            (magic, version, _, _, _, _, _,
+             size, mtime, digest) = LEVEL_CACHE_HEADER.unpack_from(data)
+            if (magic == LEVEL_CACHE_MAGIC and version == LEVEL_CACHE_VERSION
+                    and size == stat.st_size and mtime == stat.st_mtime_ns
+                    and digest == self._source_digest()):
+                return data
+            data.close()
+        compile_level(self.source, self.cache_path)
+        self.compiled = True
+        return self._map()
+
+    def _source_digest(self):
+        """Отпечаток SHA-256 исходного файла (как в заголовке готового)."""
+        with open(self.source, "rb") as f:
+            return hashlib.sha256(f.read()).digest()
+
+    def _map(self):
+        """Открывает готовый файл только для чтения или возвращает None."""
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):   # Нет файла или он пустой
+            return None
+        if len(data) < LEVEL_CACHE_HEADER.size:
+            data.close()
+            return None
+        return data
+
+    def grid(self):
+        """Сетка клеток (коды букв) прямо из файла, без копирования."""
+        return np.frombuffer(self.data, dtype=np.uint8, count=self.rows * self.cols,
+                             offset=self.grid_offset).reshape(self.rows, self.cols)
+
+    def spawns(self):
+        """Таблица объектов: буква, строка и столбец каждого."""
+        return np.frombuffer(self.data, dtype=LEVEL_SPAWN_DTYPE, count=self.spawn_count,
+                             offset=self.spawn_offset)
+
+    def count(self, chars):
+        """Сколько на уровне объектов с такими буквами."""
+        codes = np.frombuffer(chars.encode("ascii"), dtype=np.uint8)
+        return int(np.isin(self.spawns()["ch"], codes).sum())
+
+    def lines(self):
+        """Карта строками, как LEVEL_2."""
+        return [row.tobytes().decode("ascii") for row in self.grid()]
+
+    def describe(self):
+        """Строка для списка уровней."""
+        return self.description
+
+    def close(self):
+        """Закрывает отображение файла."""
+        self.data.close()
+
+
+class FileLevelSimulation(Level2Simulation):
+    """
+    Уровень из файла: правила уровня 2, карта и очки - из файла.
+    Для каждого файла делается свой класс с его номером.
+    """
+    level_file = None
+
+    @classmethod
+    def for_file(cls, level_file):
+        """Класс симуляции для одного файла уровня."""
+        return type(f"FileLevel{level_file.number}Simulation", (cls,), {
+            "level_file": level_file,
+            "level_number": level_file.number,
+        })
+
+    def __init__(self, character="male", level_map=None, seed=None):
+        self.par_time = self.level_file.par_time
+        if level_map is None:
+            level_map = self.level_file.lines()
+        super().__init__(character, level_map, seed)
+
+
+def load_level_catalog(folder=LEVELS_DIR):
+    """
+    Открывает все файлы уровней в папке (по порядку номеров)
+    и добавляет их в SIMULATIONS и LEVEL_WEIGHTS.
+    Неправильные файлы и повторные номера пропускаются с сообщением.
+
+    Возвращает:
+        список LevelFile
+    """
+    try:
+        names = sorted(os.listdir(folder))
+    except OSError:
+        return []
+
+    levels = []
+    for name in names:
+        if not name.endswith(LEVEL_FILE_EXT):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            level = LevelFile(path)
+        except (OSError, ValueError, UnicodeDecodeError) as error:
+            print(f"Уровень {path} пропущен: {error}", file=sys.stderr)
+            continue
+        if level.number in SIMULATIONS:
+            print(f"Уровень {path} пропущен: номер {level.number} уже занят",
+                  file=sys.stderr)
+            level.close()
+            continue
+        SIMULATIONS[level.number] = FileLevelSimulation.for_file(level)
+        LEVEL_WEIGHTS[level.number] = level.weights
+        levels.append(level)
+    levels.sort(key=lambda level: level.number)
+    return levels
+
+
+# Уровни из папки levels (открываются при первом обращении)
+_level_catalog = None
+
+
+def get_level_catalog():
+    """Общий на весь процесс список уровней из файлов."""
+    global _level_catalog
+    if _level_catalog is None:
+        _level_catalog = load_level_catalog()
+    return _level_catalog
+
+# =====================================================
+# ДОРОГИ ДЛЯ ВРАГОВ
+# =====================================================
+"""
+КАК ВРАГИ НАХОДЯТ ДОРОГУ:
+По карте уровня один раз строится граф клеток (NavGraph):
+- узел - пустая клетка, где можно стоять (под ней стена)
+  или держаться (в ней лестница);
+- ходьба - в соседний узел слева или справа;
+- уступ - шаг в пустоту сбоку и падение до первого узла ниже;
+- прыжок - на стену соседнего столбца, если до ее верха хватает
+  прыжка со скоростью NAV_JUMP_SPEED при тяжести NAV_GRAVITY,
+  а над головой пусто (через ямы враги не прыгают - медленные);
+- лестница - вверх и вниз по клеткам лестницы.
+Для ботов из прогонов баланса строится свой граф игрока (for_player):
+прыжок выше (JUMP_SPEED при GRAVITY), прыжки на уступы через пустоту,
+а вниз по лестнице игрок не спускается (кнопки "вниз" нет).
+Потом поиском в ширину от каждого узла считаются две таблицы
+[откуда, куда]: следующий узел и сколько до цели шагов.
+В игре враг только смотрит в таблицу - O(1) на врага за тик,
+без поиска пути в каждом кадре.
+Граф зависит только от карты, поэтому хранится по ее отпечатку:
+в памяти процесса (перезапуск уровня ничего не строит) и в файле
+levels/__cache__/nav-<отпечаток>.npz (следующий запуск тоже).
+Таблицы растут как квадрат числа узлов, поэтому для карт больше
+NAV_MAX_NODES узлов (огромный мир, толпа) граф не строится и враги
+ходят по-старому, наугад.
+"""
+NAV_VERSION = 1                    # Версия графа (входит в отпечаток)
+NAV_JUMP_SPEED = ENEMY_MAX_SPEED   # Скорость прыжка врага на ступеньку
+NAV_GRAVITY = 0.5                  # Тяжесть врага (как в PhysicsObject)
+NAV_JUMP_MARGIN = TILE // 4        # Запас высоты над ступенькой
+NAV_CLIMB_SPEED = 2                # Скорость врага на лестнице
+NAV_CHASE_STEPS = 8                # Ближе скольких шагов враг бежит за игроком
+NAV_PATROL_TIMEOUT = 8.0           # Секунд на путь к точке обхода
+NAV_MAX_NODES = 1024               # Больше узлов - таблицы не строятся
+NAV_UNREACHABLE = 0xFFFF           # "Шагов" до недостижимого узла
+NAV_LADDER_TILES = "LT"            # Лестницы
+
+
+def nav_jump_cells(jump_speed=NAV_JUMP_SPEED, gravity=NAV_GRAVITY):
+    """На сколько клеток вверх враг запрыгивает (шаги - как в EnemyManager.step)."""
+    vy, height, peak = jump_speed, 0.0, 0.0
+    while vy > 0:
+        vy -= gravity
+        height += vy
+        peak = max(peak, height)
+    return int((peak - NAV_JUMP_MARGIN) // TILE)
+
+
+class NavGraph:
+    """
+    Граф клеток уровня и готовые таблицы пути.
+    Узел i - клетка (gx[i], gy[i]), клетки считаются как в LevelGeometry.
+    """
+    def __init__(self, gx, gy, ladder, next_hop, dist, rows, cols):
+        self.gx = gx                # Столбец узла
+        self.gy = gy                # Строка узла (снизу)
+        self.ladder = ladder        # Узел на лестнице
+        self.next_hop = next_hop    # [откуда, куда] -> следующий узел (-1 - не дойти)
+        self.dist = dist            # [откуда, куда] -> шагов (NAV_UNREACHABLE - не дойти)
+        self.count = len(gx)
+        self.center_x = (gx * TILE + TILE // 2).astype(np.float64)   # Середина клетки узла
+        self.center_y = (gy * TILE).astype(np.float64)
+        # Узел по клетке с пустой рамкой вокруг карты: клетка (gx, gy) в [gy + 1, gx + 1]
+        self.node_of = np.full((rows + 3, cols + 2), -1, dtype=np.int32)
+        self.node_of[gy + 1, gx + 1] = np.arange(self.count)
+
+    def node_at(self, gx, gy):
+        """Узлы в клетках (массивы gx, gy). Не узел или за картой - -1."""
+        rows, cols = self.node_of.shape
+        return self.node_of[np.clip(gy + 1, 0, rows - 1), np.clip(gx + 1, 0, cols - 1)]
+
+    def node_at_point(self, x, y):
+        """Узел в клетке точки (x, y) или -1."""
+        rows, cols = self.node_of.shape
+        gx, gy = int(x // TILE), int((y + TILE // 2) // TILE)
+        if 0 <= gy + 1 < rows and 0 <= gx + 1 < cols:
+            return int(self.node_of[gy + 1, gx + 1])
+        return -1
+
+    @classmethod
+    def build(cls, level_map, solid_chars=SOLID_TILES_2, ladder_chars=NAV_LADDER_TILES,
+              max_nodes=NAV_MAX_NODES, jump_cells=None, open_jumps=False, climb_down=True):
+        """
+        Строит граф и таблицы по карте.
+        jump_cells - высота прыжка в клетках (по умолчанию как у врага),
+        open_jumps - прыгать на уступы и без стены рядом,
+        climb_down - спускаться по лестнице.
+
+        Возвращает:
+            NavGraph или None, если узлов больше max_nodes
+        """
+        rows = len(level_map)
+        cols = max((len(line) for line in level_map), default=0)
+
+        def cell(gx, gy):
+            if 1 <= gy <= rows and 0 <= gx < len(level_map[rows - gy]):
+                return level_map[rows - gy][gx]
+            return "0"  # За картой - пусто, как у LevelGeometry
+
+        def solid(gx, gy):
+            return cell(gx, gy) in solid_chars
+
+        def ladder(gx, gy):
+            return cell(gx, gy) in ladder_chars
+
+        def standable(gx, gy):
+            return not solid(gx, gy) and (solid(gx, gy - 1) or ladder(gx, gy))
+
+        nodes = [(gx, gy) for gy in range(1, rows + 1) for gx in range(cols)
+                 if standable(gx, gy)]
+        if len(nodes) > max_nodes:
+            return None
+        index = {node: i for i, node in enumerate(nodes)}
+        if jump_cells is None:
+            jump_cells = nav_jump_cells()
+
+        # Ребра: откуда -> куда
+        edges = [[] for _ in nodes]
+        for i, (gx, gy) in enumerate(nodes):
+            for side in (-1, 1):
+                nx = gx + side
+                if standable(nx, gy):                   # Ходьба
+                    edges[i].append(index[(nx, gy)])
+                elif not solid(nx, gy):                 # Уступ: падаем до первого узла
+                    land = gy - 1
+                    while land >= 1 and not standable(nx, land):
+                        land -= 1
+                    if land >= 1:
+                        edges[i].append(index[(nx, land)])
+                elif solid(gx, gy - 1):                 # Стена рядом: прыжок на нее
+                    for k in range(1, jump_cells + 1):
+                        if any(solid(gx, gy + up) for up in range(1, k + 2)):
+                            break
+                        if solid(nx, gy + k):
+                            continue
+                        if standable(nx, gy + k):
+                            edges[i].append(index[(nx, gy + k)])
+                        break
+                if open_jumps and solid(gx, gy - 1) and not solid(nx, gy):
+                    for k in range(1, jump_cells + 1):  # Прыжок на уступ над пустотой
+                        if any(solid(gx, gy + up) for up in range(1, k + 2)):
+                            break
+                        if standable(nx, gy + k):
+                            edges[i].append(index[(nx, gy + k)])
+            if ladder(gx, gy):                          # Лестница вверх и вниз
+                if standable(gx, gy + 1):
+                    edges[i].append(index[(gx, gy + 1)])
+                if climb_down and ladder(gx, gy - 1):
+                    edges[i].append(index[(gx, gy - 1)])
+
+        # Поиск в ширину от каждой цели по обратным ребрам
+        incoming = [[] for _ in nodes]
+        for i, targets in enumerate(edges):
+            for j in targets:
+                incoming[j].append(i)
+        count = len(nodes)
+        next_hop = np.full((count, count), -1, dtype=np.int16)
+        dist = np.full((count, count), NAV_UNREACHABLE, dtype=np.uint16)
+        for goal in range(count):
+            hops = [-1] * count
+            steps = [NAV_UNREACHABLE] * count
+            hops[goal], steps[goal] = goal, 0
+            frontier = deque([goal])
+            while frontier:
+                node = frontier.popleft()
+                for previous in incoming[node]:
+                    if steps[previous] == NAV_UNREACHABLE:
+                        steps[previous] = steps[node] + 1
+                        hops[previous] = node
+                        frontier.append(previous)
+            next_hop[:, goal] = hops
+            dist[:, goal] = steps
+
+        gx = np.array([node[0] for node in nodes], dtype=np.int64)
+        gy = np.array([node[1] for node in nodes], dtype=np.int64)
+        on_ladder = np.array([ladder(*node) for node in nodes], dtype=bool)
+        return cls(gx, gy, on_ladder, next_hop, dist, rows, cols)
+
+    def save(self, path):
+        """Пишет граф в .npz (сначала во временный файл)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            np.savez(file, gx=self.gx, gy=self.gy, ladder=self.ladder,
+                     next_hop=self.next_hop, dist=self.dist)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, rows, cols):
+        """Читает граф из .npz."""
+        with np.load(path) as data:
+            return cls(data["gx"], data["gy"], data["ladder"],
+                       data["next_hop"], data["dist"], rows, cols)
+
+
+def nav_key(level_map, for_player=False):
+    """Отпечаток карты (и всего, от чего зависит граф)."""
+    header = f"{NAV_VERSION}|{TILE}|{NAV_JUMP_SPEED}|{NAV_GRAVITY}|{SOLID_TILES_2}|{NAV_LADDER_TILES}"
+    if for_player:
+        header += f"|player|{JUMP_SPEED}|{GRAVITY}"
+    digest = hashlib.sha256(f"{header}\n".encode())
+    digest.update("\n".join(level_map).encode())
+    return digest.hexdigest()
+
+
+# Отпечаток карты -> NavGraph (или None для слишком больших карт)
+_nav_graphs = {}
+
+
+def get_nav_graph(level_map, folder=os.path.join(LEVELS_DIR, LEVEL_CACHE_DIR),
+                  for_player=False):
+    """
+    Граф дорог для карты: из памяти, из файла или новый.
+    for_player - граф для бота-игрока, а не для врагов.
+
+    Возвращает:
+        NavGraph или None (карта слишком большая)
+    """
+    key = nav_key(level_map, for_player)
+    if key in _nav_graphs:
+        return _nav_graphs[key]
+
+    rows = len(level_map)
+    cols = max((len(line) for line in level_map), default=0)
+    path = os.path.join(folder, f"nav-{key[:32]}.npz")
+    try:
+        graph = NavGraph.load(path, rows, cols)
+    except (OSError, ValueError, KeyError):
+        if for_player:
+            graph = NavGraph.build(level_map, jump_cells=nav_jump_cells(JUMP_SPEED, GRAVITY),
+                                   open_jumps=True, climb_down=False)
+        else:
+            graph = NavGraph.build(level_map)
+        if graph is not None:
+            try:
+                graph.save(path)
+            except OSError as error:
+                print(f"Граф дорог не сохранен: {error}", file=sys.stderr)
+    _nav_graphs[key] = graph
+    return graph
+
+# =====================================================
+# ЗАПИСЬ ИГРЫ (ПОВТОРЫ)
+# =====================================================
+"""
+КАК УСТРОЕН ПОВТОР:
+Симуляция идет ровными тиками, а все случайные числа берутся
+из генератора с зерном. Значит, чтобы повторить забег, достаточно
+знать уровень, персонажа, зерно и в каком тике какая кнопка
+была нажата или отпущена.
+Файл повтора маленький и двоичный:
+- заголовок: метка, версия, уровень, тиков в секунду, зерно, число тиков;
+- имя персонажа;
+- события: сколько тиков прошло с прошлого события (varint)
+  и один байт "кнопка * 2 + нажата".
+"""
+REPLAY_MAGIC = b"DREP"                 # Метка файла повтора
+REPLAY_VERSION = 4                     # Версия формата (4 - спасаемые не бегут к игроку)
+REPLAY_HEADER = struct.Struct("<4sBBHQI")
+REPLAYS_DIR = "replays"                # Папка для повторов
+
+# Номера кнопок в файле
+REPLAY_ACTIONS = (ACTION_LEFT, ACTION_RIGHT, ACTION_UP)
+
+
+def _write_varint(out, value):
+    """Пишет неотрицательное число по 7 бит в байт."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    """
+    Читает число, записанное _write_varint.
+
+    Возвращает:
+        (число, позиция после него)
+    """
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Replay:
+    """
+    Запись одного забега: уровень, персонаж, зерно и нажатия по тикам.
+    """
+    def __init__(self, level, character, seed, events=None, ticks=0):
+        self.level = level
+        self.character = character
+        self.seed = seed
+        self.events = events if events is not None else []   # (тик, действие, нажато)
+        self.ticks = ticks                                    # Длина забега в тиках
+
+    def record(self, tick, action, pressed):
+        """Запоминает нажатие или отпускание кнопки."""
+        self.events.append((tick, action, pressed))
+
+    def to_bytes(self):
+        """Упаковывает повтор в байты."""
+        out = bytearray(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.level,
+                                           TICK_RATE, self.seed, self.ticks))
+        name = self.character.encode("utf-8")
+        out.append(len(name))
+        out += name
+        _write_varint(out, len(self.events))
+        previous = 0
+        for tick, action, pressed in self.events:
+            _write_varint(out, tick - previous)
+            out.append(REPLAY_ACTIONS.index(action) * 2 + int(pressed))
+            previous = tick
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Распаковывает повтор из байтов."""
+        magic, version, level, tick_rate, seed, ticks = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError("это не файл повтора или он другой версии")
+        if tick_rate != TICK_RATE:
+            raise ValueError(f"повтор записан при {tick_rate} тиках в секунду, "
+                             f"а игра работает при {TICK_RATE}")
+        pos = REPLAY_HEADER.size
+        length = data[pos]
+        character = data[pos + 1:pos + 1 + length].decode("utf-8")
+        pos += 1 + length
+        count, pos = _read_varint(data, pos)
+        events = []
+        tick = 0
+        for _ in range(count):
+            delta, pos = _read_varint(data, pos)
+            tick += delta
+            code = data[pos]
+            pos += 1
+            events.append((tick, REPLAY_ACTIONS[code // 2], bool(code % 2)))
+        return cls(level, character, seed, events, ticks)
+
+    def save(self, path):
+        """Сохраняет повтор в файл."""
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """Читает повтор из файла."""
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def save_replay(sim):
+    """
+    Сохраняет повтор законченного забега в папку REPLAYS_DIR.
+
+    Возвращает:
+        путь к файлу или None, если записать не удалось
+    """
+    replay = sim.replay
+    replay.ticks = sim.ticks
+    path = os.path.join(REPLAYS_DIR, f"level{replay.level}_"
+                                     f"{time.strftime('%Y%m%d_%H%M%S')}_{replay.seed:x}.rep")
+    try:
+        os.makedirs(REPLAYS_DIR, exist_ok=True)
+        replay.save(path)
+    except OSError as error:
+        print(f"Не удалось сохранить повтор: {error}", file=sys.stderr)
+        return None
+    return path
+
+
+def play_replay(replay, level_map=None):
+    """
+    Проигрывает повтор без окна так быстро, как получится.
+
+    Возвращает:
+        словарь: чем кончился забег и сколько длились тики
+    """
+    setup_start = time.perf_counter()
+    sim = SIMULATIONS[replay.level](replay.character, level_map, seed=replay.seed)
+    setup_time = time.perf_counter() - setup_start
+
+    events = replay.events
+    position = 0
+    slowest = 0.0
+    start = time.perf_counter()
+    while sim.ticks < replay.ticks and sim.state == STATE_PLAYING:
+        # Ввод этого тика - до шага, как в окне
+        while position < len(events) and events[position][0] <= sim.ticks:
+            _, action, pressed = events[position]
+            if pressed:
+                sim.press(action)
+            else:
+                sim.release(action)
+            position += 1
+        tick_start = time.perf_counter()
+        sim.step(TICK_TIME)
+        slowest = max(slowest, time.perf_counter() - tick_start)
+    duration = time.perf_counter() - start
+
+    return {
+        "level": replay.level,
+        "character": replay.character,
+        "seed": replay.seed,
+        "ticks": sim.ticks,
+        "state": sim.state,
+        "player": [sim.player.center_x, sim.player.center_y],
+        "game_seconds": sim.elapsed_time,
+        "seconds": duration,
+        "ticks_per_second": sim.ticks / duration if duration > 0 else 0.0,
+        "slowest_tick_ms": slowest * 1000,
+        "setup_ms": setup_time * 1000,
+    }
+
+
+def make_stress_level(enemies=1000, width=64):
+    """
+    Создает карту для проверки толпы врагов:
+    этажи один над другим, на каждом - ряд мышей и лягушек,
+    а игрок - на самом нижнем этаже.
+
+    Возвращает:
+        список строк, как LEVEL_2
+    """
+    per_floor = width - 2
+    floors = max(1, -(-enemies // per_floor))
+    wall = "1" * width
+    empty = "1" + "0" * (width - 2) + "1"
+    level = [wall]
+    placed = 0
+    for floor in range(floors):
+        cells = []
+        for col in range(per_floor):
+            if placed < enemies:
+                cells.append("M" if placed % 2 == 0 else "F")
+                placed += 1
+            else:
+                cells.append("0")
+        level.append(empty)
+        level.append("1" + "".join(cells) + "1")
+        level.append(wall)
+    # Игрок на отдельном нижнем этаже
+    level.append(empty)
+    level.append("1P" + "0" * (width - 3) + "1")
+    level.append(wall)
+    return level
+
+
+def make_demo_script(ticks, seed=0):
+    """
+    Создает сценарий ввода для прогона без окна:
+    игрок бегает влево-вправо и иногда прыгает.
+
+    Возвращает:
+        список (тик, действие, нажато)
+    """
+    rng = random.Random(seed)
+    script = []
+    tick = 0
+    direction = ACTION_RIGHT
+    while tick < ticks:
+        # Бежим в одну сторону 1-3 секунды
+        hold = rng.randint(60, 180)
+        script.append((tick, direction, True))
+        # Пара прыжков по дороге
+        for _ in range(2):
+            jump_tick = tick + rng.randint(0, hold)
+            script.append((jump_tick, ACTION_UP, True))
+            script.append((jump_tick + 1, ACTION_UP, False))
+        tick += hold
+        script.append((tick, direction, False))
+        direction = ACTION_LEFT if direction == ACTION_RIGHT else ACTION_RIGHT
+    script.sort(key=lambda event: event[0])
+    return script
+
+
+def run_headless(level=2, ticks=10000, script=None, character="male",
+                 delta_time=TICK_TIME, level_map=None):
+    """
+    Прогоняет уровень без окна по сценарию ввода.
+    Когда уровень заканчивается (победа или проигрыш),
+    он начинается заново, пока не пройдет нужное число тиков.
+
+    Аргументы:
+        level: номер уровня (1 или 2)
+        ticks: сколько тиков прогнать
+        script: список (тик, действие, нажато); по умолчанию демо-сценарий
+        character: персонаж
+        delta_time: длительность одного тика
+        level_map: своя карта вместо встроенной
+
+    Возвращает:
+        словарь со статистикой прогона
+    """
+    if script is None:
+        script = make_demo_script(ticks)
+    simulation_class = SIMULATIONS[level]
+
+    setup_start = time.perf_counter()
+    sim = simulation_class(character, level_map)
+    setup_time = time.perf_counter() - setup_start
+
+    results = {STATE_WON: 0, STATE_LOST: 0}
+    events_total = 0
+    position = 0  # Следующее событие сценария
+
+    start = time.perf_counter()
+    for tick in range(ticks):
+        # Применяем ввод этого тика
+        while position < len(script) and script[position][0] <= tick:
+            _, action, pressed = script[position]
+            if pressed:
+                sim.press(action)
+            else:
+                sim.release(action)
+            position += 1
+
+        events_total += len(sim.step(delta_time))
+
+        # Уровень закончился - начинаем заново
+        if sim.state != STATE_PLAYING:
+            results[sim.state] += 1
+            sim = simulation_class(character, level_map)
+    duration = time.perf_counter() - start
+
+    return {
+        "level": level,
+        "ticks": ticks,
+        "seconds": duration,
+        "ticks_per_second": ticks / duration if duration > 0 else 0.0,
+        "tick_ms": duration / ticks * 1000 if ticks else 0.0,
+        "setup_ms": setup_time * 1000,
+        "wins": results[STATE_WON],
+        "losses": results[STATE_LOST],
+        "events": events_total,
+        "assets": ASSETS.stats(),
+    }
+
+# =====================================================
+# ПРОГОНЫ ДЛЯ БАЛАНСА
+# =====================================================
+"""
+КАК УСТРОЕНЫ ПРОГОНЫ ДЛЯ БАЛАНСА:
+Урон шипов, бомбу и очки подбирают по тысячам забегов, а не на глаз.
+Каждый забег - уровень без окна со своим зерном и ботом вместо игрока.
+Бот каждый тик смотрит на мир и жмет те же кнопки, что и человек:
+  script - демо-сценарий (бег влево-вправо с прыжками),
+  random - случайные кнопки,
+  seeker - идет по графу дорог к ключу, потом к двери
+           и иногда отвлекается на случайные кнопки.
+Забег кончается победой, смертью или по лимиту тиков.
+
+Варианты правил перебираются все со всеми (--set spike_damage=5,10,20),
+и у всех вариантов одни и те же зерна, чтобы сравнение было честным.
+Забеги раздаются по процессам (по одному на ядро) пачками:
+пачка - одна задача пула, так что пересылок между процессами мало.
+Картинки и граф дорог каждый процесс грузит один раз на все свои забеги.
+В сводке: доля побед, время, здоровье на выходе и очки (перцентили).
+"""
+BALANCE_RULES = {                       # Правила забега, которые можно менять
+    "spike_damage": SPIKE_DAMAGE,
+    "spike_cooldown": SPIKE_COOLDOWN,
+    "bomb_divisor": 2,
+}
+BALANCE_MAX_TICKS = 120 * TICK_RATE     # Лимит забега (2 минуты игры)
+BALANCE_CHUNK = 25                      # Забегов в одной задаче пула
+BALANCE_PERCENTILES = (5, 25, 50, 75, 95)
+BOT_HOLD_TICKS = (10, 60)               # Сколько бот держит случайную кнопку
+BOT_JUMP_CHANCE = 0.05                  # Случайный прыжок за тик
+BOT_DISTRACTION = 0.1                   # Сколько раз в секунду seeker отвлекается
+
+
+class ScriptBot:
+    """Бот по демо-сценарию (тот же ввод, что у --headless)."""
+    def __init__(self, seed, max_ticks):
+        self.script = make_demo_script(max_ticks, seed)
+        self.position = 0   # Следующее событие сценария
+
+    def act(self, sim):
+        """Жмет кнопки этого тика."""
+        while self.position < len(self.script) and self.script[self.position][0] <= sim.ticks:
+            _, action, pressed = self.script[self.position]
+            if pressed:
+                sim.press(action)
+            else:
+                sim.release(action)
+            self.position += 1
+
+
+class RandomBot:
+    """Бот, который держит случайные кнопки и иногда прыгает."""
+    def __init__(self, seed, max_ticks):
+        self.rng = random.Random(seed)
+        self.holding = None     # Какую кнопку направления держим
+        self.next_change = 0    # Тик, когда выбрать кнопку заново
+
+    def hold(self, sim, action):
+        """Держит кнопку направления (None - ничего не держит)."""
+        if action != self.holding:
+            if self.holding is not None:
+                sim.release(self.holding)
+            if action is not None:
+                sim.press(action)
+            self.holding = action
+
+    def act(self, sim):
+        """Жмет кнопки этого тика."""
+        if sim.ticks >= self.next_change:
+            self.next_change = sim.ticks + self.rng.randint(*BOT_HOLD_TICKS)
+            self.hold(sim, self.rng.choice((ACTION_LEFT, ACTION_RIGHT, None)))
+        if self.rng.random() < BOT_JUMP_CHANCE:
+            sim.press(ACTION_UP)
+
+
+class SeekerBot(RandomBot):
+    """
+    Бот, который идет по графу дорог игрока: сначала к ключу, потом к двери,
+    и перепрыгивает шипы. Где дороги нет (или бот отвлекся),
+    он ведет себя как RandomBot.
+    """
+    def __init__(self, seed, max_ticks):
+        super().__init__(seed, max_ticks)
+        self.nav = None             # Граф дорог игрока (при первом тике)
+        self.spikes = set()         # Клетки (gx, gy) с шипами
+        self.node = -1              # Последний узел графа под игроком
+        self.distracted_until = 0   # До какого тика жмет случайные кнопки
+
+    def prepare(self, sim):
+        """Граф и шипы карты (граф строится один раз на процесс)."""
+        self.nav = get_nav_graph(sim.level_map, for_player=True)
+        rows = len(sim.level_map)
+        self.spikes = {(col, rows - row) for row, line in enumerate(sim.level_map)
+                       for col, ch in enumerate(line) if ch == "S"}
+
+    def goal(self, sim, nav):
+        """Ближайший по графу узел с ключом (или с дверью, если ключ есть)."""
+        targets = sim.doors if sim.has_key else sim.keys
+        best, best_dist = -1, NAV_UNREACHABLE
+        for sprite in targets:
+            node = nav.node_at_point(sprite.center_x, sprite.center_y)
+            if node >= 0 and nav.dist[self.node, node] < best_dist:
+                best, best_dist = node, nav.dist[self.node, node]
+        return best
+
+    def act(self, sim):
+        """Жмет кнопки этого тика."""
+        # Карты без графа врагов (слишком большие) и бот не размечает
+        if self.nav is None and sim.enemies.nav is not None:
+            self.prepare(sim)
+        nav = self.nav
+        if nav is None:
+            super().act(sim)
+            return
+        player = sim.player
+        here = nav.node_at_point(player.center_x, player.center_y)
+        if here >= 0:
+            self.node = here
+
+        hop = -1
+        if self.node >= 0 and sim.ticks >= self.distracted_until:
+            goal = self.goal(sim, nav)
+            if goal >= 0:
+                hop = int(nav.next_hop[self.node, goal])
+            if self.rng.random() < BOT_DISTRACTION / TICK_RATE:
+                self.distracted_until = sim.ticks + self.rng.randint(*BOT_HOLD_TICKS)
+        if hop < 0:
+            super().act(sim)
+            return
+
+        # К середине клетки следующего узла. Если он выше - прыжок (или лестница),
+        # и в сторону бот идет, только когда поднялся до его высоты
+        rising = nav.center_y[hop] > nav.center_y[self.node]
+        if rising and player.center_y < nav.center_y[hop]:
+            target = nav.center_x[self.node]
+            sim.press(ACTION_UP)
+        else:
+            target = nav.center_x[hop]
+        dx = target - player.center_x
+        if dx > PLAYER_SPEED:
+            self.hold(sim, ACTION_RIGHT)
+        elif dx < -PLAYER_SPEED:
+            self.hold(sim, ACTION_LEFT)
+        else:
+            self.hold(sim, None)
+
+        # Шипы впереди перепрыгиваем
+        if self.holding is not None:
+            side = 1 if self.holding == ACTION_RIGHT else -1
+            ahead = (int((player.center_x + side * TILE * 0.75) // TILE),
+                     int((player.center_y + TILE // 2) // TILE))
+            if ahead in self.spikes:
+                sim.press(ACTION_UP)
+        self.next_change = sim.ticks   # После дороги случайная кнопка выбирается заново
+
+
+BALANCE_BOTS = {
+    "script": ScriptBot,
+    "random": RandomBot,
+    "seeker": SeekerBot,
+}
+
+
+def play_balance_run(level, seed, bot="seeker", character="male", rules=None,
+                     weights=None, max_ticks=BALANCE_MAX_TICKS):
+    """
+    Один забег без окна для баланса.
+
+    Аргументы:
+        level: номер уровня (правила уровня 2)
+        seed: зерно уровня и бота
+        bot: имя бота из BALANCE_BOTS
+        rules: свои значения правил из BALANCE_RULES
+        weights: свои очки (по умолчанию как у уровня)
+        max_ticks: лимит забега
+
+    Возвращает:
+        словарь с итогом забега
+    """
+    sim = SIMULATIONS[level](character, seed=seed)
+    for name, value in (rules or {}).items():
+        setattr(sim, name, value)
+    player = BALANCE_BOTS[bot](seed, max_ticks)
+
+    while sim.state == STATE_PLAYING and sim.ticks < max_ticks:
+        player.act(sim)
+        sim.step(TICK_TIME)
+
+    stats = sim.stats()
+    return {
+        "seed": seed,
+        "state": sim.state if sim.state != STATE_PLAYING else "timeout",
+        "ticks": sim.ticks,
+        "time": stats["time"],
+        "hp": sim.hp,
+        "score": calculate_score(stats["coins"], stats["diamonds"], stats["saved_mouse"],
+                                 stats["saved_frog"], weights or LEVEL_WEIGHTS.get(level)),
+    }
+
+
+def _balance_chunk(task):
+    """
+    Пачка забегов в процессе пула.
+    Функция верхнего уровня: пул передает ее в процесс по имени.
+    """
+    level, seeds, settings = task
+    if level not in SIMULATIONS:
+        get_level_catalog()   # Новый процесс еще не открывал папку levels
+    return [play_balance_run(level, seed, **settings) for seed in seeds]
+
+
+def parse_balance_grid(items):
+    """
+    Разбирает варианты правил: ["spike_damage=5,10", "coin=20"].
+    Менять можно правила из BALANCE_RULES и очки из SCORE_WEIGHTS.
+
+    Возвращает:
+        словарь имя -> список значений
+    """
+    grid = {}
+    for item in items:
+        name, sep, text = item.partition("=")
+        name = name.strip()
+        if not sep or name not in {**BALANCE_RULES, **SCORE_WEIGHTS}:
+            raise ValueError(f"нужно ИМЯ=ЗНАЧЕНИЯ, имена: "
+                             f"{', '.join([*BALANCE_RULES, *SCORE_WEIGHTS])}")
+        values = []
+        for part in text.split(","):
+            try:
+                value = float(part)
+            except ValueError:
+                raise ValueError(f"{name}: не число {part!r}") from None
+            if name == "bomb_divisor" and value <= 0:
+                raise ValueError("bomb_divisor должен быть больше нуля")
+            values.append(int(value) if value.is_integer() else value)
+        grid[name] = values
+    return grid
+
+
+def _spread(values):
+    """Среднее, крайние значения и перцентили (None, если значений нет)."""
+    if not values:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    spread = {"mean": float(values.mean()), "min": float(values.min())}
+    for p, value in zip(BALANCE_PERCENTILES, np.percentile(values, BALANCE_PERCENTILES)):
+        spread[f"p{p}"] = float(value)
+    spread["max"] = float(values.max())
+    return spread
+
+
+def summarize_balance(runs):
+    """Сводка по забегам одного варианта правил."""
+    won = [run for run in runs if run["state"] == STATE_WON]
+    count = len(runs)
+    return {
+        "runs": count,
+        "completion_rate": len(won) / count if count else 0.0,
+        "wins": len(won),
+        "losses": sum(run["state"] == STATE_LOST for run in runs),
+        "timeouts": sum(run["state"] == "timeout" for run in runs),
+        "time": _spread([run["time"] for run in won]),
+        "hp_at_exit": _spread([run["hp"] for run in won]),
+        "score": _spread([run["score"] for run in won]),
+    }
+
+
+def run_balance(level=2, runs=1000, bot="seeker", character="male", grid=None,
+                workers=None, max_ticks=BALANCE_MAX_TICKS, first_seed=0):
+    """
+    Прогоны для баланса на всех ядрах.
+
+    Аргументы:
+        level: номер уровня (правила уровня 2)
+        runs: сколько забегов на каждый вариант правил
+        bot: имя бота из BALANCE_BOTS
+        grid: имя правила или очков -> список значений (см. parse_balance_grid)
+        workers: сколько процессов (по умолчанию по числу ядер)
+        max_ticks: лимит одного забега
+        first_seed: зерно первого забега (дальше по порядку)
+
+    Возвращает:
+        словарь со сводкой по каждому варианту
+    """
+    grid = grid or {}
+    names = list(grid)
+    variants = [dict(zip(names, values))
+                for values in itertools.product(*(grid[name] for name in names))]
+    workers = workers or os.cpu_count() or 1
+
+    tasks = []
+    for variant in variants:
+        rules = {name: value for name, value in variant.items() if name in BALANCE_RULES}
+        weights = {name: value for name, value in variant.items() if name in SCORE_WEIGHTS}
+        if weights:
+            weights = {**(LEVEL_WEIGHTS.get(level) or SCORE_WEIGHTS), **weights}
+        settings = {"bot": bot, "character": character, "rules": rules,
+                    "weights": weights or None, "max_ticks": max_ticks}
+        for start in range(first_seed, first_seed + runs, BALANCE_CHUNK):
+            seeds = list(range(start, min(start + BALANCE_CHUNK, first_seed + runs)))
+            tasks.append((level, seeds, settings))
+
+    start = time.perf_counter()
+    if workers == 1:
+        chunks = list(map(_balance_chunk, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_balance_chunk, tasks))
+    duration = time.perf_counter() - start
+
+    # Пачки приходят в порядке задач: подряд идут пачки одного варианта
+    per_variant = len(tasks) // len(variants)
+    report = []
+    for index, variant in enumerate(variants):
+        variant_runs = []
+        for chunk in chunks[index * per_variant:(index + 1) * per_variant]:
+            variant_runs.extend(chunk)
+        report.append({"rules": {**BALANCE_RULES, **variant}, **summarize_balance(variant_runs)})
+
+    total = runs * len(variants)
+    return {
+        "level": level,
+        "bot": bot,
+        "runs": total,
+        "workers": workers,
+        "seconds": duration,
+        "runs_per_second": total / duration if duration > 0 else 0.0,
+        "variants": report,
+    }
+
+# =====================================================
+# ИНТЕРФЕЙС ИГРОКА (HUD)
+# =====================================================
+"""
+КАК РАБОТАЕТ ИНТЕРФЕЙС:
+Надписи не создаются заново каждый кадр. Каждая надпись живет
+все время уровня и помнит, из какого поля игры она берет значение.
+Текст пересобирается, только когда значение поменялось,
+а места и размер шрифта - только когда поменялось окно.
+Все надписи и полупрозрачный фон рисуются одной пачкой.
+"""
+HUD_FONT = ("calibri", "arial")   # Тот же шрифт, что у arcade.draw_text
+HUD_ROW_HEIGHT = 30               # Расстояние между строками
+
+
+class HudLabel:
+    """
+    Одна надпись интерфейса.
+
+    Аргументы:
+        read: достает значение из состояния игры
+        text: делает из значения строку
+        color: цвет или функция значение -> цвет
+        row: номер строки сверху
+        align: "left" или "right"
+    """
+    def __init__(self, hud, read, text, color, row, align="left"):
+        self.read = read
+        self.text = text
+        self.color = color
+        self.row = row
+        self.align = align
+        self.value = None
+        self.changed = True   # Первый раз текст собираем обязательно
+        self.label = pyglet.text.Label("", font_name=HUD_FONT, anchor_x=align,
+                                       batch=hud.batch, group=hud.text_group)
+
+    def refresh(self, state):
+        """Обновляет текст, если значение поменялось."""
+        value = self.read(state)
+        if value == self.value and not self.changed:
+            return False
+        self.value = value
+        self.changed = False
+        color = self.color(value) if callable(self.color) else self.color
+        self.label.text = self.text(value)
+        self.label.color = (*color[:3], 255)
+        return True
+
+
+class Hud:
+    """
+    Все надписи интерфейса одного уровня.
+    """
+    def __init__(self, backdrop_height=0):
+        self.batch = pyglet.graphics.Batch()
+        self.back_group = pyglet.graphics.Group(order=0)   # Фон снизу
+        self.text_group = pyglet.graphics.Group(order=1)   # Текст сверху
+        self.labels = []
+        self.size = None        # Размер окна, под который все расставлено
+        self.relayouts = 0      # Сколько раз пересобирались надписи
+
+        self.backdrop = None
+        self.backdrop_height = backdrop_height
+        if backdrop_height:
+            self.backdrop = pyglet.shapes.Rectangle(0, 0, 1, backdrop_height, (0, 0, 0),
+                                                    batch=self.batch, group=self.back_group)
+            self.backdrop.opacity = 150
+
+    def add(self, read, text, color, row, align="left"):
+        """Добавляет надпись."""
+        label = HudLabel(self, read, text, color, row, align)
+        self.labels.append(label)
+        return label
+
+    def _layout(self, width, height):
+        """Расставляет надписи под новый размер окна."""
+        self.size = width, height
+        left_margin = width * 0.05
+        font_size = int(14 * width / 800)
+        for label in self.labels:
+            label.label.begin_update()
+            label.label.font_size = font_size
+            label.label.x = left_margin if label.align == "left" else width - left_margin
+            label.label.y = height - HUD_ROW_HEIGHT * (label.row + 1)
+            label.label.end_update()
+        if self.backdrop:
+            self.backdrop.position = 0, height - self.backdrop_height
+            self.backdrop.width = width
+
+    def update(self, state, width, height):
+        """Подтягивает значения из игры (дешево, если ничего не поменялось)."""
+        if self.size != (width, height):
+            self._layout(width, height)
+            self.relayouts += 1
+        for label in self.labels:
+            if label.refresh(state):
+                self.relayouts += 1
+
+    def draw(self):
+        """Рисует весь интерфейс одной пачкой."""
+        with arcade.get_window().ctx.pyglet_rendering():
+            self.batch.draw()
+
+# =====================================================
+# ЗАМЕР ВРЕМЕНИ КАДРА ПО ЧАСТЯМ
+# =====================================================
+"""
+КАК РАБОТАЕТ ЗАМЕР:
+Части кадра (физика, враги, столкновения, камера, рисование ...)
+обернуты в PROFILER.phase("имя"). Пока замер выключен, phase
+отдает пустую заглушку, и цена - один вызов функции.
+Когда замер включен, время каждой части за кадр складывается,
+а в конце кадра попадает в скользящее окно последних кадров.
+По окну считаются p50/p95/p99 для таблички на экране (F3).
+По F4 те же данные пишутся в CSV-файл, по строке на кадр.
+"""
+PROFILE_PHASES = ("update", "physics", "enemies", "animation", "collisions", "camera",
+                  "draw", "draw_static", "draw_sprites", "draw_hud")
+PROFILE_WINDOW = 600          # Сколько последних кадров помнить
+PROFILE_REFRESH = 0.5         # Как часто обновлять табличку (секунд)
+PROFILES_DIR = "profiles"     # Папка для CSV-файлов
+
+
+class FrameProfiler:
+    """
+    Время частей кадра: скользящие процентили, табличка и CSV.
+    """
+    def __init__(self, phases=PROFILE_PHASES, window=PROFILE_WINDOW):
+        self.phases = phases
+        self.enabled = False          # Идет ли замер
+        self.show_overlay = False     # Видна ли табличка
+        self.frame = dict.fromkeys(phases, 0.0)                 # Текущий кадр
+        self.history = {name: deque(maxlen=window) for name in phases}
+        self.frames = 0               # Сколько кадров замерено
+        self.csv_file = None
+        self.csv_writer = None
+        self.label = None             # Надпись таблички
+        self.label_time = 0.0         # Когда табличка обновлялась
+        self._off = contextlib.nullcontext()
+
+    def phase(self, name):
+        """
+        Замеряет кусок кода:
+            with PROFILER.phase("physics"):
+                ...
+        """
+        if not self.enabled:
+            return self._off
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.frame[name] += time.perf_counter() - start
+
+    def _update_enabled(self):
+        self.enabled = self.show_overlay or self.csv_file is not None
+
+    def toggle_overlay(self):
+        """Показывает или прячет табличку."""
+        self.show_overlay = not self.show_overlay
+        self._update_enabled()
+
+    def toggle_csv(self):
+        """
+        Начинает или заканчивает запись в CSV.
+
+        Возвращает:
+            путь к файлу, если запись началась
+        """
+        if self.csv_file is not None:
+            self.stop_csv()
+            return None
+        path = os.path.join(PROFILES_DIR, f"profile_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+        try:
+            os.makedirs(PROFILES_DIR, exist_ok=True)
+            self.csv_file = open(path, "w", newline="", encoding="utf-8")
+        except OSError as error:
+            print(f"Не удалось начать запись замеров: {error}", file=sys.stderr)
+            return None
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(["frame", "time"] + [f"{name}_ms" for name in self.phases])
+        self._update_enabled()
+        return path
+
+    def stop_csv(self):
+        """Закрывает CSV-файл."""
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = self.csv_writer = None
+        self._update_enabled()
+
+    def end_frame(self):
+        """Закрывает кадр: время частей уходит в историю и в CSV."""
+        if not self.enabled:
+            return
+        self.frames += 1
+        for name, seconds in self.frame.items():
+            self.history[name].append(seconds * 1000)
+            self.frame[name] = 0.0
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(
+                [self.frames, f"{time.perf_counter():.4f}"]
+                + [f"{self.history[name][-1]:.4f}" for name in self.phases])
+
+    def percentiles(self):
+        """
+        Возвращает:
+            {часть: (p50, p95, p99)} в миллисекундах
+        """
+        return {name: tuple(np.percentile(values, [50, 95, 99]))
+                for name, values in self.history.items() if values}
+
+    def draw(self, width, height):
+        """Рисует табличку (если она включена)."""
+        if not self.show_overlay:
+            return
+        if self.label is None:
+            self.label = pyglet.text.Label("", font_name="courier new", font_size=10,
+                                           multiline=True, width=420,
+                                           anchor_y="top", color=(255, 255, 0, 255))
+        now = time.perf_counter()
+        if now - self.label_time >= PROFILE_REFRESH:
+            self.label_time = now
+            lines = [f"{'часть':<13}{'p50':>8}{'p95':>8}{'p99':>8}  мс"]
+            for name, (p50, p95, p99) in self.percentiles().items():
+                lines.append(f"{name:<13}{p50:>8.2f}{p95:>8.2f}{p99:>8.2f}")
+            if self.csv_file is not None:
+                lines.append("запись в CSV ...")
+            self.label.text = "\n".join(lines)
+        self.label.x = width - 430
+        self.label.y = height - 10
+        with arcade.get_window().ctx.pyglet_rendering():
+            self.label.draw()
+
+
+# Один замер на весь процесс
+PROFILER = FrameProfiler()
+atexit.register(PROFILER.stop_csv)
+
+# =====================================================
+# ПЕРЕКЛЮЧЕНИЕ ЭКРАНОВ
+# =====================================================
+"""
+КАК ПЕРЕКЛЮЧАЮТСЯ ЭКРАНЫ:
+Окно создается один раз на весь процесс, дальше в нем только
+меняются экраны через VIEWS:
+- экраны меню (старт, выбор персонажа, выбор уровня для каждого
+  персонажа, проигрыш) создаются при первом показе и потом
+  берутся из кеша;
+- экран уровня один на класс (GameView, GameView2). Новый забег
+  его не пересоздает, а сбрасывает на месте: setup() строит новую
+  симуляцию, а камеры, надписи, звуки и шейдер статичного слоя
+  остаются от прошлого раза;
+- после забега экран уровня сразу отпускает симуляцию и картинки
+  кусков, поэтому тысячи забегов подряд не копят память.
+Раньше экраны итогов закрывали окно и заново звали main() изнутри
+arcade.run(): новое окно, новый контекст OpenGL, все загрузки
+заново и лишний уровень стека на каждый перезапуск.
+Каждое переключение замеряется: "menu" - от клика на экране итогов
+до стартового экрана, "run" - от клика по уровню до готового забега.
+Сводка печатается при выходе из игры.
+"""
+VIEW_TIMINGS_WINDOW = 200     # Сколько последних переключений помнить
+
+
+class ViewManager:
+    """
+    Одно окно, кеш экранов меню и сброс экранов уровней на месте.
+    """
+    def __init__(self, clock=time.perf_counter, history=VIEW_TIMINGS_WINDOW):
+        self.clock = clock          # Откуда брать время (для проверок - свои часы)
+        self.window = None          # Окно игры (одно на весь процесс)
+        self.menus = {}             # Ключ -> экран меню
+        self.games = {}             # Класс экрана -> экран уровня
+        self.current_game = None    # Экран идущего (или только что кончившегося) забега
+        self.timings = {"menu": deque(maxlen=history), "run": deque(maxlen=history)}
+        self.runs = 0               # Сколько забегов начато
+        self.restarts = 0           # Сколько раз вернулись в меню после забега
+
+    def attach(self, window):
+        """Запоминает окно. Экраны прошлого окна выбрасываются."""
+        self.window = window
+        self.menus.clear()
+        self.games.clear()
+        self.current_game = None
+
+    def menu(self, key, factory):
+        """Экран меню из кеша (создается при первом обращении)."""
+        view = self.menus.get(key)
+        if view is None:
+            view = self.menus[key] = factory()
+        return view
+
+    def _record(self, kind, started):
+        """Запоминает, сколько заняло переключение (в миллисекундах)."""
+        self.timings[kind].append((self.clock() - started) * 1000)
+
+    def show_start(self):
+        """Показывает стартовый экран."""
+        self.window.show_view(self.menu("start", StartView))
+
+    def show_characters(self):
+        """Показывает выбор персонажа."""
+        self.window.show_view(self.menu("characters", CharacterSelectView))
+
+    def show_levels(self, character):
+        """Показывает выбор уровня для персонажа."""
+        self.window.show_view(self.menu(("levels", character),
+                                        lambda: LevelSelectView(character)))
+
+    def show_game_over(self):
+        """Показывает экран проигрыша."""
+        self.window.show_view(self.menu("game_over", GameOverView))
+
+    def start_run(self, view_class, **settings):
+        """
+        Начинает забег на экране уровня view_class.
+        settings уходят в setup() (character, simulation_class ...).
+        """
+        started = self.clock()
+        view = self.games.get(view_class)
+        if view is None:
+            view = self.games[view_class] = view_class(settings["character"])
+        view.setup(**settings)
+        self.current_game = view
+        self.window.show_view(view)
+        self.runs += 1
+        self._record("run", started)
+        return view
 
-def save_record(level, coins, diamonds, saved_mouse, saved_frog, time_sec):
-    """
-    Сохраняет новый рекорд, если он лучше старого.
-    
-    Возвращает:
-        (рекорд, новый_ли_рекорд)
-    """
-    records = load_records()
-    
-    # Считаем очки:
-    # Монета = 10 очков, алмаз = 50 очков
-    # Спасение врага = 100 очков
-    score = coins * 10 + diamonds * 50
-    if saved_mouse:
-        score += 100
-    if saved_frog:
-        score += 100
-    
-    # Берем старый рекорд для этого уровня
-    current_best = records.get(f"level_{level}")
-    
-    # Проверяем, новый ли это рекорд
-    is_new = False
-    if not current_best:                     # Если рекорда еще нет
-        is_new = True
-    elif score > current_best["score"]:      # Если очков больше
-        is_new = True
-    elif score == current_best["score"] and time_sec < current_best["time"]:
-        is_new = True  # Очков столько же, но время меньше
-    
-    # Сохраняем, если это новый рекорд
-    if is_new:
-        records[f"level_{level}"] = {
-            "score": score,
-            "coins": coins,
-            "diamonds": diamonds,
-            "saved_mouse": saved_mouse,
-            "saved_frog": saved_frog,
-            "time": time_sec
+    def start_level(self, number, character):
+        """Начинает уровень по номеру (как в --level), минуя меню."""
+        if number == 1:
+            return self.start_run(GameView, character=character)
+        return self.start_run(GameView2, character=character,
+                              simulation_class=SIMULATIONS[number])
+
+    def finish_run(self):
+        """Забег окончен, игрок уходит в меню: отпускаем забег и показываем старт."""
+        started = self.clock()
+        if self.current_game is not None:
+            self.current_game.teardown()
+            self.current_game = None
+        self.show_start()
+        self.restarts += 1
+        self._record("menu", started)
+
+    def report(self):
+        """
+        Возвращает:
+            {"runs", "restarts", "menus", "games",
+             "menu"/"run": {"count", "mean_ms", "max_ms", "last_ms"}}
+        """
+        report = {
+            "runs": self.runs,
+            "restarts": self.restarts,
+            "menus": len(self.menus),
+            "games": len(self.games),
         }
-        with open(RECORDS_FILE, "w", encoding="utf-8") as f:
-            json.dump(records, f, ensure_ascii=False, indent=4)
-    
-    return records.get(f"level_{level}", {}), is_new
+        for kind, samples in self.timings.items():
+            if samples:
+                report[kind] = {
+                    "count": len(samples),
+                    "mean_ms": round(sum(samples) / len(samples), 3),
+                    "max_ms": round(max(samples), 3),
+                    "last_ms": round(samples[-1], 3),
+                }
+        return report
+
+
+# Одно окно и один набор экранов на весь процесс
+VIEWS = ViewManager()
 
 # =====================================================
 # СТАРТОВЫЙ ЭКРАН
@@ -453,10 +5036,16 @@ def save_record(level, coins, diamonds, saved_mouse, saved_frog, time_sec):
 class StartView(arcade.View):
     """
     Первый экран игры с названием и факелом.
+    При быстром запуске факел загорается уже после первого кадра.
     """
     def __init__(self):
         super().__init__()
-        self.torch = Torch()  # Создаем факел
+        self.torch = None
+        STARTUP.later(self.light_torch)
+
+    def light_torch(self):
+        """Создает факел (грузит его картинки)."""
+        self.torch = Torch()
     
     def on_show(self):
         """Вызывается при показе экрана."""
@@ -478,9 +5067,10 @@ class StartView(arcade.View):
         )
 
         # Факел ПОД надписью
-        self.torch.center_x = w // 2
-        self.torch.center_y = h // 2 - 10  # Под надписью
-        self.torch.draw()
+        if self.torch is not None:
+            self.torch.center_x = w // 2
+            self.torch.center_y = h // 2 - 10  # Под надписью
+            self.torch.draw()
 
         # Инструкция
         arcade.draw_text(
@@ -494,11 +5084,12 @@ class StartView(arcade.View):
     
     def on_update(self, delta_time):
         """Обновляет анимацию факела."""
-        self.torch.update_animation(delta_time)
+        if self.torch is not None:
+            self.torch.update_animation(delta_time)
     
     def on_mouse_press(self, x, y, button, modifiers):
         """При клике переходит к выбору персонажа."""
-        self.window.show_view(CharacterSelectView())
+        VIEWS.show_characters()
 
 # =====================================================
 # ВЫБОР ПЕРСОНАЖА
@@ -507,18 +5098,23 @@ class CharacterSelectView(arcade.View):
     """
     Экран выбора персонажа: мужчина или женщина.
     """
-    def on_show(self):
-        arcade.set_background_color(BG_COLOR)
-        # Создаем картинки персонажей
+    def __init__(self):
+        super().__init__()
+        # Создаем картинки персонажей (экран живет в кеше VIEWS)
         self.male = arcade.Sprite(
-            ":resources:/images/animated_characters/male_adventurer/maleAdventurer_idle.png",
-            0.8  # Размер
+            texture=ASSETS.texture(
+                ":resources:/images/animated_characters/male_adventurer/maleAdventurer_idle.png"),
+            scale=0.8  # Размер
         )
         self.female = arcade.Sprite(
-            ":resources:/images/animated_characters/female_adventurer/femaleAdventurer_idle.png",
-            0.8
+            texture=ASSETS.texture(
+                ":resources:/images/animated_characters/female_adventurer/femaleAdventurer_idle.png"),
+            scale=0.8
         )
 
+    def on_show(self):
+        arcade.set_background_color(BG_COLOR)
+
     def on_draw(self):
         arcade.start_render()
         w, h = self.window.width, self.window.height
@@ -544,22 +5140,30 @@ class CharacterSelectView(arcade.View):
     def on_mouse_press(self, x, y, button, modifiers):
         """Проверяет, по какому персонажу кликнули."""
         if self.male.collides_with_point((x, y)):
-            self.window.show_view(LevelSelectView("male"))
+            VIEWS.show_levels("male")
         elif self.female.collides_with_point((x, y)):
-            self.window.show_view(LevelSelectView("female"))
+            VIEWS.show_levels("female")
 
 # =====================================================
 # ВЫБОР УРОВНЯ
 # =====================================================
 class LevelSelectView(arcade.View):
     """
-    Экран выбора уровня: 1 (легкий) или 2 (сложный).
+    Экран выбора уровня: 1 (легкий), 2 (сложный), огромный мир
+    и список своих уровней из папки levels (листается колесиком).
     """
+    row_height = 32             # Высота строки в списке своих уровней
+    list_offset = 350           # От верха окна до списка своих уровней
+
     def __init__(self, character):
         super().__init__()
         self.character = character  # Запоминаем персонажа
         self.level1_rect = None     # Область кнопки "Уровень 1"
         self.level2_rect = None     # Область кнопки "Уровень 2"
+        self.world_rect = None      # Область кнопки "Огромный мир"
+        self.levels = get_level_catalog()  # Свои уровни
+        self.level_rects = []       # (область строки, уровень) для видимых строк
+        self.scroll = 0             # Первая видимая строка списка
 
     def on_show(self):
         arcade.set_background_color(BG_COLOR)
@@ -580,7 +5184,7 @@ class LevelSelectView(arcade.View):
 
         # Кнопка "Уровень 1"
         level1_x = w // 2
-        level1_y = h // 2 + 40
+        level1_y = h - 140
         level1_width = w - 100
         level1_height = 60
         
@@ -617,7 +5221,7 @@ class LevelSelectView(arcade.View):
 
         # Кнопка "Уровень 2"
         level2_x = w // 2
-        level2_y = h // 2 - 40
+        level2_y = h - 210
         level2_width = w - 100
         level2_height = 60
         
@@ -652,6 +5256,91 @@ class LevelSelectView(arcade.View):
             anchor_y="center"
         )
 
+        # Кнопка "Огромный мир"
+        world_x = w // 2
+        world_y = h - 280
+        world_width = w - 100
+        world_height = 60
+        
+        # Рисуем кнопку
+        arcade.draw_rectangle_filled(
+            world_x, world_y,
+            world_width, world_height,
+            arcade.color.DARK_GRAY
+        )
+        arcade.draw_rectangle_outline(
+            world_x, world_y,
+            world_width, world_height,
+            arcade.color.GOLD, 2
+        )
+        
+        # Запоминаем координаты кнопки для проверки клика
+        self.world_rect = {
+            "left": world_x - world_width // 2,
+            "right": world_x + world_width // 2,
+            "top": world_y + world_height // 2,
+            "bottom": world_y - world_height // 2
+        }
+
+        # Текст на кнопке
+        arcade.draw_text(
+            "ОГРОМНЫЙ МИР",
+            world_x,
+            world_y,
+            arcade.color.GOLD,
+            24,
+            anchor_x="center",
+            anchor_y="center"
+        )
+
+        # Свои уровни из файлов
+        list_top = h - self.list_offset
+        arcade.draw_text(
+            f"СВОИ УРОВНИ ({len(self.levels)})",
+            w // 2,
+            list_top + 10,
+            arcade.color.WHITE,
+            16,
+            anchor_x="center"
+        )
+        if not self.levels:
+            arcade.draw_text(
+                f"Положи файлы *{LEVEL_FILE_EXT} в папку {LEVELS_DIR}",
+                w // 2,
+                list_top - self.row_height // 2,
+                arcade.color.LIGHT_GRAY,
+                14,
+                anchor_x="center",
+                anchor_y="center"
+            )
+
+        self.scroll = min(self.scroll, max(0, len(self.levels) - self.visible_rows()))
+        self.level_rects = []
+        shown = self.levels[self.scroll:self.scroll + self.visible_rows()]
+        for i, level in enumerate(shown):
+            row_y = list_top - self.row_height * i - self.row_height // 2
+            row_width = w - 100
+            arcade.draw_rectangle_filled(
+                w // 2, row_y,
+                row_width, self.row_height - 4,
+                arcade.color.DARK_GRAY
+            )
+            arcade.draw_text(
+                level.describe(),
+                60,
+                row_y,
+                arcade.color.GOLD,
+                14,
+                anchor_y="center"
+            )
+            rect = {
+                "left": w // 2 - row_width // 2,
+                "right": w // 2 + row_width // 2,
+                "top": row_y + self.row_height // 2,
+                "bottom": row_y - self.row_height // 2
+            }
+            self.level_rects.append((rect, level))
+
         # Инструкция внизу
         arcade.draw_text(
             "Клик по уровню — начать",
@@ -668,20 +5357,43 @@ class LevelSelectView(arcade.View):
             if (self.level1_rect["left"] <= x <= self.level1_rect["right"] and
                 self.level1_rect["bottom"] <= y <= self.level1_rect["top"]):
                 # Запускаем уровень 1
-                game = GameView(self.character)
-                game.setup()
-                self.window.show_view(game)
+                VIEWS.start_run(GameView, character=self.character)
                 return
                 
         if self.level2_rect:
             if (self.level2_rect["left"] <= x <= self.level2_rect["right"] and
                 self.level2_rect["bottom"] <= y <= self.level2_rect["top"]):
                 # Запускаем уровень 2
-                game = GameView2(self.character)
-                game.setup()
-                self.window.show_view(game)
+                VIEWS.start_run(GameView2, character=self.character,
+                                simulation_class=Level2Simulation)
                 return
 
+        if self.world_rect:
+            if (self.world_rect["left"] <= x <= self.world_rect["right"] and
+                self.world_rect["bottom"] <= y <= self.world_rect["top"]):
+                # Запускаем огромный мир (правила уровня 2)
+                VIEWS.start_run(GameView2, character=self.character,
+                                simulation_class=WorldSimulation)
+                return
+
+        for rect, level in self.level_rects:
+            if (rect["left"] <= x <= rect["right"] and
+                rect["bottom"] <= y <= rect["top"]):
+                # Запускаем свой уровень (правила уровня 2)
+                VIEWS.start_run(GameView2, character=self.character,
+                                simulation_class=SIMULATIONS[level.number])
+                return
+
+    def visible_rows(self):
+        """Сколько строк списка своих уровней помещается на экране."""
+        list_top = self.window.height - self.list_offset
+        return max(1, (list_top - 70) // self.row_height)
+
+    def on_mouse_scroll(self, x, y, scroll_x, scroll_y):
+        """Листает список своих уровней."""
+        last = max(0, len(self.levels) - self.visible_rows())
+        self.scroll = min(last, max(0, self.scroll - int(scroll_y)))
+
 # =====================================================
 # ЭКРАН ПОБЕДЫ (УРОВЕНЬ 1)
 # =====================================================
@@ -757,16 +5469,15 @@ class WinView(arcade.View):
         self.particle_system.update(delta_time)
         
         # Создаем случайные искры
-        if random.random() < 0.3:
+        if random.random() < 0.3 * delta_time * TICK_RATE:
             x = random.uniform(100, self.window.width - 100)
             y = random.uniform(100, self.window.height - 100)
             color = random.choice([arcade.color.GOLD, arcade.color.YELLOW, arcade.color.ORANGE])
             self.particle_system.create_sparkle(x, y, color, count=random.randint(3, 8))
 
     def on_mouse_press(self, x, y, button, modifiers):
-        """При клике перезапускает игру."""
-        self.window.close()
-        main()
+        """При клике возвращает в главное меню (окно то же)."""
+        VIEWS.finish_run()
 
 # =====================================================
 # ИГРА - УРОВЕНЬ 1 (ЛЕГКИЙ)
@@ -774,179 +5485,100 @@ class WinView(arcade.View):
 class GameView(arcade.View):
     """
     Основной класс для уровня 1.
-    Управляет всем игровым процессом.
+    Рисует уровень, играет звуки и передает клавиши в симуляцию.
+    Экран один на все забеги: setup() сбрасывает его на месте.
     """
     def __init__(self, character):
         super().__init__()
         self.character = character      # Запоминаем персонажа
         self.window_size_changed = False  # Для изменения размера окна
+        self.sim = None                 # Симуляция идущего забега
 
-    def setup(self):
-        """Настраивает уровень 1."""
-        arcade.set_background_color(BG_COLOR)
-        self.start_time = time.time()   # Время начала
-        self.score = 0                  # Начинаем с нуля очков
-        self.has_key = False            # Ключ еще не найден
-
-        # Загружаем звуки
-        self.sound_coin = arcade.load_sound(":resources:/sounds/coin1.wav")
-        self.sound_key = arcade.load_sound(":resources:/sounds/coin5.wav")
-        self.sound_jump = arcade.load_sound(":resources:/sounds/phaseJump1.wav")
-        self.sound_win = arcade.load_sound(":resources:/sounds/secret4.wav")
-
-        # Создаем списки для разных типов объектов
-        self.walls = arcade.SpriteList(use_spatial_hash=True)  # Стены
-        self.coins = arcade.SpriteList()                       # Монеты
-        self.keys = arcade.SpriteList()                        # Ключи
-        self.doors = arcade.SpriteList()                       # Двери
-        self.player_list = arcade.SpriteList()                 # Игрок
-
-        # Загружаем картинки персонажа
-        if self.character == "male":
-            base = ":resources:/images/animated_characters/male_adventurer/"
-            self.idle = arcade.load_texture(base + "maleAdventurer_idle.png")
-            self.jump = arcade.load_texture(base + "maleAdventurer_jump.png")
-            self.walk = [
-                arcade.load_texture(base + f"maleAdventurer_walk{i}.png")
-                for i in range(8)
-            ]
-        else:  # female
-            base = ":resources:/images/animated_characters/female_adventurer/"
-            self.idle = arcade.load_texture(base + "femaleAdventurer_idle.png")
-            self.jump = arcade.load_texture(base + "femaleAdventurer_jump.png")
-            self.walk = [
-                arcade.load_texture(base + f"femaleAdventurer_walk{i}.png")
-                for i in range(8)
-            ]
-
-        # Создаем мир по карте LEVEL_1
-        for row, line in enumerate(LEVEL_1):
-            for col, ch in enumerate(line):
-                x = col * TILE + TILE // 2
-                y = (len(LEVEL_1) - row) * TILE
-
-                if ch == "1":  # Стена
-                    wall = arcade.Sprite(":resources:/images/tiles/grassCenter.png", 0.5)
-                    wall.center_x, wall.center_y = x, y
-                    self.walls.append(wall)
-
-                elif ch == "d":  # Верх двери
-                    wall = arcade.Sprite(":resources:/images/tiles/grassCenter.png", 0.5)
-                    wall.center_x, wall.center_y = x, y
-                    self.walls.append(wall)
-
-                    door = arcade.Sprite(":resources:/images/tiles/doorClosed_top.png", 0.5)
-                    door.center_x, door.center_y = x, y - TILE // 6
-                    self.doors.append(door)
+        # Звуки по названию события (голоса общие на всю игру)
+        self.sounds = {
+            "coin": ":resources:/sounds/coin1.wav",
+            "key": ":resources:/sounds/coin5.wav",
+            "jump": ":resources:/sounds/phaseJump1.wav",
+            "win": ":resources:/sounds/secret4.wav",
+        }
+        for event, path in self.sounds.items():
+            SFX.register(event, path)
 
-                elif ch == "E":  # Середина двери
-                    door = arcade.Sprite(":resources:/images/tiles/doorClosed_mid.png", 0.5)
-                    door.center_x, door.center_y = x, y
-                    self.doors.append(door)
+        # Надписи вверху экрана
+        self.hud = Hud()
+        self.hud.add(lambda sim: sim.score, lambda score: f"Монеты: {score}",
+                     arcade.color.GOLD, 0)
+        self.hud.add(lambda sim: sim.has_key, lambda key: f"Ключ: {'есть' if key else 'нет'}",
+                     arcade.color.WHITE, 1)
+        self.hud.add(lambda sim: sim.elapsed,
+                     lambda elapsed: f"Время: {elapsed // 60} м. {elapsed % 60} с.",
+                     arcade.color.WHITE, 0, align="right")
 
-                elif ch == "P":  # Игрок
-                    self.player = arcade.Sprite(scale=0.45)
-                    self.player.texture = self.idle
-                    self.player.center_x, self.player.center_y = x, y + 20
-                    self.player_list.append(self.player)
+    def setup(self, character=None):
+        """Начинает новый забег на уровне 1 (можно другим персонажем)."""
+        arcade.set_background_color(BG_COLOR)
+        if character is not None:
+            self.character = character
 
-                elif ch == "C":  # Монета
-                    coin = AnimatedCoin(x, y)
-                    self.coins.append(coin)
+        # Все правила уровня живут в симуляции
+        self.sim = Level1Simulation(self.character)
+        self.clock = FixedStepClock()
 
-                elif ch == "K":  # Ключ
-                    key = arcade.Sprite(":resources:/images/items/keyYellow.png", 0.5)
-                    key.center_x, key.center_y = x, y
-                    self.keys.append(key)
+    def teardown(self):
+        """Отпускает симуляцию кончившегося забега."""
+        self.sim = None
 
-        # Создаем физический движок для игрока
-        self.physics = arcade.PhysicsEnginePlatformer(self.player, self.walls, GRAVITY)
-        self.walk_index = 0  # Для анимации ходьбы
+    def play_events(self, events):
+        """Проигрывает звуки для событий симуляции за один тик."""
+        for event in events:
+            if event in self.sounds:
+                SFX.play(event)
+        SFX.flush()
 
     def on_draw(self):
         """Рисует все на экране."""
         arcade.start_render()
         w, h = self.window.width, self.window.height
+        sim = self.sim
 
-        # Рисуем все объекты
-        self.walls.draw()
-        self.coins.draw()
-        self.keys.draw()
-        self.doors.draw()
-        self.player_list.draw()
-
-        # Считаем прошедшее время
-        elapsed = int(time.time() - self.start_time)
+        # Рисуем все объекты (между двумя тиками - плавно)
+        with sim.interpolated(self.clock.alpha):
+            sim.walls.draw()
+            sim.coins.draw()
+            sim.keys.draw()
+            sim.doors.draw()
+            sim.player_list.draw()
 
         # Рисуем информацию вверху
-        left_margin = w * 0.05  # 5% от ширины окна
-        
-        arcade.draw_text(f"Монеты: {self.score}", 
-                         left_margin, h - 30,
-                         arcade.color.GOLD, int(14 * w / 800), anchor_x="left")
-
-        arcade.draw_text(f"Ключ: {'есть' if self.has_key else 'нет'}",
-                         left_margin, h - 60,
-                         arcade.color.WHITE, int(14 * w / 800), anchor_x="left")
-
-        arcade.draw_text(f"Время: {elapsed // 60} м. {elapsed % 60} с.",
-                         w - left_margin, h - 30,
-                         arcade.color.WHITE, int(14 * w / 800), anchor_x="right")
+        self.hud.update(sim, w, h)
+        self.hud.draw()
 
     def on_update(self, delta_time):
         """Обновляет игру каждый кадр."""
-        self.physics.update()
-
-        # Обновляем анимацию монет
-        for coin in self.coins:
-            coin.update_animation(delta_time)
-
-        # Анимация игрока
-        if not self.physics.can_jump():  # Если в прыжке
-            self.player.texture = self.jump
-        elif abs(self.player.change_x) > 0:  # Если идет
-            self.walk_index = (self.walk_index + 0.2) % len(self.walk)
-            self.player.texture = self.walk[int(self.walk_index)]
-        else:  # Если стоит
-            self.player.texture = self.idle
-
-        # Проверяем сбор монет
-        for coin in arcade.check_for_collision_with_list(self.player, self.coins):
-            if not coin.collected:
-                arcade.play_sound(self.sound_coin)
-                coin.collected = True
-                coin.remove_from_sprite_lists()
-                self.score += 1
-
-        # Проверяем сбор ключа
-        if arcade.check_for_collision_with_list(self.player, self.keys):
-            arcade.play_sound(self.sound_key)
-            self.keys[0].remove_from_sprite_lists()
-            self.has_key = True
+        # Симуляция идет ровными тиками, сколько бы ни длился кадр
+        for _ in range(self.clock.advance(delta_time)):
+            self.play_events(self.sim.step(TICK_TIME))
 
         # Проверяем выход через дверь
-        if self.has_key and arcade.check_for_collision_with_list(self.player, self.doors):
-            arcade.play_sound(self.sound_win)
-            elapsed = int(time.time() - self.start_time)
+        if self.sim.state == STATE_WON:
+            elapsed = self.sim.elapsed
             
             # Сохраняем рекорд
-            record, is_new = save_record(1, self.score, 0, False, False, elapsed)
-            self.window.show_view(WinView(self.score, elapsed, record, is_new))
+            record, is_new = save_record(1, self.sim.score, 0, False, False, elapsed,
+                                         self.character)
+            save_replay(self.sim)
+            self.window.show_view(WinView(self.sim.score, elapsed, record, is_new))
 
     def on_key_press(self, key, modifiers):
         """Обрабатывает нажатие клавиш."""
-        if key == arcade.key.RIGHT:
-            self.player.change_x = PLAYER_SPEED
-        elif key == arcade.key.LEFT:
-            self.player.change_x = -PLAYER_SPEED
-        elif key == arcade.key.UP and self.physics.can_jump():
-            arcade.play_sound(self.sound_jump)
-            self.player.change_y = JUMP_SPEED
+        if key in KEY_ACTIONS:
+            self.sim.press(KEY_ACTIONS[key])
+            self.play_events(self.sim.take_events())
 
     def on_key_release(self, key, modifiers):
         """Обрабатывает отпускание клавиш."""
-        if key in (arcade.key.LEFT, arcade.key.RIGHT):
-            self.player.change_x = 0
+        if key in KEY_ACTIONS:
+            self.sim.release(KEY_ACTIONS[key])
 
 # =====================================================
 # ИГРА - УРОВЕНЬ 2 (СЛОЖНЫЙ)
@@ -955,169 +5587,90 @@ class GameView2(arcade.View):
     """
     Класс для уровня 2.
     Более сложный, с камерой, врагами и опасностями.
+    Правила уровня живут в Level2Simulation.
     """
-    def __init__(self, character):
+    def __init__(self, character, simulation_class=None):
         super().__init__()
         self.character = character
-        self.spike_hit_timer = 0        # Для урона от шипов
+        self.simulation_class = simulation_class or Level2Simulation
         self.window_size_changed = False
+        self.sim = None             # Симуляция идущего забега
 
-    def setup(self):
-        """Настраивает уровень 2."""
-        arcade.set_background_color(BG_COLOR)
-
-        # Создаем камеры
+        # Камеры, статичный слой, звуки и надписи живут, пока живет экран
         self.camera = arcade.Camera(self.window.width, self.window.height)  # Для мира
         self.gui_camera = arcade.Camera(self.window.width, self.window.height)  # Для интерфейса
+        self.static_layer = StaticLayer([])
 
-        # Переменные игры
-        self.start_time = time.time()   # Время начала
-        self.hp = 100                   # Здоровье
-        self.coins = 0                  # Монеты
-        self.diamonds = 0               # Алмазы
-        self.has_key = False            # Ключ
-        self.saved_mouse = False        # Мышь спасена
-        self.saved_frog = False         # Лягушка спасена
-        self.spike_hit_timer = 0        # Таймер для шипов
-
-        # Загружаем звуки
-        self.s_coin = arcade.load_sound(":resources:/sounds/coin1.wav")
-        self.s_diamond = arcade.load_sound(":resources:/sounds/coin3.wav")
-        self.s_key = arcade.load_sound(":resources:/sounds/coin5.wav")
-        self.s_bomb = arcade.load_sound(":resources:/sounds/explosion1.wav")
-        self.s_spike = arcade.load_sound(":resources:/sounds/hit3.wav")
-        self.s_ladder = arcade.load_sound(":resources:/sounds/rockHit2.ogg")
-        self.s_save = arcade.load_sound(":resources:/sounds/upgrade3.wav")
-        self.s_gameover = arcade.load_sound(":resources:/sounds/gameover2.wav")
-        self.s_win = arcade.load_sound(":resources:/sounds/secret4.wav")
-
-        # Списки объектов
-        self.walls = arcade.SpriteList(use_spatial_hash=True)  # Стены
-        self.ladders = arcade.SpriteList(use_spatial_hash=True)  # Лестницы
-        self.spikes = arcade.SpriteList()  # Шипы
-        self.bombs = arcade.SpriteList()   # Бомбы
-        self.coins_list = arcade.SpriteList()  # Монеты
-        self.diamonds_list = arcade.SpriteList()  # Алмазы
-        self.keys = arcade.SpriteList()  # Ключи
-        self.doors = arcade.SpriteList()  # Двери
-        self.mushrooms = arcade.SpriteList()  # Грибы
-        self.mice = arcade.SpriteList()  # Мыши
-        self.frogs = arcade.SpriteList()  # Лягушки
+        # Звуки по названию события (голоса общие на всю игру)
+        self.sounds = {
+            "coin": ":resources:/sounds/coin1.wav",
+            "diamond": ":resources:/sounds/coin3.wav",
+            "key": ":resources:/sounds/coin5.wav",
+            "bomb": ":resources:/sounds/explosion1.wav",
+            "spike": ":resources:/sounds/hit3.wav",
+            "ladder": ":resources:/sounds/rockHit2.ogg",
+            "save": ":resources:/sounds/upgrade3.wav",
+            "gameover": ":resources:/sounds/gameover2.wav",
+            "win": ":resources:/sounds/secret4.wav",
+        }
+        for event, path in self.sounds.items():
+            SFX.register(event, path)
 
-        # Загружаем картинки персонажа
-        if self.character == "male":
-            base = ":resources:/images/animated_characters/male_adventurer/"
-            self.tex_idle = arcade.load_texture(base + "maleAdventurer_idle.png")
-            self.tex_jump = arcade.load_texture(base + "maleAdventurer_jump.png")
-            self.tex_walk = [
-                arcade.load_texture(base + f"maleAdventurer_walk{i}.png")
-                for i in range(8)
-            ]
-            self.tex_climb = [
-                arcade.load_texture(base + "maleAdventurer_climb0.png"),
-                arcade.load_texture(base + "maleAdventurer_climb1.png"),
-            ]
-        else:  # female
-            base = ":resources:/images/animated_characters/female_adventurer/"
-            self.tex_idle = arcade.load_texture(base + "femaleAdventurer_idle.png")
-            self.tex_jump = arcade.load_texture(base + "femaleAdventurer_jump.png")
-            self.tex_walk = [
-                arcade.load_texture(base + f"femaleAdventurer_walk{i}.png")
-                for i in range(8)
-            ]
-            self.tex_climb = [
-                arcade.load_texture(base + "femaleAdventurer_climb0.png"),
-                arcade.load_texture(base + "femaleAdventurer_climb1.png"),
-            ]
+        # Надписи на полупрозрачном фоне
+        rescued = lambda saved: arcade.color.GREEN if saved else arcade.color.LIGHT_GRAY
+        self.hud = Hud(backdrop_height=200)
+        self.hud.add(lambda sim: sim.hp, lambda hp: f"HP: {hp}",
+                     lambda hp: arcade.color.RED if hp < 30 else arcade.color.GREEN, 0)
+        self.hud.add(lambda sim: sim.coins, lambda coins: f"Монеты: {coins}",
+                     arcade.color.GOLD, 1)
+        self.hud.add(lambda sim: sim.diamonds, lambda diamonds: f"Алмазы: {diamonds}",
+                     arcade.color.CYAN, 2)
+        self.hud.add(lambda sim: sim.has_key, lambda key: f"Ключ: {'есть' if key else 'нет'}",
+                     arcade.color.WHITE, 3)
+        self.hud.add(lambda sim: sim.saved_mouse,
+                     lambda saved: f"Мышь: {'спасена' if saved else 'нет'}", rescued, 4)
+        self.hud.add(lambda sim: sim.saved_frog,
+                     lambda saved: f"Лягушка: {'спасена' if saved else 'нет'}", rescued, 5)
+        self.hud.add(lambda sim: sim.elapsed,
+                     lambda elapsed: f"Время: {elapsed // 60}:{elapsed % 60:02}",
+                     arcade.color.WHITE, 0, align="right")
 
-        self.player = arcade.Sprite(scale=0.45)
-        self.player.texture = self.tex_idle
-        self.walk_index = 0
-        self.climb_index = 0
+    def setup(self, character=None, simulation_class=None):
+        """
+        Начинает новый забег (можно другим персонажем или на другой карте).
+        Камеры и слой не пересоздаются, а сбрасываются.
+        """
+        arcade.set_background_color(BG_COLOR)
+        if character is not None:
+            self.character = character
+        if simulation_class is not None:
+            self.simulation_class = simulation_class
 
-        # Создаем мир по карте LEVEL_2
-        for row, line in enumerate(LEVEL_2):
-            for col, ch in enumerate(line):
-                x = col * TILE + TILE // 2
-                y = (len(LEVEL_2) - row) * TILE
-
-                if ch == "1":
-                    self._wall(":resources:/images/tiles/grassCenter.png", x, y)
-                elif ch == "2":
-                    self._wall(":resources:/images/tiles/grassMid.png", x, y)
-                elif ch == "s":
-                    self._wall(":resources:/images/tiles/rock.png", x, y)
-                elif ch == "g":
-                    self._wall(":resources:/images/tiles/grass_sprout.png", x, y)
-                elif ch == "L":
-                    self._ladder(":resources:/images/items/ladderMid.png", x, y)
-                elif ch == "T":
-                    self._ladder(":resources:/images/items/ladderTop.png", x, y)
-                elif ch == "S":
-                    self._simple(":resources:/images/tiles/spikes.png", x, y, self.spikes)
-                elif ch == "B":
-                    bomb = Bomb(x, y)
-                    self.bombs.append(bomb)
-                elif ch == "C":
-                    coin = AnimatedCoin(x, y)
-                    self.coins_list.append(coin)
-                elif ch == "D":
-                    diamond = arcade.Sprite(":resources:/images/items/gemBlue.png", 0.5)
-                    diamond.center_x, diamond.center_y = x, y
-                    self.diamonds_list.append(diamond)
-                elif ch == "K":
-                    key = arcade.Sprite(":resources:/images/items/keyYellow.png", 0.5)
-                    key.center_x, key.center_y = x, y
-                    self.keys.append(key)
-                elif ch == "M":  # Мышь
-                    mouse = Enemy(":resources:/images/enemies/mouse.png", 0.5, move_speed=0.8)
-                    mouse.center_x, mouse.center_y = x, y
-                    self.mice.append(mouse)
-                elif ch == "F":  # Лягушка
-                    frog = Enemy(":resources:/images/enemies/frog.png", 0.5, move_speed=1.2)
-                    frog.center_x, frog.center_y = x, y
-                    self.frogs.append(frog)
-                elif ch == "m":  # Гриб
-                    mushroom = arcade.Sprite(":resources:/images/tiles/mushroomRed.png", 0.5)
-                    mushroom.center_x, mushroom.center_y = x, y
-                    self.mushrooms.append(mushroom)
-                elif ch == "d":  # Верх двери
-                    door = arcade.Sprite(":resources:/images/tiles/doorClosed_top.png", 0.5)
-                    door.center_x, door.center_y = x, y
-                    self.doors.append(door)
-                elif ch == "E":  # Середина двери
-                    door = arcade.Sprite(":resources:/images/tiles/doorClosed_mid.png", 0.5)
-                    door.center_x, door.center_y = x, y
-                    self.doors.append(door)
-                elif ch == "P":  # Игрок
-                    self.player.center_x = x
-                    self.player.center_y = y + 20
+        # Пока экран был скрыт, окно могли растянуть
+        self.camera.resize(self.window.width, self.window.height)
+        self.gui_camera.resize(self.window.width, self.window.height)
 
-        # Физический движок с лестницами
-        self.physics = arcade.PhysicsEnginePlatformer(
-            self.player,
-            self.walls,
-            gravity_constant=GRAVITY,
-            ladders=self.ladders
-        )
+        # Все правила уровня живут в симуляции
+        self.sim = self.simulation_class(self.character)
+        self.clock = FixedStepClock()
+        self.camera_previous = self.camera_current = (0.0, 0.0)
 
-    def _wall(self, tex, x, y):
-        """Создает стену."""
-        s = arcade.Sprite(tex, 0.5)
-        s.center_x, s.center_y = x, y
-        self.walls.append(s)
+        # Стены, лестницы, шипы и грибы не двигаются - рисуем их кусками
+        self.static_layer.reset([self.sim.walls, self.sim.ladders,
+                                 self.sim.spikes, self.sim.mushrooms])
+        self.sim.static_layer = self.static_layer  # Огромный мир дополняет его сам
 
-    def _ladder(self, tex, x, y):
-        """Создает лестницу."""
-        s = arcade.Sprite(tex, 0.5)
-        s.center_x, s.center_y = x, y
-        self.ladders.append(s)
+    def teardown(self):
+        """Отпускает симуляцию и картинки кусков кончившегося забега."""
+        self.static_layer.reset([])
+        self.sim = None
 
-    def _simple(self, tex, x, y, lst):
-        """Создает простой объект."""
-        s = arcade.Sprite(tex, 0.5)
-        s.center_x, s.center_y = x, y
-        lst.append(s)
+    def play_events(self, events):
+        """Проигрывает звуки для событий симуляции за один тик."""
+        for event in events:
+            if event in self.sounds:
+                SFX.play(event)
+        SFX.flush()
 
     def on_resize(self, width, height):
         """Обрабатывает изменение размера окна."""
@@ -1125,225 +5678,114 @@ class GameView2(arcade.View):
         self.gui_camera.resize(width, height)
         self.window_size_changed = True
 
-    def on_update(self, delta_time):
-        """Обновляет игру каждый кадр."""
-        # Уменьшаем таймер шипов
-        if self.spike_hit_timer > 0:
-            self.spike_hit_timer -= delta_time
-        
-        # Обновляем физику
-        self.physics.update()
-        
-        # Обновляем анимацию монет
-        for coin in self.coins_list:
-            coin.update_animation(delta_time)
-        
-        # Обновляем врагов
-        for mouse in self.mice:
-            mouse.update_ai(delta_time, self.walls)
-        
-        for frog in self.frogs:
-            frog.update_ai(delta_time, self.walls)
-
-        # Двигаем камеру за игроком
-        target_x = self.player.center_x - self.window.width // 2
-        target_y = self.player.center_y - self.window.height // 2
+    def follow_player(self):
+        """Сдвигает камеру за игроком на один тик."""
+        sim = self.sim
+        target_x = sim.player.center_x - self.window.width // 2
+        target_y = sim.player.center_y - self.window.height // 2
         
         # Не даем камере выйти за границы уровня
-        max_x = len(LEVEL_2[0]) * TILE - self.window.width
-        max_y = len(LEVEL_2) * TILE - self.window.height
+        world_width, world_height = sim.world_size()
+        max_x = world_width - self.window.width
+        max_y = world_height - self.window.height
         
         target_x = max(0, min(target_x, max_x))
         target_y = max(0, min(target_y, max_y))
         
         # Плавное движение камеры
-        current_x, current_y = self.camera.position
-        new_x = current_x + (target_x - current_x) * CAMERA_SPEED
-        new_y = current_y + (target_y - current_y) * CAMERA_SPEED
-        
-        self.camera.move_to((new_x, new_y))
-
-        # Анимация персонажа
-        if self.physics.is_on_ladder():  # На лестнице
-            self.climb_index = (self.climb_index + 0.1) % 2
-            self.player.texture = self.tex_climb[int(self.climb_index)]
-        elif not self.physics.can_jump():  # В прыжке
-            self.player.texture = self.tex_jump
-        elif abs(self.player.change_x) > 0:  # Идет
-            self.walk_index = (self.walk_index + 0.2) % len(self.tex_walk)
-            self.player.texture = self.tex_walk[int(self.walk_index)]
-        else:  # Стоит
-            self.player.texture = self.tex_idle
+        current_x, current_y = self.camera_current
+        self.camera_previous = self.camera_current
+        self.camera_current = (current_x + (target_x - current_x) * CAMERA_SPEED,
+                               current_y + (target_y - current_y) * CAMERA_SPEED)
 
-        # Сбор монет
-        for c in arcade.check_for_collision_with_list(self.player, self.coins_list):
-            if not c.collected:
-                arcade.play_sound(self.s_coin)
-                c.collected = True
-                c.remove_from_sprite_lists()
-                self.coins += 1
-
-        # Сбор алмазов
-        for d in arcade.check_for_collision_with_list(self.player, self.diamonds_list):
-            arcade.play_sound(self.s_diamond)
-            d.remove_from_sprite_lists()
-            self.diamonds += 1
-
-        # Сбор ключа
-        if arcade.check_for_collision_with_list(self.player, self.keys):
-            arcade.play_sound(self.s_key)
-            self.keys.clear()
-            self.has_key = True
-
-        # Шипы наносят урон
-        if arcade.check_for_collision_with_list(self.player, self.spikes):
-            if self.spike_hit_timer <= 0:  # Если можно получить урон
-                arcade.play_sound(self.s_spike)
-                self.hp -= SPIKE_DAMAGE
-                self.spike_hit_timer = SPIKE_COOLDOWN
-                
-                if self.hp < 0:
-                    self.hp = 0
-
-        # Спасение мыши
-        for mouse in arcade.check_for_collision_with_list(self.player, self.mice):
-            if not self.saved_mouse:
-                arcade.play_sound(self.s_save)
-                self.saved_mouse = True
-            mouse.remove_from_sprite_lists()
-
-        # Спасение лягушки
-        for frog in arcade.check_for_collision_with_list(self.player, self.frogs):
-            if not self.saved_frog:
-                arcade.play_sound(self.s_save)
-                self.saved_frog = True
-            frog.remove_from_sprite_lists()
-
-        # Взрыв бомбы
-        for bomb in arcade.check_for_collision_with_list(self.player, self.bombs):
-            if bomb.active:
-                arcade.play_sound(self.s_bomb)
-                self.hp //= 2  # Здоровье уменьшается вдвое
-                bomb.active = False
-                bomb.remove_from_sprite_lists()
+    def on_update(self, delta_time):
+        """Обновляет игру каждый кадр."""
+        sim = self.sim
+        # Симуляция и камера идут ровными тиками, сколько бы ни длился кадр
+        with PROFILER.phase("update"):
+            for _ in range(self.clock.advance(delta_time)):
+                self.play_events(sim.step(TICK_TIME))
+                with PROFILER.phase("camera"):
+                    self.follow_player()
 
         # Проверяем смерть
-        if self.hp <= 0:
-            arcade.play_sound(self.s_gameover)
-            self.window.show_view(GameOverView())
+        if sim.state == STATE_LOST:
+            save_replay(sim)
+            VIEWS.show_game_over()
 
         # Выход через дверь
-        if self.has_key and arcade.check_for_collision_with_list(self.player, self.doors):
-            arcade.play_sound(self.s_win)
-            elapsed = int(time.time() - self.start_time)
+        elif sim.state == STATE_WON:
+            stats = sim.stats()
             
             # Сохраняем рекорд
-            record, is_new = save_record(2, self.coins, self.diamonds, 
-                                       self.saved_mouse, self.saved_frog, elapsed)
+            record, is_new = save_record(sim.level_number, sim.coins, sim.diamonds, 
+                                       sim.saved_mouse, sim.saved_frog, stats["time"],
+                                       self.character)
+            save_replay(sim)
             
-            self.window.show_view(
-                WinLevel2View({
-                    "coins": self.coins,
-                    "diamonds": self.diamonds,
-                    "saved_mouse": self.saved_mouse,
-                    "saved_frog": self.saved_frog,
-                    "time": elapsed
-                }, record, is_new)
-            )
+            self.window.show_view(WinLevel2View(stats, record, is_new))
 
     def on_draw(self):
         """Рисует игру."""
         arcade.start_render()
+        sim = self.sim
         
-        # Используем камеру для мира
-        self.camera.use()
-        
-        # Рисуем все объекты мира
-        self.walls.draw()
-        self.ladders.draw()
-        self.spikes.draw()
-        self.bombs.draw()
-        self.coins_list.draw()
-        self.diamonds_list.draw()
-        self.keys.draw()
-        self.mushrooms.draw()
-        self.mice.draw()
-        self.frogs.draw()
-        self.doors.draw()
-        self.player.draw()
-        
-        # Используем камеру для интерфейса
-        self.gui_camera.use()
-        
-        w, h = self.window.width, self.window.height
-        elapsed = int(time.time() - self.start_time)
-        
-        # Адаптивный интерфейс
-        left_margin = w * 0.05
-        font_size = int(14 * w / 800)
-        
-        # Полупрозрачный фон для информации
-        arcade.draw_rectangle_filled(w // 2, h - 100, w, 200, (0, 0, 0, 150))
-        
-        # Здоровье (красное если мало)
-        arcade.draw_text(f"HP: {self.hp}", 
-                         left_margin, h - 30, 
-                         arcade.color.RED if self.hp < 30 else arcade.color.GREEN, 
-                         font_size, anchor_x="left")
-        
-        # Монеты
-        arcade.draw_text(f"Монеты: {self.coins}", 
-                         left_margin, h - 60, 
-                         arcade.color.GOLD, 
-                         font_size, anchor_x="left")
-        
-        # Алмазы
-        arcade.draw_text(f"Алмазы: {self.diamonds}", 
-                         left_margin, h - 90, 
-                         arcade.color.CYAN, 
-                         font_size, anchor_x="left")
-        
-        # Ключ
-        arcade.draw_text(f"Ключ: {'есть' if self.has_key else 'нет'}",
-                         left_margin, h - 120,
-                         arcade.color.WHITE,
-                         font_size, anchor_x="left")
-        
-        # Мышь
-        arcade.draw_text(f"Мышь: {'спасена' if self.saved_mouse else 'нет'}",
-                         left_margin, h - 150,
-                         arcade.color.LIGHT_GRAY if not self.saved_mouse else arcade.color.GREEN,
-                         font_size, anchor_x="left")
-        
-        # Лягушка
-        arcade.draw_text(f"Лягушка: {'спасена' if self.saved_frog else 'нет'}",
-                         left_margin, h - 180,
-                         arcade.color.LIGHT_GRAY if not self.saved_frog else arcade.color.GREEN,
-                         font_size, anchor_x="left")
-        
-        # Время (справа)
-        arcade.draw_text(f"Время: {elapsed // 60}:{elapsed % 60:02}",
-                         w - left_margin, h - 30,
-                         arcade.color.WHITE, font_size,
-                         anchor_x="right")
+        # Между двумя тиками все рисуем плавно
+        alpha = self.clock.alpha
+        (previous_x, previous_y), (current_x, current_y) = self.camera_previous, self.camera_current
+        self.camera.move_to((previous_x + (current_x - previous_x) * alpha,
+                             previous_y + (current_y - previous_y) * alpha))
+
+        with PROFILER.phase("draw"):
+            # Используем камеру для мира
+            self.camera.use()
+
+            # Неподвижные плитки - готовыми кусками, остальное - как обычно
+            with PROFILER.phase("draw_static"):
+                self.static_layer.draw(self.camera)
+
+            with PROFILER.phase("draw_sprites"):
+                # Врагам нужны свежие координаты из массивов
+                sim.enemies.sync_sprites(alpha)
+                left, bottom = self.camera.position
+                screen = (left - TILE, left + self.camera.viewport_width + TILE,
+                          bottom - TILE, bottom + self.camera.viewport_height + TILE)
+                with sim.interpolated(alpha, screen):
+                    sim.bombs.draw()
+                    sim.coins_list.draw()
+                    sim.diamonds_list.draw()
+                    sim.keys.draw()
+                    sim.mice.draw()
+                    sim.frogs.draw()
+                    sim.doors.draw()
+                    sim.player.draw()
+
+            # Используем камеру для интерфейса
+            self.gui_camera.use()
+
+            # Надписи пересобираются, только если что-то поменялось
+            with PROFILER.phase("draw_hud"):
+                self.hud.update(sim, self.window.width, self.window.height)
+                self.hud.draw()
+
+        # Табличка замеров (F3) рисуется поверх всего
+        PROFILER.end_frame()
+        PROFILER.draw(self.window.width, self.window.height)
 
     def on_key_press(self, key, modifiers):
         """Обрабатывает нажатие клавиш."""
-        if key == arcade.key.RIGHT:
-            self.player.change_x = PLAYER_SPEED
-        elif key == arcade.key.LEFT:
-            self.player.change_x = -PLAYER_SPEED
-        elif key == arcade.key.UP:
-            if self.physics.is_on_ladder():  # На лестнице
-                arcade.play_sound(self.s_ladder)
-                self.player.change_y = PLAYER_SPEED
-            elif self.physics.can_jump():  # Прыжок
-                self.player.change_y = JUMP_SPEED
+        if key in KEY_ACTIONS:
+            self.sim.press(KEY_ACTIONS[key])
+            self.play_events(self.sim.take_events())
+        elif key == arcade.key.F3:  # Табличка замеров
+            PROFILER.toggle_overlay()
+        elif key == arcade.key.F4:  # Запись замеров в CSV
+            PROFILER.toggle_csv()
 
     def on_key_release(self, key, modifiers):
         """Обрабатывает отпускание клавиш."""
-        if key in (arcade.key.LEFT, arcade.key.RIGHT):
-            self.player.change_x = 0
+        if key in KEY_ACTIONS:
+            self.sim.release(KEY_ACTIONS[key])
 
 # =====================================================
 # ЭКРАН ПРОИГРЫША
@@ -1375,9 +5817,8 @@ class GameOverView(arcade.View):
         )
 
     def on_mouse_press(self, x, y, button, modifiers):
-        """При клике перезапускает игру."""
-        self.window.close()
-        main()
+        """При клике возвращает в главное меню (окно то же)."""
+        VIEWS.finish_run()
 
 # =====================================================
 # ЭКРАН ПОБЕДЫ (УРОВЕНЬ 2)
@@ -1479,7 +5920,7 @@ class WinLevel2View(arcade.View):
         self.particle_system.update(delta_time)
         
         # Создаем искры
-        if random.random() < 0.3:
+        if random.random() < 0.3 * delta_time * TICK_RATE:
             x = random.uniform(100, self.window.width - 100)
             y = random.uniform(100, self.window.height - 100)
             color = random.choice([arcade.color.GOLD, arcade.color.YELLOW, 
@@ -1488,29 +5929,217 @@ class WinLevel2View(arcade.View):
                                                count=random.randint(5, 15))
 
     def on_mouse_press(self, x, y, button, modifiers):
-        """При клике перезапускает игру."""
-        self.window.close()
-        main()
+        """При клике возвращает в главное меню (окно то же)."""
+        VIEWS.finish_run()
 
 # =====================================================
 # ЗАПУСК ИГРЫ
 # =====================================================
-def main():
+"""
+КАК УСТРОЕН БЫСТРЫЙ ЗАПУСК:
+Холодный запуск делится на части, и каждая замеряется (STARTUP):
+- import      - импорт arcade, numpy и этого файла;
+- window      - создание окна и контекста OpenGL;
+- assets      - первый экран и то, что ему нужно (картинки, уровень);
+- first_frame - от arcade.run() до конца первого on_draw.
+С --fast-start все, что первому кадру не нужно (факел стартового
+экрана, экран выбора персонажа, уровни из папки levels), не грузится
+до первого кадра, а догружается после него, по одной части за кадр.
+С --play игра сразу открывает уровень --level персонажем
+--character, без меню. С --startup-report замеры печатаются,
+когда догрузилось все отложенное.
+"""
+
+
+class StartupTimer:
+    """
+    Замер холодного запуска по частям и отложенные загрузки.
+    """
+    def __init__(self, begin, clock=time.perf_counter):
+        self.clock = clock
+        self.begin = begin          # Когда начался импорт
+        self.last = begin           # Конец последней замеренной части
+        self.phases = {}            # Часть -> миллисекунды
+        self.lazy = False           # Откладывать ли загрузки до первого кадра
+        self.print_report = False   # Печатать ли отчет
+        self.first_frame_done = False
+        self.pending = deque()      # Отложенные загрузки
+        self.deferred_ms = 0.0      # Сколько заняли отложенные загрузки
+
+    def mark(self, name):
+        """Закрывает часть запуска с этим именем."""
+        now = self.clock()
+        self.phases[name] = (now - self.last) * 1000
+        self.last = now
+
+    def later(self, load):
+        """Загрузка, которую при быстром запуске можно сделать после первого кадра."""
+        if self.lazy and not self.first_frame_done:
+            self.pending.append(load)
+        else:
+            load()
+
+    def on_draw(self):
+        """
+        Конец первого кадра. Обработчик стоит в окне под экранами,
+        поэтому зовется после того, как экран нарисовал кадр.
+        """
+        window = arcade.get_window()
+        window.remove_handlers(on_draw=self.on_draw)
+        self.mark("first_frame")
+        self.first_frame_done = True
+        if self.pending:
+            pyglet.clock.schedule_once(self._load_next, 0)
+        else:
+            self._finish()
+
+    def _load_next(self, delta_time):
+        """Одна отложенная загрузка за кадр, чтобы кадры не дергались."""
+        start = self.clock()
+        self.pending.popleft()()
+        self.deferred_ms += (self.clock() - start) * 1000
+        if self.pending:
+            pyglet.clock.schedule_once(self._load_next, 0)
+        else:
+            self._finish()
+
+    def _finish(self):
+        if self.print_report:
+            print(json.dumps(self.report(), ensure_ascii=False, indent=4))
+
+    def report(self):
+        """
+        Возвращает:
+            {"import", "window", "assets", "first_frame", "total", "deferred", "lazy"}
+            время - в миллисекундах
+        """
+        report = {name: round(ms, 2) for name, ms in self.phases.items()}
+        report["total"] = round(sum(self.phases.values()), 2)
+        report["deferred"] = round(self.deferred_ms, 2)
+        report["lazy"] = self.lazy
+        return report
+
+
+# Один замер запуска на весь процесс
+STARTUP = StartupTimer(STARTUP_BEGIN)
+
+
+def main(level=None, character="male"):
     """
     Главная функция, которая запускает игру.
-    Создает окно и показывает стартовый экран.
+    Создает окно (одно на весь процесс) и показывает стартовый экран
+    или сразу уровень level (без меню).
     """
+    STARTUP.mark("import")
     window = arcade.Window(
         SCREEN_WIDTH,
         SCREEN_HEIGHT,
         SCREEN_TITLE,
         resizable=True  # Окно можно менять размер
     )
+    # Не больше, чем видят спящие враги (ENEMY_VIEW_WIDTH x ENEMY_VIEW_HEIGHT)
+    window.set_maximum_size(MAX_SCREEN_WIDTH, MAX_SCREEN_HEIGHT)
+    STARTUP.mark("window")
+
+    # Рекорды загружаются в фоне с самого запуска, а не на экране победы
+    get_record_store()
 
-    start_view = StartView()
-    window.show_view(start_view)
+    # Ставим до экранов: экраны встанут выше и нарисуют кадр первыми
+    window.push_handlers(on_draw=STARTUP.on_draw)
+    VIEWS.attach(window)
+    if level is None:
+        VIEWS.show_start()
+        if STARTUP.lazy:
+            # Пока игрок смотрит на стартовый экран, готовим следующие меню
+            STARTUP.later(lambda: VIEWS.menu("characters", CharacterSelectView))
+            STARTUP.later(get_level_catalog)
+    else:
+        VIEWS.start_level(level, character)
+    STARTUP.mark("assets")
 
     arcade.run()
 
+    # Сколько занимали перезапуски за эту игру
+    if VIEWS.runs:
+        print(json.dumps(VIEWS.report(), ensure_ascii=False, indent=4))
+
+def parse_args(argv=None):
+    """Разбирает параметры командной строки."""
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--headless", action="store_true",
+                        help="прогнать уровень без окна и показать скорость")
+    parser.add_argument("--level", type=int, default=2,
+                        help="номер уровня (1, 2, 3 или номер уровня из папки levels)")
+    parser.add_argument("--ticks", type=int, default=10000,
+                        help="сколько тиков прогнать без окна")
+    parser.add_argument("--character", choices=["male", "female"], default="male",
+                        help="персонаж")
+    parser.add_argument("--enemies", type=int, default=0,
+                        help="прогнать без окна карту-толпу с таким числом врагов")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="проиграть файл повтора без окна")
+    parser.add_argument("--mute", action="store_true",
+                        help="без звука (тихий драйвер pyglet, голоса все равно считаются)")
+    parser.add_argument("--play", action="store_true",
+                        help="сразу начать уровень --level персонажем --character, без меню")
+    parser.add_argument("--fast-start", action="store_true",
+                        help="грузить то, что не нужно первому кадру, уже после него")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="напечатать, сколько заняли части запуска")
+    parser.add_argument("--pack-atlas", action="store_true",
+                        help=f"собрать атласы картинок в папку {ATLAS_DIR} и выйти")
+    parser.add_argument("--balance", type=int, metavar="RUNS",
+                        help="прогнать столько забегов ботом на каждый вариант правил")
+    parser.add_argument("--bot", choices=list(BALANCE_BOTS), default="seeker",
+                        help="бот для --balance")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=V1,V2",
+                        help="значения правила или очков для --balance (можно несколько)")
+    parser.add_argument("--workers", type=int,
+                        help="сколько процессов для --balance (по умолчанию по числу ядер)")
+    args = parser.parse_args(argv)
+
+    # Уровни из папки levels открываем, только если они нужны сейчас
+    if args.replay or args.level not in SIMULATIONS:
+        get_level_catalog()
+    if args.level not in SIMULATIONS:
+        parser.error(f"нет уровня {args.level}, есть: "
+                     f"{', '.join(map(str, sorted(SIMULATIONS)))}")
+    if args.balance is not None:
+        if not issubclass(SIMULATIONS[args.level], Level2Simulation):
+            parser.error(f"--balance работает с уровнями по правилам уровня 2, "
+                         f"а не с уровнем {args.level}")
+        try:
+            args.grid = parse_balance_grid(args.set)
+        except ValueError as error:
+            parser.error(f"--set: {error}")
+    return args
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.mute:
+        # Драйвер выбирается при первом звуке, так что еще не поздно
+        pyglet.options["audio"] = ("silent",)
+    if args.pack_atlas:
+        # Атласы собираются заранее, один раз после обновления arcade
+        print(json.dumps(pack_atlases(), ensure_ascii=False, indent=4))
+    elif args.balance is not None:
+        # Прогоны ботами для подбора урона и очков
+        report = run_balance(args.level, args.balance, args.bot, args.character,
+                             args.grid, args.workers)
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    elif args.replay:
+        # Повтор записанного забега
+        report = play_replay(Replay.load(args.replay))
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    elif args.headless:
+        # Прогон без окна
+        level_map = make_stress_level(args.enemies) if args.enemies else None
+        level = 2 if args.enemies else args.level
+        report = run_headless(level, args.ticks, character=args.character,
+                              level_map=level_map)
+        print(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        STARTUP.lazy = args.fast_start
+        STARTUP.print_report = args.startup_report
+        main(args.level if args.play else None, args.character)